@@ -0,0 +1,153 @@
+import bisect
+import hashlib
+import json
+from collections import namedtuple
+
+# An achievement unlocks once the value of field reaches threshold. field
+# is either a player field (streak, level, ...) or a lifetime counter kept
+# in data["lifetime"] (tasks_completed, quests_completed, coins_spent, ...)
+Achievement = namedtuple(
+    "Achievement",
+    ("id", "name", "description", "field", "threshold", "reward_coins"))
+
+DEFAULT_ACHIEVEMENTS = (
+    Achievement("first_steps", "First Steps",
+                "Complete your first daily task", "tasks_completed", 1, 50),
+    Achievement("dedication", "Dedication", "Maintain a 7-day streak",
+                "streak", 7, 200),
+    Achievement("level_up", "Level Up", "Reach level 5", "level", 5, 100),
+    Achievement("quest_master", "Quest Master", "Complete 5 quests",
+                "quests_completed", 5, 300),
+    Achievement("unstoppable", "Unstoppable", "Maintain a 30-day streak",
+                "streak", 30, 1000),
+)
+
+
+def load_achievements(path=None):
+    """Read achievement definitions from a JSON list, or use the defaults
+
+    Entries are objects with the Achievement fields; they are appended to
+    the defaults so existing achievement indexes stay stable.
+    """
+    if not path:
+        return DEFAULT_ACHIEVEMENTS
+    with open(path) as f:
+        extra = json.load(f)
+    return DEFAULT_ACHIEVEMENTS + tuple(
+        Achievement(**definition) for definition in extra)
+
+
+def backfill_lifetime(data):
+    """Lifetime counters for saves made before they were tracked"""
+    return {
+        "tasks_completed":
+        sum(1 for task in data.get("daily_tasks", []) if task["completed"]),
+        "quests_completed":
+        sum(1 for quest in data.get("quests", {}).values()
+            if isinstance(quest, dict) and quest.get("completed")),
+        "personal_quests_completed":
+        sum(1 for quest in data.get("personal_quests", {}).get(
+            "items", {}).values() if quest.get("completed")),
+    }
+
+
+class AchievementEngine:
+    """Unlocks achievements from field change events
+
+    Rules are grouped by the field they watch and sorted by threshold.
+    Each player keeps a high-water mark per field, so a change only looks
+    at the rules between the old mark and the new value: a bisect plus the
+    rules actually unlocked, however many achievements exist. Players store
+    flags only for achievements they unlocked, keyed by achievement id.
+    """
+
+    def __init__(self, achievements=DEFAULT_ACHIEVEMENTS):
+        self.achievements = tuple(achievements)
+        rules = {}
+        for achievement in self.achievements:
+            rules.setdefault(achievement.field, []).append(
+                (achievement.threshold, achievement.id))
+        self._rules = {}
+        self._thresholds = {}
+        for field, field_rules in rules.items():
+            field_rules.sort()
+            self._rules[field] = [
+                achievement_id for _threshold, achievement_id in field_rules
+            ]
+            self._thresholds[field] = [
+                threshold for threshold, _id in field_rules
+            ]
+        encoded = json.dumps([list(a) for a in self.achievements])
+        self.version = hashlib.sha1(encoded.encode()).hexdigest()[:16]
+
+    @property
+    def fields(self):
+        return tuple(self._rules)
+
+    def value(self, data, field):
+        """Current value of a watched field"""
+        if field in data["player"]:
+            return data["player"][field]
+        return data.get("lifetime", {}).get(field, 0)
+
+    def sync(self, data):
+        """Bring a loaded save up to date with the achievement definitions"""
+        if data.get("achievement_version") == self.version:
+            return
+        data.setdefault("achievements", {})
+        if "lifetime" not in data:
+            data["lifetime"] = backfill_lifetime(data)
+        # Definitions changed, re-evaluate every field from scratch
+        data["achievement_marks"] = {}
+        data["achievement_version"] = self.version
+        self.evaluate(data)
+
+    def notify(self, data, field, value):
+        """A watched field changed to value, unlock what it reached
+
+        Returns the ids of newly unlocked achievements.
+        """
+        thresholds = self._thresholds.get(field)
+        if thresholds is None:
+            return []
+        marks = data.setdefault("achievement_marks", {})
+        mark = marks.get(field)
+        if mark is not None and value <= mark:
+            return []
+        marks[field] = value
+        start = 0 if mark is None else bisect.bisect_right(thresholds, mark)
+        end = bisect.bisect_right(thresholds, value)
+        unlocked = []
+        achievements = data["achievements"]
+        for achievement_id in self._rules[field][start:end]:
+            state = achievements.get(achievement_id)
+            if not state or not state.get("unlocked"):
+                achievements[achievement_id] = dict(state or {}, unlocked=True)
+                unlocked.append(achievement_id)
+        return unlocked
+
+    def notify_player(self, data):
+        """Check every watched player field, unlock what they reached
+
+        Lifetime counters are checked by record() instead. Returns the ids
+        of newly unlocked achievements.
+        """
+        unlocked = []
+        player = data["player"]
+        for field in self._rules:
+            if field in player:
+                unlocked.extend(self.notify(data, field, player[field]))
+        return unlocked
+
+    def record(self, data, counter, amount=1):
+        """Add to a lifetime counter and evaluate the rules watching it"""
+        lifetime = data.setdefault("lifetime", {})
+        lifetime[counter] = lifetime.get(counter, 0) + amount
+        return self.notify(data, counter, lifetime[counter])
+
+    def evaluate(self, data):
+        """Re-check every field, e.g. after bulk edits"""
+        unlocked = []
+        for field in self._rules:
+            unlocked.extend(self.notify(data, field, self.value(data, field)))
+        return unlocked
@@ -0,0 +1,227 @@
+"""ASGI entry point serving the same routes as the WSGI app
+
+Usage: uvicorn asgi:app (or any other ASGI server)
+
+Requests are handled by the Flask views in main, so both modes share the
+game logic. Each view runs in a bounded thread pool, which keeps the
+blocking store reads and writes off the event loop. Request and response
+bodies are streamed between the loop and the view's thread a chunk at a
+time, so large uploads and downloads (/api/admin/import and export) stay in
+bounded memory. /api/events streams are served on the event loop itself: an
+idle stream costs a coroutine rather than a thread, so one process can hold
+thousands of them open.
+"""
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from werkzeug.http import parse_cookie
+
+import main
+
+# Threads running Flask views, and so store reads and writes
+ASGI_THREADS = int(os.environ.get('SOLO_ASGI_THREADS', '64'))
+
+
+def _headers(scope):
+    """Request headers by lower-case name, repeated values joined"""
+    headers = {}
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").lower()
+        value = value.decode("latin-1")
+        separator = "; " if name == "cookie" else ", "
+        headers[name] = (headers[name] + separator +
+                         value if name in headers else value)
+    return headers
+
+
+def _environ(scope, body):
+    """WSGI environ for an ASGI HTTP request with a body stream"""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        # Without a Content-Length the body is read to its end
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in _headers(scope).items():
+        key = name.upper().replace("-", "_")
+        if key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[key] = value
+        else:
+            environ["HTTP_" + key] = value
+    return environ
+
+
+class _RequestBody(io.RawIOBase):
+    """ASGI request body read from a view's thread as it is consumed"""
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._chunk = b""
+        self._more = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._chunk and self._more:
+            message = asyncio.run_coroutine_threadsafe(
+                self._receive(), self._loop).result()
+            if message["type"] != "http.request":
+                # Client disconnected
+                self._more = False
+                break
+            self._chunk = message.get("body", b"")
+            self._more = message.get("more_body", False)
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+class AsgiApp:
+    """ASGI adapter for a WSGI app with native /api/events streams"""
+
+    def __init__(self, wsgi_app, threads=ASGI_THREADS):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=threads,
+                                           thread_name_prefix="asgi-view")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            if scope["path"] == "/api/events" and scope["method"] == "GET":
+                headers = _headers(scope)
+                player_id = main.resolve_player_id(
+                    headers.get("x-player-id"),
+                    parse_cookie(headers.get("cookie", "")).get("player_id"))
+                # Invalid ids get the WSGI app's error response
+                if player_id is not None:
+                    await self._events(scope, receive, send, headers,
+                                       player_id)
+                    return
+            await self._wsgi(scope, receive, send)
+        else:
+            # No WebSocket routes
+            await receive()
+            await send({"type": "websocket.close", "code": 1000})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.executor.shutdown)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _run_wsgi(self, scope, receive, send, loop):
+        """Call the WSGI app, sending the response as it is produced"""
+
+        def send_message(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response = {}
+        started = False
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [(name.lower().encode("latin-1"),
+                                    value.encode("latin-1"))
+                                   for name, value in headers]
+            return write
+
+        def write(chunk, more_body=True):
+            nonlocal started
+            if not started:
+                started = True
+                send_message({
+                    "type": "http.response.start",
+                    "status": response["status"],
+                    "headers": response["headers"]
+                })
+            send_message({
+                "type": "http.response.body",
+                "body": chunk,
+                "more_body": more_body
+            })
+
+        body = io.BufferedReader(_RequestBody(receive, loop))
+        result = self.wsgi_app(_environ(scope, body), start_response)
+        try:
+            for chunk in result:
+                if chunk:
+                    write(chunk)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        write(b"", more_body=False)
+
+    async def _wsgi(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self._run_wsgi, scope,
+                                   receive, send, loop)
+
+    async def _events(self, scope, receive, send, headers, player_id):
+        """Stream a player's state deltas as Server-Sent Events"""
+        query = parse_qs(scope["query_string"].decode("latin-1"))
+        last_event_id = (headers.get("last-event-id")
+                         or query.get("last_event_id", [None])[0])
+        await send({
+            "type":
+            "http.response.start",
+            "status":
+            200,
+            "headers": [(b"content-type", b"text/event-stream; charset=utf-8"),
+                        (b"cache-control", b"no-cache"),
+                        (b"x-accel-buffering", b"no")]
+        })
+        stream = main.events.astream(player_id, last_event_id)
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+        try:
+            while True:
+                message = asyncio.ensure_future(stream.__anext__())
+                await asyncio.wait((message, disconnected),
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if not message.done():
+                    message.cancel()
+                    await asyncio.gather(message, return_exceptions=True)
+                    break
+                await send({
+                    "type": "http.response.body",
+                    "body": message.result().encode(),
+                    "more_body": True
+                })
+        finally:
+            disconnected.cancel()
+            await stream.aclose()
+
+
+app = AsgiApp(main.app)
@@ -0,0 +1,106 @@
+"""Encode and decode time and payload size of stored player documents per
+codec
+
+Usage: python benchmarks/json_codecs.py [players] [save.json]
+
+Players are built from a sample save as they are stored: catalog-compacted,
+with personal quests in the indexed store. Every JSON codec whose library is
+installed is measured, along with the msgpack payload format (if msgspec is
+installed) and the indented JSON of the legacy save file.
+"""
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import Catalog  # noqa: E402
+from codec import CODECS, PayloadFormat  # noqa: E402
+from personal_quests import migrate_personal_quest_list  # noqa: E402
+
+
+def players(sample, count):
+    rng = random.Random(42)
+    catalog = Catalog()
+    for i in range(count):
+        data = json.loads(sample)
+        player = data["player"]
+        player["name"] = f"PLAYER {i}"
+        player["total_experience"] = rng.randint(0, 100000)
+        player["coins"] = rng.randint(0, 5000)
+        quests = data.setdefault("personal_quest_list", [])
+        for quest_id in range(rng.randint(0, 20)):
+            quests.append({
+                "id": quest_id + 1,
+                "name": f"Quest {quest_id}",
+                "description": "Run 5km before breakfast",
+                "completed": rng.random() < 0.5,
+                "created_date": "2025-07-24",
+                "reward_xp": 100,
+                "reward_coins": 50
+            })
+        catalog.compact(data)
+        migrate_personal_quest_list(data)
+        yield data
+
+
+def timed(function, items):
+    started = time.perf_counter()
+    results = [function(item) for item in items]
+    return results, time.perf_counter() - started
+
+
+def measure(name, encode, decode, documents):
+    payloads, encode_time = timed(encode, documents)
+    decoded, decode_time = timed(decode, payloads)
+    assert decoded == documents, name
+    size = sum(
+        len(payload.encode() if isinstance(payload, str) else payload)
+        for payload in payloads)
+    count = len(documents)
+    return (name, encode_time / count * 1e6, decode_time / count * 1e6,
+            size / count)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    path = sys.argv[2] if len(sys.argv) > 2 else "game_data.json"
+    with open(path) as f:
+        sample = f.read()
+    documents = list(players(sample, count))
+
+    rows = [
+        measure("json indent=2 (legacy)",
+                lambda data: json.dumps(data, indent=2), json.loads,
+                documents)
+    ]
+    for name, codec_class in CODECS.items():
+        try:
+            codec = codec_class()
+        except ImportError:
+            print(f"{name}: not installed")
+            continue
+        rows.append(measure(name, codec.dumps, codec.loads, documents))
+        rows.append(
+            measure(f"{name} sorted keys",
+                    lambda data: codec.dumps(data, sort_keys=True),
+                    codec.loads, documents))
+    try:
+        payloads = PayloadFormat(binary="msgpack")
+    except ImportError:
+        print("msgpack: msgspec not installed")
+    else:
+        rows.append(
+            measure("msgpack", payloads.encode, payloads.decode, documents))
+
+    print(f"players: {count}")
+    print(f"{'codec':<24} {'encode us':>10} {'decode us':>10} {'bytes':>8}")
+    for name, encode_us, decode_us, size in rows:
+        print(f"{name:<24} {encode_us:>10.1f} {decode_us:>10.1f} "
+              f"{size:>8,.0f}")
+
+
+if __name__ == "__main__":
+    main()
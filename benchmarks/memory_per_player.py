@@ -0,0 +1,83 @@
+"""Resident memory per player: legacy saves, catalog-compacted saves and
+slotted models
+
+Usage: python benchmarks/memory_per_player.py [players] [save.json]
+
+Each player is decoded from its own JSON payload, as it would be when
+loaded from the store, so no strings are shared by accident.
+"""
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import Catalog  # noqa: E402
+from models import GameState  # noqa: E402
+from personal_quests import migrate_personal_quest_list  # noqa: E402
+
+
+def payloads(sample, count):
+    rng = random.Random(42)
+    for i in range(count):
+        data = json.loads(sample)
+        player = data["player"]
+        player["name"] = f"PLAYER {i}"
+        player["total_experience"] = rng.randint(0, 100000)
+        player["coins"] = rng.randint(0, 5000)
+        for quest_id in range(rng.randint(0, 5)):
+            data.setdefault("personal_quest_list", []).append({
+                "id": quest_id + 1,
+                "name": f"Quest {quest_id}",
+                "description": "",
+                "completed": False,
+                "created_date": "2025-07-24",
+                "reward_xp": 100,
+                "reward_coins": 50
+            })
+        yield json.dumps(data)
+
+
+def measure(encoded, build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    resident = [build(json.loads(payload)) for payload in encoded]
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return resident, used
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    path = sys.argv[2] if len(sys.argv) > 2 else "game_data.json"
+    with open(path) as f:
+        sample = f.read()
+    legacy = list(payloads(sample, count))
+    catalog = Catalog()
+    compact = []
+    for payload in legacy:
+        data = json.loads(payload)
+        catalog.compact(data)
+        migrate_personal_quest_list(data)
+        compact.append(json.dumps(data))
+
+    _, legacy_bytes = measure(legacy, lambda data: data)
+    dicts, dict_bytes = measure(compact, lambda data: data)
+    models, model_bytes = measure(compact, GameState.from_dict)
+    for data, state in zip(dicts, models):
+        assert state.to_dict() == data
+
+    print(f"players:             {count}")
+    print(f"legacy dict tree:    {legacy_bytes / count:,.0f} bytes/player")
+    print(f"compact dict tree:   {dict_bytes / count:,.0f} bytes/player")
+    print(f"slotted models:      {model_bytes / count:,.0f} bytes/player")
+    print(f"reduction:           {1 - model_bytes / legacy_bytes:.1%}")
+
+
+if __name__ == "__main__":
+    main()
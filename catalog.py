@@ -0,0 +1,215 @@
+import hashlib
+import json
+
+from achievements import DEFAULT_ACHIEVEMENTS
+
+ITEMS = (
+    {
+        "id": "health_potion",
+        "name": "Health Potion",
+        "price": 25,
+        "type": "consumable",
+        "effect": "Restores 50 HP"
+    },
+    {
+        "id": "energy_drink",
+        "name": "Energy Drink",
+        "price": 20,
+        "type": "consumable",
+        "effect": "Restores 30 Energy"
+    },
+    {
+        "id": "xp_booster",
+        "name": "XP Booster",
+        "price": 100,
+        "type": "booster",
+        "effect": "Double XP for next task"
+    },
+    {
+        "id": "stat_point",
+        "name": "Stat Point",
+        "price": 200,
+        "type": "permanent",
+        "effect": "Gain 1 available stat point"
+    },
+)
+
+# Item ids for sale, in display order
+SHOP = ("health_potion", "energy_drink", "xp_booster", "stat_point")
+
+QUESTS = (
+    {
+        "id": "strength_training",
+        "max": 100,
+        "reward_coins": 100,
+        "reward_xp": 200
+    },
+    {
+        "id": "intelligence",
+        "max": 100,
+        "reward_coins": 100,
+        "reward_xp": 200
+    },
+    {
+        "id": "discipline",
+        "max": 100,
+        "reward_coins": 150,
+        "reward_xp": 250
+    },
+    {
+        "id": "spiritual_training",
+        "max": 100,
+        "reward_coins": 120,
+        "reward_xp": 220
+    },
+    {
+        "id": "secret_quests",
+        "max": 100,
+        "reward_coins": 500,
+        "reward_xp": 1000
+    },
+)
+
+
+class Catalog:
+    """Game definitions loaded once per process and shared by all players
+
+    Player saves refer to items, quests and achievements by id and hold
+    only their own state (quantities, progress, unlocked/claimed flags).
+    The view methods join the two into the shapes the API returns. The
+    catalog is never modified after construction; its version is a hash of
+    the definitions.
+    """
+
+    def __init__(self,
+                 items=ITEMS,
+                 shop=SHOP,
+                 quests=QUESTS,
+                 achievements=DEFAULT_ACHIEVEMENTS):
+        self.items = {item["id"]: dict(item) for item in items}
+        self.shop_ids = tuple(shop)
+        self.quests = {quest["id"]: dict(quest) for quest in quests}
+        self.achievements = tuple(achievements)
+        self._item_ids = {item["name"]: item["id"] for item in items}
+        self._achievement_index = {
+            achievement.id: index
+            for index, achievement in enumerate(self.achievements)
+        }
+
+        definitions = {
+            "items": list(self.items.values()),
+            "shop": list(self.shop_ids),
+            "quests": list(self.quests.values()),
+            "achievements": [
+                achievement._asdict() for achievement in self.achievements
+            ],
+        }
+        encoded = json.dumps(definitions,
+                             separators=(",", ":"),
+                             sort_keys=True)
+        self.version = hashlib.sha1(encoded.encode()).hexdigest()[:16]
+        self.shop = tuple(self.items[item_id] for item_id in self.shop_ids)
+        # Pre-encoded responses, identical for every player
+        self.shop_json = json.dumps(self.shop, separators=(",", ":"))
+        self.json = json.dumps(dict(definitions, version=self.version),
+                               separators=(",", ":"))
+
+    def item_id(self, name):
+        """Id of the item with a display name, or None"""
+        return self._item_ids.get(name)
+
+    def achievement_index(self, achievement_id):
+        return self._achievement_index.get(achievement_id)
+
+    def inventory_view(self, inventory):
+        """Inventory entries, item id -> quantity, with their definitions"""
+        view = []
+        for item_id, quantity in inventory.items():
+            item = self.items.get(item_id)
+            if item is None:
+                view.append({
+                    "id": item_id,
+                    "name": item_id,
+                    "quantity": quantity
+                })
+                continue
+            view.append({
+                "id": item_id,
+                "name": item["name"],
+                "quantity": quantity,
+                "type": item["type"],
+                "effect": item["effect"]
+            })
+        return view
+
+    def quests_view(self, quests):
+        """Quest progress with the quest's target and rewards"""
+        return {
+            quest_id: dict(state, **{
+                key: value
+                for key, value in self.quests[quest_id].items()
+                if key != "id"
+            }) if quest_id in self.quests else state
+            for quest_id, state in quests.items()
+        }
+
+    def achievement_view(self, achievement, state):
+        return {
+            "id": achievement.id,
+            "name": achievement.name,
+            "description": achievement.description,
+            "unlocked": bool(state and state.get("unlocked")),
+            "claimed": bool(state and state.get("claimed")),
+            "reward_coins": achievement.reward_coins
+        }
+
+    def achievements_view(self, states):
+        """Every achievement with the player's unlocked/claimed flags"""
+        return [
+            self.achievement_view(achievement, states.get(achievement.id))
+            for achievement in self.achievements
+        ]
+
+    def compact(self, data):
+        """Strip catalog definitions from a save made before the catalog
+
+        Returns True if the save was changed.
+        """
+        inventory = data.get("inventory")
+        if isinstance(inventory, list):
+            # Items not in the catalog keep their name as id
+            quantities = {}
+            for entry in inventory:
+                item_id = (entry.get("id") or self.item_id(entry.get("name"))
+                           or entry.get("name"))
+                quantities[item_id] = (quantities.get(item_id, 0) +
+                                       entry["quantity"])
+            data["inventory"] = quantities
+
+        achievements = data.get("achievements")
+        if "shop" not in data and not isinstance(achievements, list):
+            return isinstance(inventory, list)
+        data.pop("shop", None)
+
+        for quest_id, state in data.get("quests", {}).items():
+            if isinstance(state, dict) and quest_id in self.quests:
+                data["quests"][quest_id] = {
+                    "progress": state.get("progress", 0),
+                    "completed": state.get("completed", False)
+                }
+
+        if isinstance(achievements, list):
+            by_name = {a.name: a.id for a in self.achievements}
+            states = {}
+            for entry in achievements:
+                achievement_id = by_name.get(entry.get("name"))
+                if achievement_id is None:
+                    continue
+                state = {
+                    flag: True
+                    for flag in ("unlocked", "claimed") if entry.get(flag)
+                }
+                if state:
+                    states[achievement_id] = state
+            data["achievements"] = states
+        return True
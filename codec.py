@@ -0,0 +1,127 @@
+"""JSON encoding for API responses and stored player data
+
+Codecs share one interface, so routes and stores can switch to a faster
+library without changing their output: dumps() returns compact JSON text
+and loads() accepts text or UTF-8 bytes. "auto" picks orjson, then
+msgspec, when installed, and the standard library otherwise.
+
+Stores that can hold bytes may also keep player data in a binary format
+(msgpack, through msgspec), which is smaller and quicker to decode than
+JSON text. Payloads are told apart by type, so a store can hold both while
+it is being converted.
+"""
+import importlib
+import json
+
+# Codecs tried by "auto", fastest first
+AUTO_ORDER = ("orjson", "msgspec", "json")
+
+# Binary payload formats -> module providing encode() and decode()
+BINARY_FORMATS = {
+    "msgpack": "msgspec.msgpack",
+}
+
+
+class JsonCodec:
+    """Compact JSON through the standard library"""
+
+    name = "json"
+
+    def dumps(self, obj, sort_keys=False):
+        return json.dumps(obj, separators=(",", ":"), sort_keys=sort_keys)
+
+    def loads(self, payload):
+        return json.loads(payload)
+
+
+class OrjsonCodec:
+    """JSON through orjson"""
+
+    name = "orjson"
+
+    def __init__(self):
+        self._orjson = importlib.import_module("orjson")
+        # Non-string keys are stringified, as by the json module
+        self._options = self._orjson.OPT_NON_STR_KEYS
+        self._sorted_options = self._options | self._orjson.OPT_SORT_KEYS
+
+    def dumps(self, obj, sort_keys=False):
+        options = self._sorted_options if sort_keys else self._options
+        return self._orjson.dumps(obj, option=options).decode()
+
+    def loads(self, payload):
+        return self._orjson.loads(payload)
+
+
+class MsgspecCodec:
+    """JSON through msgspec"""
+
+    name = "msgspec"
+
+    def __init__(self):
+        self._json = importlib.import_module("msgspec.json")
+
+    def dumps(self, obj, sort_keys=False):
+        order = "sorted" if sort_keys else None
+        return self._json.encode(obj, order=order).decode()
+
+    def loads(self, payload):
+        return self._json.decode(payload)
+
+
+CODECS = {
+    "json": JsonCodec,
+    "orjson": OrjsonCodec,
+    "msgspec": MsgspecCodec,
+}
+
+
+def get_codec(name="auto"):
+    """A codec by name, or the fastest one installed for "auto"
+
+    Raises ValueError for an unknown name and ImportError if the named
+    codec's library is not installed.
+    """
+    if name == "auto":
+        for candidate in AUTO_ORDER:
+            try:
+                return CODECS[candidate]()
+            except ImportError:
+                continue
+    try:
+        codec_class = CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown JSON codec: {name}")
+    return codec_class()
+
+
+class PayloadFormat:
+    """Encodes stored player data as JSON text or in a binary format
+
+    JSON payloads are str and binary payloads are bytes, so decode() reads
+    either, whichever format the store is currently writing.
+    """
+
+    def __init__(self, codec=None, binary=None):
+        self.codec = codec or get_codec()
+        self.binary = binary
+        self._binary = None if binary is None else _binary_module(binary)
+
+    def encode(self, data):
+        if self._binary is not None:
+            return self._binary.encode(data)
+        return self.codec.dumps(data)
+
+    def decode(self, payload):
+        if isinstance(payload, str):
+            return self.codec.loads(payload)
+        # Rows written while the store was in msgpack format
+        return (self._binary or _binary_module("msgpack")).decode(payload)
+
+
+def _binary_module(name):
+    try:
+        module_name = BINARY_FORMATS[name]
+    except KeyError:
+        raise ValueError(f"Unknown binary payload format: {name}")
+    return importlib.import_module(module_name)
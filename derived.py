@@ -0,0 +1,180 @@
+import bisect
+from collections import namedtuple
+
+# (minimum rank score, rank letter, rank name), lowest first
+RANKS = (
+    (0, "E", "AWAKENED"),
+    (200, "D", "NOVICE HUNTER"),
+    (400, "C", "TRAINED HUNTER"),
+    (600, "B", "SKILLED HUNTER"),
+    (800, "A", "ELITE HUNTER"),
+    (1000, "S", "SHADOW MONARCH"),
+)
+
+# (player value, points, per): each whole "per" units of the value is
+# worth "points" rank score; "stats" is the total of allocated stats
+RANK_SCORE_WEIGHTS = (
+    ("level", 10, 1),
+    ("stats", 2, 1),
+    ("max_streak", 5, 1),
+    ("total_experience", 1, 100),
+)
+
+# (minimum level, class by highest stat, class if no stat matches), highest
+# tier first; below every tier the class is left unchanged
+CLASS_TIERS = (
+    (20, {
+        "strength": "BERSERKER",
+        "intelligence": "ARCHMAGE",
+        "agility": "ASSASSIN",
+        "vitality": "GUARDIAN",
+        "perception": "HUNTER"
+    }, "WARRIOR"),
+    (10, {
+        "strength": "WARRIOR",
+        "intelligence": "MAGE",
+        "agility": "ROGUE",
+        "vitality": "TANK",
+        "perception": "SCOUT"
+    }, "FIGHTER"),
+)
+
+# (player field, minimum value, title), first match wins; if none match the
+# title is left unchanged
+TITLES = (
+    ("max_streak", 30, "UNSTOPPABLE"),
+    ("max_streak", 14, "DEDICATED"),
+    ("level", 15, "VETERAN"),
+    ("level", 5, "RISING STAR"),
+)
+
+# (player field, stat, factor)
+DAMAGE_REDUCTIONS = (
+    ("physical_damage_reduction", "vitality", 0.5),
+    ("magical_damage_reduction", "intelligence", 0.3),
+)
+
+_RANK_THRESHOLDS = [threshold for threshold, _letter, _name in RANKS]
+
+
+def total_stats(player):
+    """Sum of allocated stats, excluding unspent points"""
+    return sum(value for key, value in player["stats"].items()
+               if key != "available_points")
+
+
+def rank_score(player):
+    """Weighted rank score of a player"""
+    score = 0
+    for field, points, per in RANK_SCORE_WEIGHTS:
+        value = total_stats(player) if field == "stats" else player[field]
+        score += value // per * points
+    return score
+
+
+def rank_for_score(score):
+    """Return (rank letter, rank name, points to next rank or None)"""
+    position = bisect.bisect_right(_RANK_THRESHOLDS, score) - 1
+    _threshold, letter, name = RANKS[max(position, 0)]
+    points_to_next = (_RANK_THRESHOLDS[position + 1] - score
+                      if position + 1 < len(RANKS) else None)
+    return letter, name, points_to_next
+
+
+def _compute_rank_score(player):
+    return {"rank_score": rank_score(player)}
+
+
+def _compute_rank(player):
+    letter, name, points_to_next = rank_for_score(player["rank_score"])
+    return {
+        "rank": letter,
+        "rank_name": name,
+        "points_to_next_rank": points_to_next
+    }
+
+
+def _compute_class(player):
+    stats = player["stats"]
+    highest_stat = max(stats,
+                       key=lambda x: stats[x]
+                       if x != "available_points" else 0)
+    for min_level, class_map, fallback in CLASS_TIERS:
+        if player["level"] >= min_level:
+            return {"class": class_map.get(highest_stat, fallback)}
+    return {}
+
+
+def _compute_title(player):
+    for field, minimum, title in TITLES:
+        if player[field] >= minimum:
+            return {"title": title}
+    return {}
+
+
+def _compute_damage_reductions(player):
+    stats = player["stats"]
+    return {
+        field: int(stats[stat] * factor)
+        for field, stat, factor in DAMAGE_REDUCTIONS
+    }
+
+
+# A derived node reads its inputs (player fields, or earlier nodes) and
+# returns the player fields it sets
+DerivedField = namedtuple("DerivedField", ("name", "inputs", "compute"))
+
+PLAYER_DERIVED_FIELDS = (
+    DerivedField("damage_reductions", ("stats", ),
+                 _compute_damage_reductions),
+    DerivedField("class", ("level", "stats"), _compute_class),
+    DerivedField("title", ("level", "max_streak"), _compute_title),
+    DerivedField("rank_score",
+                 ("level", "stats", "max_streak", "total_experience"),
+                 _compute_rank_score),
+    DerivedField("rank", ("rank_score", ), _compute_rank),
+)
+
+
+class DerivedState:
+    """Dependency graph of derived player fields
+
+    refresh() is told which inputs changed and recomputes only the nodes
+    that depend on them, directly or through other nodes, in definition
+    order. Results are written into the player dict, so readers get the
+    cached values without recomputing anything.
+    """
+
+    def __init__(self, fields=PLAYER_DERIVED_FIELDS):
+        self.fields = tuple(fields)
+        self._dependents = {}
+        defined = set()
+        for field in self.fields:
+            for name in field.inputs:
+                self._dependents.setdefault(name, []).append(field)
+            if field.name in defined:
+                raise ValueError(f"Duplicate derived field: {field.name}")
+            defined.add(field.name)
+        self._plans = {}
+
+    def _plan(self, changed):
+        plan = self._plans.get(changed)
+        if plan is not None:
+            return plan
+        affected = set()
+        pending = list(changed)
+        while pending:
+            for field in self._dependents.get(pending.pop(), ()):
+                if field.name not in affected:
+                    affected.add(field.name)
+                    pending.append(field.name)
+        plan = self._plans[changed] = tuple(
+            field for field in self.fields if field.name in affected)
+        return plan
+
+    def refresh(self, player, changed=None):
+        """Recompute nodes affected by the changed inputs (None for all)"""
+        fields = (self.fields
+                  if changed is None else self._plan(frozenset(changed)))
+        for field in fields:
+            player.update(field.compute(player))
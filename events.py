@@ -0,0 +1,282 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+# Player fields reported by the "xp" event
+XP_FIELDS = ("level", "current_xp", "xp_to_next_level", "total_experience")
+
+# Player fields that have their own event type
+EVENT_PLAYER_FIELDS = XP_FIELDS + ("coins", "rank", "rank_name")
+
+
+def state_events(old, new, catalog):
+    """Describe the difference between two game states as small events
+
+    Inventory, quest and achievement payloads are joined with their catalog
+    definitions, matching what the API returns for those sections.
+    """
+    events = []
+    old_player = old["player"]
+    new_player = new["player"]
+
+    if any(old_player.get(field) != new_player.get(field)
+           for field in XP_FIELDS):
+        events.append(("xp", dict(
+            {field: new_player.get(field) for field in XP_FIELDS},
+            gained=new_player["total_experience"] -
+            old_player["total_experience"])))
+
+    if old_player.get("coins") != new_player.get("coins"):
+        events.append(("coins", {
+            "coins": new_player["coins"],
+            "delta": new_player["coins"] - old_player["coins"]
+        }))
+
+    if old_player.get("rank") != new_player.get("rank"):
+        events.append(("rank_changed", {
+            "rank": new_player["rank"],
+            "rank_name": new_player.get("rank_name"),
+            "previous_rank": old_player.get("rank")
+        }))
+
+    changed = {
+        key: value
+        for key, value in new_player.items()
+        if key not in EVENT_PLAYER_FIELDS and old_player.get(key) != value
+    }
+    if changed:
+        events.append(("player", changed))
+
+    old_tasks = old.get("daily_tasks", [])
+    for index, task in enumerate(new.get("daily_tasks", [])):
+        old_task = old_tasks[index] if index < len(old_tasks) else None
+        if old_task == task:
+            continue
+        if task["completed"] and not (old_task and old_task["completed"]):
+            events.append(("task_completed", {
+                "task_index": index,
+                "task": task,
+                "streak": new_player["streak"]
+            }))
+        else:
+            events.append(("task", {"task_index": index, "task": task}))
+
+    old_achievements = old.get("achievements", {})
+    for achievement_id, state in new.get("achievements", {}).items():
+        old_state = old_achievements.get(achievement_id) or {}
+        if state == old_state:
+            continue
+        index = catalog.achievement_index(achievement_id)
+        if index is None:
+            continue
+        if state.get("unlocked") and not old_state.get("unlocked"):
+            event_type = "achievement_unlocked"
+        elif state.get("claimed") and not old_state.get("claimed"):
+            event_type = "achievement_claimed"
+        else:
+            continue
+        events.append((event_type, {
+            "achievement_index": index,
+            "achievement":
+            catalog.achievement_view(catalog.achievements[index], state)
+        }))
+
+    if old.get("inventory") != new.get("inventory"):
+        events.append(("inventory", {
+            "inventory": catalog.inventory_view(new["inventory"])
+        }))
+
+    if old.get("quests") != new.get("quests"):
+        events.append(("quests", {
+            "quests": catalog.quests_view(new["quests"])
+        }))
+
+    old_personal = old.get("personal_quests", {}).get("items", {})
+    new_personal = new.get("personal_quests", {}).get("items", {})
+    if old_personal != new_personal:
+        for key, quest in new_personal.items():
+            if old_personal.get(key) != quest:
+                events.append(("personal_quest", {"quest": quest}))
+        for key in old_personal.keys() - new_personal.keys():
+            events.append(("personal_quest_deleted", {
+                "quest_id": old_personal[key]["id"]
+            }))
+
+    return events
+
+
+def format_event(event_id, event_type, payload):
+    """Encode one Server-Sent Events message"""
+    data = json.dumps(payload, separators=(",", ":"))
+    return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
+
+
+class _Channel:
+    """Recent events and waiting subscribers for one player"""
+
+    __slots__ = ("events", "cond", "waiters", "subscribers", "idle_since",
+                 "complete_after")
+
+    def __init__(self, lock, buffer_size, first_id):
+        self.events = deque(maxlen=buffer_size)
+        self.cond = threading.Condition(lock)
+        # (event loop, asyncio.Event) of async subscribers
+        self.waiters = set()
+        self.subscribers = 0
+        self.idle_since = time.monotonic()
+        # Every event with a larger id is still in the buffer
+        self.complete_after = first_id
+
+
+class EventBroker:
+    """Per-player event fan-out with replay for Last-Event-ID resumes
+
+    Only players with a live subscriber, or one that disconnected within
+    the resume window, keep a buffer, so idle players cost nothing. An
+    idle stream is a blocked wait plus a heartbeat comment, not polling.
+    """
+
+    def __init__(self, buffer_size=100, heartbeat=15.0, resume_window=60.0):
+        self.buffer_size = buffer_size
+        self.heartbeat = heartbeat
+        self.resume_window = resume_window
+        self._lock = threading.Lock()
+        self._channels = {}
+        # Ids keep increasing across restarts so stale resumes are detected
+        self._next_id = int(time.time() * 1000)
+
+    def _prune(self, now):
+        expired = [
+            player_id for player_id, channel in self._channels.items()
+            if not channel.subscribers
+            and now - channel.idle_since > self.resume_window
+        ]
+        for player_id in expired:
+            del self._channels[player_id]
+
+    def publish(self, player_id, events):
+        """Deliver (event_type, payload) pairs to the player's streams"""
+        if not events:
+            return
+        with self._lock:
+            channel = self._channels.get(player_id)
+            if channel is None:
+                return
+            for event_type, payload in events:
+                self._next_id += 1
+                if len(channel.events) == channel.events.maxlen:
+                    channel.complete_after = channel.events[0][0]
+                channel.events.append((self._next_id, event_type, payload))
+            channel.cond.notify_all()
+            for loop, ready in channel.waiters:
+                loop.call_soon_threadsafe(ready.set)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "channels": len(self._channels),
+                "subscribers":
+                sum(c.subscribers for c in self._channels.values())
+            }
+
+    def _subscribe(self, player_id, last_event_id):
+        """Join a player's channel; returns (channel, last_seen, replay)"""
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            channel = self._channels.get(player_id)
+            if channel is None:
+                channel = self._channels[player_id] = _Channel(
+                    self._lock, self.buffer_size, self._next_id)
+            channel.subscribers += 1
+
+            last_seen = self._next_id
+            replay = []
+            replay_from = None
+            if last_event_id is not None:
+                try:
+                    replay_from = int(last_event_id)
+                except ValueError:
+                    pass
+            if replay_from is not None:
+                if replay_from < channel.complete_after:
+                    # Events were missed, the client must reload state
+                    replay = [(last_seen, "resync", {})]
+                else:
+                    replay = [
+                        event for event in channel.events
+                        if replay_from < event[0] <= last_seen
+                    ]
+        return channel, last_seen, replay
+
+    def _unsubscribe(self, channel):
+        with self._lock:
+            channel.subscribers -= 1
+            channel.idle_since = time.monotonic()
+
+    @staticmethod
+    def _after(channel, last_seen):
+        # Called with the lock held
+        return [event for event in channel.events if event[0] > last_seen]
+
+    def stream(self, player_id, last_event_id=None):
+        """Yield SSE messages for a player until the client disconnects"""
+        channel, last_seen, replay = self._subscribe(player_id,
+                                                     last_event_id)
+        try:
+            yield "retry: 3000\n\n"
+            for event in replay:
+                yield format_event(*event)
+
+            while True:
+                with self._lock:
+                    pending = self._after(channel, last_seen)
+                    if not pending:
+                        channel.cond.wait(self.heartbeat)
+                        pending = self._after(channel, last_seen)
+                if not pending:
+                    yield ": heartbeat\n\n"
+                    continue
+                for event in pending:
+                    yield format_event(*event)
+                last_seen = pending[-1][0]
+        finally:
+            self._unsubscribe(channel)
+
+    async def astream(self, player_id, last_event_id=None):
+        """Async version of stream that waits without holding a thread"""
+        channel, last_seen, replay = self._subscribe(player_id,
+                                                     last_event_id)
+        ready = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), ready)
+        with self._lock:
+            channel.waiters.add(waiter)
+        try:
+            yield "retry: 3000\n\n"
+            for event in replay:
+                yield format_event(*event)
+
+            while True:
+                # Cleared before checking, so a publish in between is seen
+                ready.clear()
+                with self._lock:
+                    pending = self._after(channel, last_seen)
+                if not pending:
+                    try:
+                        await asyncio.wait_for(ready.wait(), self.heartbeat)
+                    except asyncio.TimeoutError:
+                        pass
+                    with self._lock:
+                        pending = self._after(channel, last_seen)
+                if not pending:
+                    yield ": heartbeat\n\n"
+                    continue
+                for event in pending:
+                    yield format_event(*event)
+                last_seen = pending[-1][0]
+        finally:
+            with self._lock:
+                channel.waiters.discard(waiter)
+            self._unsubscribe(channel)
@@ -0,0 +1,363 @@
+import logging
+import os
+import threading
+import zlib
+
+from codec import JsonCodec, get_codec
+from storage import PlayerStore, VersionConflict, swap_items
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = 'snapshot.json'
+SEGMENT_PREFIX = 'journal-'
+SEGMENT_SUFFIX = '.log'
+
+# Codec for records encoded or decoded outside a store
+_JSON = JsonCodec()
+
+
+def diff_state(old, new, path=()):
+    """Return (sets, deletes) turning old into new, as lists of key paths
+
+    Dicts and equal-length lists are compared element by element so a
+    single changed counter produces a single small record.
+    """
+    sets = []
+    deletes = []
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key, value in new.items():
+            if key not in old:
+                sets.append([list(path + (key, )), value])
+            elif old[key] != value:
+                child_sets, child_deletes = diff_state(old[key], value,
+                                                       path + (key, ))
+                sets.extend(child_sets)
+                deletes.extend(child_deletes)
+        for key in old:
+            if key not in new:
+                deletes.append(list(path + (key, )))
+    elif (isinstance(old, list) and isinstance(new, list)
+          and len(old) == len(new)):
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            if old_item != new_item:
+                child_sets, child_deletes = diff_state(old_item, new_item,
+                                                       path + (index, ))
+                sets.extend(child_sets)
+                deletes.extend(child_deletes)
+    elif old != new:
+        sets.append([list(path), new])
+    return sets, deletes
+
+
+def apply_diff(data, sets, deletes):
+    """Apply a diff produced by diff_state to data and return the result"""
+    for path, value in sets:
+        if not path:
+            data = value
+            continue
+        target = data
+        for key in path[:-1]:
+            target = target[key]
+        target[path[-1]] = value
+    for path in deletes:
+        target = data
+        for key in path[:-1]:
+            target = target[key]
+        del target[path[-1]]
+    return data
+
+
+def encode_record(record, codec=_JSON):
+    """Serialize a journal record as a checksummed line"""
+    payload = codec.dumps(record).encode()
+    return b"%08x %s\n" % (zlib.crc32(payload), payload)
+
+
+def decode_record(line, codec=_JSON):
+    """Parse a journal line, returning None if it is torn or corrupt"""
+    if not line.endswith(b"\n") or len(line) < 10 or line[8:9] != b" ":
+        return None
+    payload = line[9:-1]
+    try:
+        if int(line[:8], 16) != zlib.crc32(payload):
+            return None
+        return codec.loads(payload)
+    except ValueError:
+        return None
+
+
+class JournalPlayerStore(PlayerStore):
+    """Player store that appends per-mutation diffs to a checksummed log
+
+    Every save appends one fsynced record holding only the fields that
+    changed. A background compactor periodically writes an atomic snapshot
+    and drops log segments it covers; startup replays the snapshot plus
+    the log tail. All players stay resident as serialized JSON.
+    """
+
+    def __init__(self,
+                 path,
+                 compact_interval=60.0,
+                 compact_min_records=1000,
+                 fsync=True,
+                 codec=None):
+        self.path = path
+        self.compact_interval = compact_interval
+        self.compact_min_records = compact_min_records
+        self.fsync = fsync
+        self.codec = codec or get_codec()
+        self._players = {}
+        self._versions = {}
+        self._seq = 0
+        self._snapshot_seq = 0
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._log = None
+
+        os.makedirs(path, exist_ok=True)
+        self._replay()
+        self._open_segment()
+
+        self._compactor = threading.Thread(target=self._compact_loop,
+                                           name="journal-compactor",
+                                           daemon=True)
+        self._compactor.start()
+
+    def _segment_path(self, start_seq):
+        name = f"{SEGMENT_PREFIX}{start_seq:020d}{SEGMENT_SUFFIX}"
+        return os.path.join(self.path, name)
+
+    def _segments(self):
+        names = sorted(name for name in os.listdir(self.path)
+                       if name.startswith(SEGMENT_PREFIX)
+                       and name.endswith(SEGMENT_SUFFIX))
+        return [os.path.join(self.path, name) for name in names]
+
+    def _replay(self):
+        snapshot_path = os.path.join(self.path, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, 'rb') as f:
+                snapshot = self.codec.loads(f.read())
+            self._snapshot_seq = self._seq = snapshot["seq"]
+            self._players = {
+                player_id: self.codec.dumps(data)
+                for player_id, data in snapshot["players"].items()
+            }
+            self._versions = snapshot.get("versions", {})
+
+        for segment in self._segments():
+            offset = 0
+            with open(segment, 'rb') as f:
+                for line in f:
+                    record = decode_record(line, self.codec)
+                    if record is None:
+                        break
+                    offset += len(line)
+                    if record["s"] > self._seq:
+                        self._apply(record)
+                        self._seq = record["s"]
+                size = f.seek(0, os.SEEK_END)
+            if offset < size:
+                # Torn write from a crash: drop the incomplete tail
+                logger.warning("Truncating corrupt journal tail in %s at %d",
+                               segment, offset)
+                with open(segment, 'r+b') as f:
+                    f.truncate(offset)
+                    os.fsync(f.fileno())
+
+    def _apply(self, record):
+        player_id = record["p"]
+        if record.get("drop"):
+            self._players.pop(player_id, None)
+            self._versions.pop(player_id, None)
+            return
+        current = self._players.get(player_id)
+        data = self.codec.loads(current) if current is not None else {}
+        data = apply_diff(data, record.get("set", []), record.get("del", []))
+        self._players[player_id] = self.codec.dumps(data)
+        self._versions[player_id] = record.get(
+            "v",
+            self._versions.get(player_id, 0) + 1)
+
+    def _open_segment(self):
+        if self._log is not None:
+            self._log.close()
+        self._log = open(self._segment_path(self._seq + 1), 'ab')
+
+    def _append(self, record, sync=True):
+        self._seq += 1
+        record["s"] = self._seq
+        self._log.write(encode_record(record, self.codec))
+        if sync:
+            self._sync()
+
+    def _sync(self):
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+
+    def load_versioned(self, player_id):
+        with self._lock:
+            payload = self._players.get(player_id)
+            version = self._versions.get(player_id, 0)
+        if payload is None:
+            return None
+        return self.codec.loads(payload), version
+
+    def version_of(self, player_id):
+        return self._versions.get(player_id, 0)
+
+    def _save_locked(self, player_id, data, op, version, sync=True):
+        payload = self.codec.dumps(data)
+        current = self._players.get(player_id)
+        if version is None:
+            version = self._versions.get(player_id, 0) + 1
+        if current == payload and self._versions.get(player_id) == version:
+            return version
+        old = self.codec.loads(current) if current is not None else {}
+        sets, deletes = diff_state(old, data)
+        record = {"p": player_id, "v": version, "set": sets}
+        if deletes:
+            record["del"] = deletes
+        if op:
+            record["op"] = op
+        self._append(record, sync)
+        self._players[player_id] = payload
+        self._versions[player_id] = version
+        return version
+
+    def save(self, player_id, data, op=None, version=None):
+        with self._lock:
+            self._save_locked(player_id, data, op, version)
+
+    def save_many(self, items):
+        # One fsync covers the whole batch
+        with self._lock:
+            for player_id, data, op, version in items:
+                self._save_locked(player_id, data, op, version, sync=False)
+            self._sync()
+
+    def compare_and_swap(self,
+                         player_id,
+                         expected_version,
+                         data,
+                         op=None,
+                         version=None):
+        with self._lock:
+            if self._versions.get(player_id, 0) != expected_version:
+                raise VersionConflict(player_id)
+            return self._save_locked(player_id, data, op, version
+                                     or expected_version + 1)
+
+    def compare_and_swap_many(self, items):
+        conflicts = []
+        with self._lock:
+            for player_id, expected_version, data, op, version in (
+                    swap_items(items)):
+                if self._versions.get(player_id, 0) != expected_version:
+                    conflicts.append(player_id)
+                    continue
+                self._save_locked(player_id,
+                                  data,
+                                  op,
+                                  version or expected_version + 1,
+                                  sync=False)
+            self._sync()
+        return conflicts
+
+    def delete(self, player_id):
+        with self._lock:
+            if player_id not in self._players:
+                return
+            self._append({"p": player_id, "drop": True})
+            del self._players[player_id]
+            self._versions.pop(player_id, None)
+
+    def count(self):
+        return len(self._players)
+
+    def iter_players(self, batch_size=500):
+        for player_id in sorted(self._players):
+            payload = self._players.get(player_id)
+            if payload is not None:
+                yield player_id, self.codec.loads(payload)
+
+    def iter_versioned(self, after="", batch_size=500):
+        for player_id in sorted(self._players):
+            if player_id <= after:
+                continue
+            with self._lock:
+                payload = self._players.get(player_id)
+                version = self._versions.get(player_id, 0)
+            if payload is not None:
+                yield player_id, self.codec.loads(payload), version
+
+    def compact(self):
+        """Write an atomic snapshot and drop the log segments it covers"""
+        with self._compact_lock:
+            with self._lock:
+                if self._seq == self._snapshot_seq:
+                    return
+                seq = self._seq
+                # Values are replaced, never mutated, so a shallow copy is a
+                # consistent view of every player at this sequence number
+                players = dict(self._players)
+                versions = dict(self._versions)
+                self._open_segment()
+                # The live segment may be one that a failed compaction
+                # opened and nothing was appended to since; it stays
+                covered = [
+                    segment for segment in self._segments()
+                    if segment != self._log.name
+                ]
+
+            snapshot_path = os.path.join(self.path, SNAPSHOT_FILE)
+            tmp_path = snapshot_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write('{"seq":%d,"players":{' % seq)
+                for index, (player_id, payload) in enumerate(players.items()):
+                    if index:
+                        f.write(',')
+                    f.write(self.codec.dumps(player_id))
+                    f.write(':')
+                    f.write(payload)
+                f.write('},"versions":')
+                f.write(self.codec.dumps(versions))
+                f.write('}')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, snapshot_path)
+            self._fsync_dir()
+            self._snapshot_seq = seq
+
+            for segment in covered:
+                os.remove(segment)
+
+    def _fsync_dir(self):
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _compact_loop(self):
+        while not self._closed.wait(self.compact_interval):
+            if self._seq - self._snapshot_seq >= self.compact_min_records:
+                try:
+                    self.compact()
+                except OSError:
+                    logger.exception("Journal compaction failed")
+
+    def close(self):
+        self._closed.set()
+        self.compact()
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
@@ -0,0 +1,364 @@
+import random
+import threading
+from datetime import datetime
+
+# Player fields copied into leaderboard entries
+LEADERBOARD_FIELDS = ("name", "level", "total_experience", "rank", "class",
+                      "max_streak", "rank_score")
+
+# Fields the leaderboard can be ordered by
+LEADERBOARD_ORDERINGS = ("total_experience", "rank_score")
+
+# Time windows with their own XP leaderboards
+XP_WINDOWS = ("daily", "weekly", "season")
+
+# Number of entries kept when a window's leaderboard is archived
+ARCHIVE_SIZE = 100
+
+MAX_LEVELS = 32
+
+
+def window_bucket(window, when):
+    """Bucket key for the window containing a point in time"""
+    if window == "daily":
+        return when.strftime("%Y-%m-%d")
+    if window == "weekly":
+        year, week, _ = when.isocalendar()
+        return f"{year}-W{week:02d}"
+    if window == "season":
+        return f"{when.year}-Q{(when.month - 1) // 3 + 1}"
+    raise ValueError(f"Unknown leaderboard window: {window}")
+
+
+def record_window_xp(player, xp_amount, now=None):
+    """Add XP to the player's per-window counters, rolling stale buckets"""
+    now = now or datetime.now()
+    windows = player.setdefault("xp_windows", {})
+    for window in XP_WINDOWS:
+        bucket = window_bucket(window, now)
+        counter = windows.get(window)
+        if not counter or counter["bucket"] != bucket:
+            counter = windows[window] = {"bucket": bucket, "xp": 0}
+        counter["xp"] += xp_amount
+
+
+class _End:
+    """Sentinel that sorts after every key"""
+
+    def __lt__(self, other):
+        return False
+
+    def __le__(self, other):
+        return self is other
+
+    def __gt__(self, other):
+        return self is not other
+
+    def __ge__(self, other):
+        return True
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, next_nodes, widths):
+        self.key = key
+        self.next = next_nodes
+        self.width = widths
+
+
+_NIL = _Node(_End(), [], [])
+
+
+class IndexableSkipList:
+    """Sorted collection with O(log n) insert, remove, rank and indexing
+
+    Every forward link records how many positions it skips, so the
+    position of a key is the sum of the widths crossed while finding it.
+    """
+
+    def __init__(self):
+        self._size = 0
+        self._head = _Node(None, [_NIL] * MAX_LEVELS, [1] * MAX_LEVELS)
+
+    def __len__(self):
+        return self._size
+
+    def insert(self, key):
+        chain = [None] * MAX_LEVELS
+        steps_at_level = [0] * MAX_LEVELS
+        node = self._head
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level].key <= key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        height = 1
+        while height < MAX_LEVELS and random.random() < 0.5:
+            height += 1
+        new_node = _Node(key, [None] * height, [None] * height)
+        steps = 0
+        for level in range(height):
+            prev_node = chain[level]
+            new_node.next[level] = prev_node.next[level]
+            prev_node.next[level] = new_node
+            new_node.width[level] = prev_node.width[level] - steps
+            prev_node.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(height, MAX_LEVELS):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key):
+        chain = [None] * MAX_LEVELS
+        node = self._head
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+        target = chain[0].next[0]
+        if target is _NIL or target.key != key:
+            raise KeyError(key)
+
+        height = len(target.next)
+        for level in range(height):
+            prev_node = chain[level]
+            prev_node.width[level] += target.width[level] - 1
+            prev_node.next[level] = target.next[level]
+        for level in range(height, MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+    def rank(self, key):
+        """Number of keys strictly less than key"""
+        position = 0
+        node = self._head
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        return position
+
+    def slice(self, start, stop):
+        """Keys at positions start <= i < stop"""
+        start = max(start, 0)
+        stop = min(stop, self._size)
+        if start >= stop:
+            return []
+        remaining = start + 1
+        node = self._head
+        for level in reversed(range(MAX_LEVELS)):
+            while (node.width[level] <= remaining
+                   and node.next[level] is not _NIL):
+                remaining -= node.width[level]
+                node = node.next[level]
+        keys = []
+        while len(keys) < stop - start and node is not _NIL:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+class LeaderboardIndex:
+    """Ranks players by a single score, highest first"""
+
+    def __init__(self):
+        self._keys = {}
+        self._list = IndexableSkipList()
+
+    def __len__(self):
+        return len(self._list)
+
+    def update(self, player_id, score):
+        key = (-score, player_id)
+        old_key = self._keys.get(player_id)
+        if old_key == key:
+            return
+        if old_key is not None:
+            self._list.remove(old_key)
+        self._list.insert(key)
+        self._keys[player_id] = key
+
+    def remove(self, player_id):
+        key = self._keys.pop(player_id, None)
+        if key is not None:
+            self._list.remove(key)
+
+    def score(self, player_id):
+        """Indexed score of a player"""
+        return -self._keys[player_id][0]
+
+    def position(self, player_id):
+        """1-based position of a player, or None if not ranked"""
+        key = self._keys.get(player_id)
+        if key is None:
+            return None
+        return self._list.rank(key) + 1
+
+    def page(self, offset, limit):
+        """Player ids at 0-based positions offset .. offset + limit"""
+        return [
+            player_id
+            for _score, player_id in self._list.slice(offset, offset + limit)
+        ]
+
+
+class Leaderboard:
+    """Incrementally maintained leaderboards over every player
+
+    Lifetime orderings rank by a player field. Time windows rank by the
+    player's XP counter for the current bucket; when a bucket expires its
+    ranking is handed to the archive callback and a fresh one starts.
+    """
+
+    def __init__(self,
+                 orderings=LEADERBOARD_ORDERINGS,
+                 windows=XP_WINDOWS,
+                 archive=None):
+        self._indexes = {field: LeaderboardIndex() for field in orderings}
+        self._windows = {
+            window: {
+                "bucket": window_bucket(window, datetime.now()),
+                "index": LeaderboardIndex()
+            }
+            for window in windows
+        }
+        self._archive = archive
+        self._entries = {}
+        self._lock = threading.RLock()
+        self._building = False
+        self._touched = set()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def orderings(self):
+        return tuple(self._indexes)
+
+    @property
+    def windows(self):
+        return tuple(self._windows)
+
+    def bucket(self, window):
+        """Current bucket key of a time window"""
+        with self._lock:
+            self._roll_windows()
+            return self._windows[window]["bucket"]
+
+    def _roll_windows(self, now=None):
+        now = now or datetime.now()
+        for window, state in self._windows.items():
+            bucket = window_bucket(window, now)
+            if bucket == state["bucket"]:
+                continue
+            if self._archive is not None and len(state["index"]):
+                rows = self._page(state, 0, ARCHIVE_SIZE)
+                for row in rows:
+                    row.pop("player_id")
+                self._archive(window, state["bucket"], rows)
+            self._windows[window] = {
+                "bucket": bucket,
+                "index": LeaderboardIndex()
+            }
+
+    def update(self, player_id, player, _from_build=False):
+        """Re-index a player if any leaderboard field changed"""
+        entry = {field: player.get(field) for field in LEADERBOARD_FIELDS}
+        counters = player.get("xp_windows") or {}
+        with self._lock:
+            if _from_build and player_id in self._touched:
+                return
+            if self._building and not _from_build:
+                self._touched.add(player_id)
+            self._roll_windows()
+            for window, state in self._windows.items():
+                counter = counters.get(window)
+                if counter and counter["bucket"] == state["bucket"]:
+                    state["index"].update(player_id, counter["xp"])
+            if self._entries.get(player_id) == entry:
+                return
+            self._entries[player_id] = entry
+            for field, index in self._indexes.items():
+                index.update(player_id, entry.get(field) or 0)
+
+    def remove(self, player_id):
+        with self._lock:
+            self._entries.pop(player_id, None)
+            for index in self._indexes.values():
+                index.remove(player_id)
+            for state in self._windows.values():
+                state["index"].remove(player_id)
+
+    def _index(self, order_by):
+        if order_by in self._windows:
+            self._roll_windows()
+            return self._windows[order_by]["index"]
+        return self._indexes[order_by]
+
+    def window_size(self, window):
+        """Number of players ranked in the current bucket of a window"""
+        with self._lock:
+            return len(self._index(window))
+
+    def position(self, order_by, player_id):
+        """1-based position by a field or time window"""
+        with self._lock:
+            return self._index(order_by).position(player_id)
+
+    def _page(self, state, offset, limit):
+        index = state["index"]
+        player_ids = index.page(offset, limit)
+        return [
+            dict(self._entries[player_id],
+                 window_xp=index.score(player_id),
+                 position=offset + i + 1,
+                 player_id=player_id)
+            for i, player_id in enumerate(player_ids)
+        ]
+
+    def page(self, order_by, offset, limit):
+        """Entries with their positions for one page of the leaderboard"""
+        with self._lock:
+            if order_by in self._windows:
+                self._roll_windows()
+                return self._page(self._windows[order_by], offset, limit)
+            player_ids = self._indexes[order_by].page(offset, limit)
+            return [
+                dict(self._entries[player_id],
+                     position=offset + i + 1,
+                     player_id=player_id)
+                for i, player_id in enumerate(player_ids)
+            ]
+
+    def around(self, order_by, player_id, radius):
+        """Entries within radius positions of a player"""
+        with self._lock:
+            position = self.position(order_by, player_id)
+            if position is None:
+                return []
+            offset = max(position - 1 - radius, 0)
+            return self.page(order_by, offset, position - offset + radius)
+
+    def build(self, players):
+        """Index (player_id, data) pairs, e.g. streamed from the store"""
+        with self._lock:
+            self._building = True
+            self._touched = set()
+        try:
+            for player_id, data in players:
+                self.update(player_id, data["player"], _from_build=True)
+        finally:
+            with self._lock:
+                self._building = False
+                self._touched = set()
+
+    def build_async(self, players):
+        """Build the index in a background thread"""
+        thread = threading.Thread(target=self.build,
+                                  args=(players, ),
+                                  name="leaderboard-build",
+                                  daemon=True)
+        thread.start()
+        return thread
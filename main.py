@@ -1,14 +1,139 @@
-from flask import Flask, render_template, jsonify, request
+from flask import (Flask, Response, render_template, jsonify, request, g,
+                   abort, has_request_context)
+from flask.json.provider import DefaultJSONProvider
+import atexit
+import copy
+import hashlib
+import hmac
 import json
 import os
+import time
 from datetime import datetime, timedelta
 import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from achievements import AchievementEngine, load_achievements
+from catalog import Catalog
+from codec import get_codec
+from derived import DerivedState
+from events import EventBroker, state_events
+from leaderboard import Leaderboard, record_window_xp
+from models import GameState
+from personal_quests import (DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, add_quest,
+                             complete_quest as complete_personal_quest_entry,
+                             get_quest, index_quests,
+                             migrate_personal_quest_list, query_quests,
+                             quest_store, remove_quest, without_indexes)
+from progression import XPCurve
+from scheduler import (ResetScheduler, check_daily_reset, get_zone,
+                       local_date, next_player_reset, parse_reset_time,
+                       reset_due)
+from snapshots import freeze, thaw
+from storage import VersionConflict, open_store
+from transfer import (PLAYER_ID_PATTERN, export_batches, import_batches,
+                      open_lines, save_players)
+from write_behind import WriteBehindStore
 
 app = Flask(__name__)
 
-# File to store persistent data
+# Legacy single-player save, imported into the store on first start
 DATA_FILE = 'game_data.json'
 
+# JSON codec for API responses and stored player data: "auto" uses orjson
+# or msgspec when installed, else the standard library ("json")
+JSON_CODEC = get_codec(os.environ.get('SOLO_JSON_CODEC', 'auto'))
+
+# Player store configuration ("sqlite" or "journal"). Set SOLO_STORE_BINARY
+# to "msgpack" to keep SQLite player data as msgpack (requires msgspec)
+STORE_BACKEND = os.environ.get('SOLO_STORE', 'sqlite')
+STORE_OPTIONS = {
+    "sqlite": {
+        "pool_size": int(os.environ.get('SOLO_DB_POOL_SIZE', '8')),
+        "codec": JSON_CODEC,
+        "binary": os.environ.get('SOLO_STORE_BINARY') or None,
+    },
+    "journal": {
+        "compact_interval":
+        float(os.environ.get('SOLO_JOURNAL_COMPACT_INTERVAL', '60')),
+        "compact_min_records":
+        int(os.environ.get('SOLO_JOURNAL_COMPACT_RECORDS', '1000')),
+        "codec": JSON_CODEC,
+    },
+}
+STORE_PATH = os.environ.get(
+    'SOLO_DB_PATH',
+    'game_data.journal' if STORE_BACKEND == 'journal' else 'game_data.db')
+
+# Write-behind persistence ("sync", "group" or "async"). Flushes only
+# write players no other process has committed since; with "async", saves
+# that lose against such a commit have already returned and are dropped
+PERSISTENCE_DURABILITY = os.environ.get('SOLO_DURABILITY', 'group')
+PERSISTENCE_FLUSH_INTERVAL_MS = int(
+    os.environ.get('SOLO_FLUSH_INTERVAL_MS', '20'))
+
+# Recently used players kept in memory, as compact models.GameState
+# records, after they are loaded or written (least recently used evicted
+# first); 0 disables the cache
+PLAYER_CACHE_SIZE = int(os.environ.get('SOLO_PLAYER_CACHE_SIZE', '10000'))
+# Most recently used of those kept as shared snapshots instead, so they
+# are read and written without converting
+PLAYER_HOT_CACHE_SIZE = int(
+    os.environ.get('SOLO_PLAYER_HOT_CACHE_SIZE', '1000'))
+
+# Expired daily/weekly/season leaderboards are archived here
+LEADERBOARD_ARCHIVE_DIR = os.environ.get('SOLO_LEADERBOARD_ARCHIVE',
+                                         'leaderboard_archive')
+
+# Token required in X-Admin-Token by the bulk export and import endpoints,
+# which are disabled while it is unset
+ADMIN_TOKEN = os.environ.get('SOLO_ADMIN_TOKEN')
+
+# Invalid lines described in an import response
+MAX_IMPORT_ERRORS = 100
+
+# Server-Sent Events heartbeat interval in seconds
+EVENTS_HEARTBEAT = float(os.environ.get('SOLO_EVENTS_HEARTBEAT', '15'))
+
+# XP curve: base XP for level 2, each level needs growth times the last
+XP_CURVE = XPCurve(base_xp=int(os.environ.get('SOLO_XP_BASE', '100')),
+                   growth=float(os.environ.get('SOLO_XP_GROWTH', '1.2')))
+
+# Achievement definitions; SOLO_ACHIEVEMENTS_FILE adds more from JSON
+ACHIEVEMENTS = AchievementEngine(
+    load_achievements(os.environ.get('SOLO_ACHIEVEMENTS_FILE')))
+
+# Shop, quest and achievement definitions shared by every player
+CATALOG = Catalog(achievements=ACHIEVEMENTS.achievements)
+
+# Browser cache lifetime for catalog responses, in seconds
+CATALOG_MAX_AGE = int(os.environ.get('SOLO_CATALOG_MAX_AGE', '86400'))
+
+# Daily resets applied per scheduler tick, and seconds between ticks
+RESET_BATCH_SIZE = int(os.environ.get('SOLO_RESET_BATCH_SIZE', '500'))
+RESET_INTERVAL = float(os.environ.get('SOLO_RESET_INTERVAL', '1'))
+
+# Attempts before a conflicting mutation gives up with 409 Conflict
+MAX_MUTATION_RETRIES = int(os.environ.get('SOLO_MUTATION_RETRIES', '8'))
+
+# Compare-and-swap conflict counters
+concurrency_stats = {"conflicts": 0, "retries_exhausted": 0}
+
+# Maximum number of actions accepted by /api/batch
+MAX_BATCH_ACTIONS = 100
+
+# Inputs changed while derived state updates are deferred, see
+# deferred_derived_state
+_defer_derived = ContextVar('defer_derived', default=None)
+
+# Saves stamped with this format and the current achievement definitions
+# need no upgrade; bump it when upgrade_game_data gains a migration
+SAVE_FORMAT = 1
+
+# Players are identified by the X-Player-Id header or player_id cookie,
+# matching PLAYER_ID_PATTERN
+DEFAULT_PLAYER_ID = 'default'
+
 # Default game data structure
 DEFAULT_GAME_DATA = {
     "player": {
@@ -69,195 +194,227 @@ DEFAULT_GAME_DATA = {
         "xp_reward": 30,
         "coin_reward": 15
     }],
-    "timer": {
-        "hours": 4,
-        "minutes": 43,
-        "seconds": 0
-    },
     "last_reset":
     datetime.now().strftime("%Y-%m-%d"),
-    "inventory": [{
-        "name": "Health Potion",
-        "quantity": 3,
-        "type": "consumable",
-        "effect": "Restores 50 HP"
-    }, {
-        "name": "Energy Drink",
-        "quantity": 2,
-        "type": "consumable",
-        "effect": "Restores 30 Energy"
-    }],
+    "inventory": {
+        "health_potion": 3,
+        "energy_drink": 2
+    },
     "quests": {
         "strength_training": {
             "progress": 0,
-            "max": 100,
-            "completed": False,
-            "reward_coins": 100,
-            "reward_xp": 200
+            "completed": False
         },
         "intelligence": {
             "progress": 0,
-            "max": 100,
-            "completed": False,
-            "reward_coins": 100,
-            "reward_xp": 200
+            "completed": False
         },
         "discipline": {
             "progress": 0,
-            "max": 100,
-            "completed": False,
-            "reward_coins": 150,
-            "reward_xp": 250
+            "completed": False
         },
         "spiritual_training": {
             "progress": 0,
-            "max": 100,
-            "completed": False,
-            "reward_coins": 120,
-            "reward_xp": 220
+            "completed": False
         },
         "secret_quests": {
             "progress": 0,
-            "max": 100,
-            "completed": False,
-            "reward_coins": 500,
-            "reward_xp": 1000
+            "completed": False
         },
         "personal_quests": 0
     },
-    "personal_quest_list": [],
-    "achievements": [{
-        "name": "First Steps",
-        "description": "Complete your first daily task",
-        "unlocked": False,
-        "reward_coins": 50
-    }, {
-        "name": "Dedication",
-        "description": "Maintain a 7-day streak",
-        "unlocked": False,
-        "reward_coins": 200
-    }, {
-        "name": "Level Up",
-        "description": "Reach level 5",
-        "unlocked": False,
-        "reward_coins": 100
-    }, {
-        "name": "Quest Master",
-        "description": "Complete 5 quests",
-        "unlocked": False,
-        "reward_coins": 300
-    }, {
-        "name": "Unstoppable",
-        "description": "Maintain a 30-day streak",
-        "unlocked": False,
-        "reward_coins": 1000
-    }],
-    "shop": [{
-        "name": "Health Potion",
-        "price": 25,
-        "type": "consumable",
-        "effect": "Restores 50 HP"
-    }, {
-        "name": "Energy Drink",
-        "price": 20,
-        "type": "consumable",
-        "effect": "Restores 30 Energy"
-    }, {
-        "name": "XP Booster",
-        "price": 100,
-        "type": "booster",
-        "effect": "Double XP for next task"
-    }, {
-        "name": "Stat Point",
-        "price": 200,
-        "type": "permanent",
-        "effect": "Gain 1 available stat point"
-    }],
+    "personal_quests": {
+        "next_id": 1,
+        "items": {}
+    },
+    "achievements": {},
+    "lifetime": {},
     "settings": {
         "notifications": True,
         "sound_effects": True,
         "dark_mode": True,
-        "daily_reset_time": "00:00"
+        "daily_reset_time": "00:00",
+        # IANA time zone name; None uses the server's local time
+        "timezone": None
     }
 }
 
 
-def load_game_data():
-    """Load game data from file or create default"""
-    if os.path.exists(DATA_FILE):
+def new_game_data(player_id=DEFAULT_PLAYER_ID):
+    """Create fresh game data for a new player"""
+    data = copy.deepcopy(DEFAULT_GAME_DATA)
+    now = time.time()
+    data["last_reset"] = local_date(now)
+    data["reset_at"] = next_player_reset(data, now)
+    if player_id != DEFAULT_PLAYER_ID:
+        data["player"]["name"] = player_id.upper()
+    upgrade_game_data(data)
+    refresh_derived_state(data)
+    return data
+
+
+def upgrade_game_data(data):
+    """Bring an older save up to date with the catalog and achievements"""
+    CATALOG.compact(data)
+    migrate_personal_quest_list(data)
+    ACHIEVEMENTS.sync(data)
+    if "reset_at" not in data:
+        # The countdown used to be stored and ticked down by the client
+        data.pop("timer", None)
         try:
-            with open(DATA_FILE, 'r') as f:
-                data = json.load(f)
-                # Check if daily reset is needed
-                check_daily_reset(data)
-                return data
-        except (json.JSONDecodeError, KeyError):
-            return DEFAULT_GAME_DATA.copy()
-    return DEFAULT_GAME_DATA.copy()
-
-
-def save_game_data(data):
-    """Save game data to file"""
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+            last_reset = datetime.strptime(data["last_reset"],
+                                           "%Y-%m-%d").timestamp()
+        except (KeyError, ValueError):
+            last_reset = time.time() - 86400
+        data["reset_at"] = next_player_reset(data, last_reset)
+    # Build any missing quest indexes now rather than on a read
+    quest_store(data)
+    data["save_format"] = SAVE_FORMAT
+
+
+def is_current(data):
+    """Whether a save can be served as is, without upgrade or daily reset"""
+    return (data.get("save_format") == SAVE_FORMAT
+            and data.get("achievement_version") == ACHIEVEMENTS.version
+            and not reset_due(data))
+
+
+def import_legacy_game_data():
+    """Import the old single-player save file as the default player"""
+    if not os.path.exists(DATA_FILE) or store.load(DEFAULT_PLAYER_ID):
+        return
+    try:
+        with open(DATA_FILE, 'r') as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return
+    store.save(DEFAULT_PLAYER_ID, data)
+
+
+def load_game_data(player_id):
+    """Load a player's game data and version, creating or resetting as needed"""
+    for _ in range(MAX_MUTATION_RETRIES):
+        loaded = store.load_versioned(player_id)
+        base = None
+        if loaded is None:
+            data, version = new_game_data(player_id), 0
+        else:
+            data, version = loaded
+            upgrade_game_data(data)
+            # Players the reset scheduler has not reached yet
+            if not reset_due(data):
+                return data, version
+            base = copy.deepcopy(data)
+            check_daily_reset(data)
+        try:
+            return data, save_game_data(data, player_id, version, base=base)
+        except VersionConflict:
+            # Another worker created or reset this player first
+            continue
+    return data, version
+
+
+def save_game_data(data, player_id, version, base=None):
+    """Commit a player's game data if version is still the latest
+
+    Returns the new version or raises VersionConflict. When base is given,
+    the difference from it is pushed to the player's event streams.
+    """
+    op = request.endpoint if has_request_context() else None
+    new_version = store.compare_and_swap(player_id, version, data, op=op)
+    leaderboard.update(player_id, data["player"])
+    reset_scheduler.schedule(player_id, data["reset_at"])
+    if base is not None:
+        events.publish(player_id, state_events(base, data, CATALOG))
+    return new_version
+
+
+def read_game_data(player_id):
+    """Latest game data and version of a player, for reading only
+
+    Up-to-date saves are the store's shared snapshot, which other requests
+    may be reading at the same time: it must not be modified. Others are
+    loaded through load_game_data, which upgrades or resets them.
+    """
+    loaded = store.load_snapshot(player_id)
+    if loaded is not None and is_current(loaded[0]):
+        return loaded
+    return load_game_data(player_id)
+
+
+def mutate_game_data(mutation, player_id=None):
+    """Apply a mutation to the latest committed state of a player
+
+    mutation(data) returns (result, new_data); new_data is saved only when
+    result["success"] is true, after unlocking the achievements its player
+    fields reached. The mutation runs on a copy-on-write view of the latest
+    snapshot, which copies only the parts it changes, and the result
+    replaces the snapshot only if no other writer committed in between;
+    otherwise it is re-run on a fresh view. Returns the result, or None if
+    every attempt conflicted.
+    """
+    player_id = player_id or request_player_id()
+    for _ in range(MAX_MUTATION_RETRIES):
+        base, version = read_game_data(player_id)
+        result, new_data = mutation(thaw(base))
+        if not result.get("success"):
+            return result
+        ACHIEVEMENTS.notify_player(new_data)
+        new_data = freeze(new_data)
+        try:
+            version = save_game_data(new_data, player_id, version, base=base)
+        except VersionConflict:
+            concurrency_stats["conflicts"] += 1
+            continue
+        if has_request_context():
+            g.game_data, g.game_data_version = new_data, version
+        return result
+    concurrency_stats["retries_exhausted"] += 1
+    return None
 
 
-def check_daily_reset(data):
-    """Check if daily tasks need to be reset"""
-    today = datetime.now().strftime("%Y-%m-%d")
-    if data.get("last_reset") != today:
-        # Check if all tasks were completed yesterday
-        all_completed = all(task["completed"] for task in data["daily_tasks"])
+def resolve_player_id(header, cookie):
+    """Player id from the X-Player-Id header or cookie, None if invalid"""
+    player_id = header or cookie or DEFAULT_PLAYER_ID
+    return player_id if PLAYER_ID_PATTERN.match(player_id) else None
 
-        # Reset streak if not all tasks completed
-        if not all_completed:
-            data["player"]["streak"] = 0
 
-        # Calculate progressive difficulty based on streak
-        streak = data["player"]["streak"]
-        pushup_count = 12 + (streak * 2)  # Start at 12, increase by 2 each day
-        situp_count = 12 + (streak * 2)  # Start at 12, increase by 2 each day
+def current_player_id():
+    """Resolve the calling player's id from the request"""
+    player_id = resolve_player_id(request.headers.get('X-Player-Id'),
+                                  request.cookies.get('player_id'))
+    if player_id is None:
+        abort(400, description="Invalid player id")
+    return player_id
 
-        # Reset daily tasks with progressive difficulty
-        for task in data["daily_tasks"]:
-            task["completed"] = False
-            task["progress"] = 0
 
-            # Update pushups and situps with progressive difficulty
-            if "PUSHUPS" in task["name"]:
-                task["name"] = f"{pushup_count} PUSHUPS"
-                task["max"] = pushup_count
-            elif "SITUPS" in task["name"]:
-                task["name"] = f"{situp_count} SITUPS"
-                task["max"] = situp_count
+def request_player_id():
+    """The calling player's id, resolved once per request"""
+    if 'player_id' not in g:
+        g.player_id = current_player_id()
+    return g.player_id
 
-        # Reset timer
-        data["timer"] = {"hours": 4, "minutes": 43, "seconds": 0}
-        data["last_reset"] = today
 
-        # Restore energy
-        data["player"]["energy"] = data["player"]["max_energy"]
+def get_game_data():
+    """Get the calling player's game data for the current request
 
-        save_game_data(data)
+    The data is a shared snapshot, see read_game_data, and is read only.
+    """
+    if 'game_data' not in g:
+        g.game_data, g.game_data_version = read_game_data(
+            request_player_id())
+    return g.game_data
 
 
 def calculate_level_from_xp(total_xp):
     """Calculate level and current XP from total experience"""
-    level = 1
-    xp_needed = 100
-    current_xp = total_xp
-
-    while current_xp >= xp_needed:
-        current_xp -= xp_needed
-        level += 1
-        xp_needed = int(xp_needed * 1.2)  # Each level requires 20% more XP
-
-    return level, current_xp, xp_needed
+    return XP_CURVE.level_for(total_xp)
 
 
 def award_experience(data, xp_amount):
     """Award XP and handle level ups"""
     data["player"]["total_experience"] += xp_amount
+    record_window_xp(data["player"], xp_amount)
     old_level = data["player"]["level"]
 
     new_level, current_xp, xp_to_next = calculate_level_from_xp(
@@ -272,147 +429,418 @@ def award_experience(data, xp_amount):
         levels_gained = new_level - old_level
         data["player"]["stats"]["available_points"] += levels_gained * 2
         data["player"]["coins"] += levels_gained * 50
-        update_class_and_title(data)
-        check_achievements(data)
-
-
-def calculate_rank_score(data):
-    """Calculate rank score based on player progress"""
-    player = data["player"]
-    stats = player["stats"]
-
-    # Calculate total stats (excluding available_points)
-    total_stats = sum(value for key, value in stats.items()
-                      if key != "available_points")
-
-    # Rank Score Calculation:
-    # Level × 10 points
-    # Total Stats × 2 points
-    # Max Streak × 5 points
-    # Total XP ÷ 100 points
-    score = (player["level"] * 10 + total_stats * 2 +
-             player["max_streak"] * 5 + player["total_experience"] // 100)
-
-    return score
-
-
-def get_rank_from_score(score):
-    """Get rank letter and name based on score"""
-    if score >= 1000:
-        return "S", "SHADOW MONARCH"
-    elif score >= 800:
-        return "A", "ELITE HUNTER"
-    elif score >= 600:
-        return "B", "SKILLED HUNTER"
-    elif score >= 400:
-        return "C", "TRAINED HUNTER"
-    elif score >= 200:
-        return "D", "NOVICE HUNTER"
+        update_derived_state(data, "level", "total_experience")
     else:
-        return "E", "AWAKENED"
+        # Rank score includes total XP, keep it current for the leaderboard
+        update_derived_state(data, "total_experience")
 
 
-def update_rank(data):
-    """Update player rank based on current progress"""
-    score = calculate_rank_score(data)
-    rank_letter, rank_name = get_rank_from_score(score)
+# Class, title, rank and damage reductions, recomputed from their inputs
+PLAYER_DERIVED = DerivedState()
 
-    data["player"]["rank"] = rank_letter
-    data["player"]["rank_name"] = rank_name
-    data["player"]["rank_score"] = score
 
-    # Calculate points to next rank
-    next_thresholds = [200, 400, 600, 800, 1000]
-    points_to_next = None
+def update_derived_state(data, *changed):
+    """Recompute derived player fields that depend on the changed inputs"""
+    pending = _defer_derived.get()
+    if pending is not None:
+        pending.update(changed)
+        return
+    PLAYER_DERIVED.refresh(data["player"], changed)
 
-    for threshold in next_thresholds:
-        if score < threshold:
-            points_to_next = threshold - score
-            break
 
-    data["player"]["points_to_next_rank"] = points_to_next
+@contextmanager
+def deferred_derived_state():
+    """Collect derived state updates until the block exits
 
+    Yields the set of changed inputs, so callers applying several actions
+    can recompute derived state once afterwards instead of after every
+    action.
+    """
+    changed = set()
+    token = _defer_derived.set(changed)
+    try:
+        yield changed
+    finally:
+        _defer_derived.reset(token)
 
-def update_class_and_title(data):
-    """Update player class and title based on level and stats"""
-    level = data["player"]["level"]
-    stats = data["player"]["stats"]
 
-    # Update class based on highest stat
-    highest_stat = max(stats,
-                       key=lambda x: stats[x]
-                       if x != "available_points" else 0)
-
-    if level >= 20:
-        class_map = {
-            "strength": "BERSERKER",
-            "intelligence": "ARCHMAGE",
-            "agility": "ASSASSIN",
-            "vitality": "GUARDIAN",
-            "perception": "HUNTER"
+def refresh_derived_state(data, changed=None):
+    """Recompute derived player fields, all of them if changed is None"""
+    PLAYER_DERIVED.refresh(data["player"], changed)
+
+
+def string_param(params, key):
+    """A request parameter if it is a string, otherwise None"""
+    value = params.get(key)
+    return value if isinstance(value, str) else None
+
+
+def action_complete_task(data, params):
+    """Complete a daily task and award its rewards"""
+    task_index = params.get('task_index')
+    if not isinstance(task_index, int) or not 0 <= task_index < len(
+            data["daily_tasks"]):
+        return {"success": False, "error": "Invalid task"}
+    task = data["daily_tasks"][task_index]
+    if task["completed"]:
+        return {"success": False, "error": "Task already completed"}
+
+    task["completed"] = True
+    task["progress"] = task["max"]
+
+    # Award XP and coins
+    award_experience(data, task["xp_reward"])
+    data["player"]["coins"] += task["coin_reward"]
+    ACHIEVEMENTS.record(data, "tasks_completed")
+
+    # Check if all tasks completed for streak
+    if all(t["completed"] for t in data["daily_tasks"]):
+        data["player"]["streak"] += 1
+        data["player"]["max_streak"] = max(data["player"]["max_streak"],
+                                           data["player"]["streak"])
+        update_derived_state(data, "max_streak")
+
+    # Update quest progress
+    if "PUSHUPS" in task["name"] or "SITUPS" in task["name"]:
+        advance_quest(data, "strength_training", 10)
+    elif "MEDITATE" in task["name"]:
+        advance_quest(data, "spiritual_training", 15)
+    elif "RUN" in task["name"]:
+        advance_quest(data, "discipline", 20)
+
+    return {"success": True}
+
+
+def advance_quest(data, quest_id, amount):
+    """Add progress to a major quest, up to its target"""
+    quest = data["quests"][quest_id]
+    quest["progress"] = min(CATALOG.quests[quest_id]["max"],
+                            quest["progress"] + amount)
+
+
+def action_allocate_stat(data, params):
+    """Spend available points on a stat"""
+    stat_name = string_param(params, 'stat_name')
+    points = params.get('points', 1)
+    stats = data["player"]["stats"]
+    if stat_name not in stats or stat_name == "available_points":
+        return {"success": False, "error": "Invalid stat"}
+    if not isinstance(points, int) or points < 1:
+        return {"success": False, "error": "Invalid number of points"}
+    if stats["available_points"] < points:
+        return {"success": False, "error": "Not enough stat points"}
+
+    stats[stat_name] += points
+    stats["available_points"] -= points
+
+    update_derived_state(data, "stats")
+    return {"success": True}
+
+
+def action_buy_item(data, params):
+    """Buy one or more units of a shop item"""
+    item_id = string_param(params, 'item_id') or CATALOG.item_id(
+        string_param(params, 'item_name'))
+    quantity = params.get('quantity', 1)
+    if not isinstance(quantity, int) or quantity < 1:
+        return {"success": False, "error": "Invalid quantity"}
+    shop_item = (CATALOG.items[item_id]
+                 if item_id in CATALOG.shop_ids else None)
+
+    if not shop_item:
+        return {"success": False, "error": "Insufficient coins"}
+    total_price = shop_item["price"] * quantity
+    if data["player"]["coins"] < total_price:
+        return {"success": False, "error": "Insufficient coins"}
+
+    data["player"]["coins"] -= total_price
+    ACHIEVEMENTS.record(data, "coins_spent", total_price)
+    ACHIEVEMENTS.record(data, "items_bought", quantity)
+
+    if shop_item["type"] == "consumable":
+        # Add to inventory
+        inventory = data["inventory"]
+        inventory[item_id] = inventory.get(item_id, 0) + quantity
+    elif shop_item["type"] == "permanent":
+        if item_id == "stat_point":
+            data["player"]["stats"]["available_points"] += quantity
+
+    return {"success": True}
+
+
+def action_use_item(data, params):
+    """Use one or more units of an inventory item"""
+    item_name = string_param(params, 'item_name')
+    item_id = string_param(params, 'item_id') or CATALOG.item_id(
+        item_name) or item_name
+    quantity = params.get('quantity', 1)
+    if not isinstance(quantity, int) or quantity < 1:
+        return {"success": False, "error": "Invalid quantity"}
+    inventory = data["inventory"]
+    available = inventory.get(item_id, 0) if item_id else 0
+
+    if available < quantity:
+        return {"success": False, "error": "Item not available"}
+
+    if available == quantity:
+        del inventory[item_id]
+    else:
+        inventory[item_id] = available - quantity
+    ACHIEVEMENTS.record(data, "items_used", quantity)
+
+    # Apply item effects
+    if item_id == "health_potion":
+        # Heal effect (for future combat system)
+        pass
+    elif item_id == "energy_drink":
+        data["player"]["energy"] = min(
+            data["player"]["max_energy"],
+            data["player"]["energy"] + 30 * quantity)
+
+    return {"success": True}
+
+
+def action_claim_achievement(data, params):
+    """Claim the coin reward of an unlocked achievement"""
+    achievement_index = params.get('achievement_index')
+    if not isinstance(achievement_index, int) or not (
+            0 <= achievement_index < len(CATALOG.achievements)):
+        return {"success": False, "error": "Invalid achievement"}
+
+    achievement = CATALOG.achievements[achievement_index]
+    state = data["achievements"].get(achievement.id) or {}
+    if not state.get("unlocked") or state.get("claimed", False):
+        return {
+            "success": False,
+            "error": "Achievement not available for claiming"
         }
-        data["player"]["class"] = class_map.get(highest_stat, "WARRIOR")
-    elif level >= 10:
-        class_map = {
-            "strength": "WARRIOR",
-            "intelligence": "MAGE",
-            "agility": "ROGUE",
-            "vitality": "TANK",
-            "perception": "SCOUT"
+
+    # Mark as claimed and award coins
+    data["achievements"][achievement.id] = dict(state, claimed=True)
+    data["player"]["coins"] += achievement.reward_coins
+    return {"success": True, "coins_awarded": achievement.reward_coins}
+
+
+def action_add_personal_quest(data, params):
+    """Add a new personal quest"""
+    quest_name = (string_param(params, 'name') or '').strip()
+    quest_description = (string_param(params, 'description') or '').strip()
+
+    if not quest_name:
+        return {"success": False, "error": "Quest name is required"}
+
+    new_quest = add_quest(data, {
+        "name": quest_name,
+        "description": quest_description,
+        "completed": False,
+        "created_date": datetime.now().strftime("%Y-%m-%d"),
+        "reward_xp": 100,
+        "reward_coins": 50
+    })
+    data["quests"]["personal_quests"] += 1
+
+    return {"success": True, "quest": new_quest}
+
+
+def action_complete_personal_quest(data, params):
+    """Complete a personal quest"""
+    quest = get_quest(data, params.get('quest_id'))
+
+    if not quest:
+        return {"success": False, "error": "Quest not found"}
+
+    if quest["completed"]:
+        return {"success": False, "error": "Quest already completed"}
+
+    complete_personal_quest_entry(data, quest,
+                                  datetime.now().strftime("%Y-%m-%d"))
+
+    # Award rewards
+    award_experience(data, quest["reward_xp"])
+    data["player"]["coins"] += quest["reward_coins"]
+
+    # Update personal quests count
+    data["quests"]["personal_quests"] -= 1
+
+    ACHIEVEMENTS.record(data, "personal_quests_completed")
+    return {
+        "success": True,
+        "rewards": {
+            "xp": quest["reward_xp"],
+            "coins": quest["reward_coins"]
         }
-        data["player"]["class"] = class_map.get(highest_stat, "FIGHTER")
+    }
 
-    # Update title based on achievements
-    if data["player"]["max_streak"] >= 30:
-        data["player"]["title"] = "UNSTOPPABLE"
-    elif data["player"]["max_streak"] >= 14:
-        data["player"]["title"] = "DEDICATED"
-    elif data["player"]["level"] >= 15:
-        data["player"]["title"] = "VETERAN"
-    elif data["player"]["level"] >= 5:
-        data["player"]["title"] = "RISING STAR"
 
-    # Update rank
-    update_rank(data)
+def action_delete_personal_quest(data, params):
+    """Delete a personal quest"""
+    quest = remove_quest(data, params.get('quest_id'))
 
+    if quest is None:
+        return {"success": False, "error": "Quest not found"}
 
-def check_achievements(data):
-    """Check and unlock achievements"""
-    achievements = data["achievements"]
-    player = data["player"]
+    # Update personal quests count
+    if not quest["completed"]:
+        data["quests"]["personal_quests"] -= 1
 
-    # First Steps
-    if not achievements[0]["unlocked"] and any(
-            task["completed"] for task in data["daily_tasks"]):
-        achievements[0]["unlocked"] = True
-        # Don't auto-award coins anymore - require manual claiming
+    return {"success": True}
 
-    # Dedication (7-day streak)
-    if not achievements[1]["unlocked"] and player["streak"] >= 7:
-        achievements[1]["unlocked"] = True
-        # Don't auto-award coins anymore - require manual claiming
 
-    # Level Up (level 5)
-    if not achievements[2]["unlocked"] and player["level"] >= 5:
-        achievements[2]["unlocked"] = True
-        # Don't auto-award coins anymore - require manual claiming
+def action_update_settings(data, params):
+    """Change player settings, rescheduling the daily reset if needed"""
+    settings = data.setdefault("settings", {})
+    for key in ("notifications", "sound_effects", "dark_mode"):
+        if key in params:
+            if not isinstance(params[key], bool):
+                return {"success": False, "error": f"Invalid {key}"}
+            settings[key] = params[key]
+    if "daily_reset_time" in params:
+        try:
+            parse_reset_time(params["daily_reset_time"])
+        except ValueError:
+            return {"success": False, "error": "Invalid daily reset time"}
+        settings["daily_reset_time"] = params["daily_reset_time"]
+    if "timezone" in params:
+        try:
+            get_zone(params["timezone"])
+        except ValueError:
+            return {"success": False, "error": "Unknown time zone"}
+        settings["timezone"] = params["timezone"]
+    if "daily_reset_time" in params or "timezone" in params:
+        data["reset_at"] = next_player_reset(data, time.time())
+    return {"success": True, "settings": settings}
 
-    # Quest Master (5 completed quests)
-    completed_quests = sum(
-        1 for quest in data["quests"].values()
-        if isinstance(quest, dict) and quest.get("completed", False))
-    if not achievements[3]["unlocked"] and completed_quests >= 5:
-        achievements[3]["unlocked"] = True
-        # Don't auto-award coins anymore - require manual claiming
 
-    # Unstoppable (30-day streak)
-    if not achievements[4]["unlocked"] and player["streak"] >= 30:
-        achievements[4]["unlocked"] = True
-        # Don't auto-award coins anymore - require manual claiming
+def action_complete_quest(data, params):
+    """Complete a major quest"""
+    quest_name = string_param(params, 'quest_name')
+    definition = CATALOG.quests.get(quest_name) if quest_name else None
+    quest = data["quests"].get(quest_name) if definition else None
 
+    if (not isinstance(quest, dict)
+            or quest["progress"] < definition["max"] or quest["completed"]):
+        return {"success": False, "error": "Quest not ready for completion"}
 
-# Initialize game data
-game_data = load_game_data()
+    quest["completed"] = True
+
+    # Award rewards
+    award_experience(data, definition["reward_xp"])
+    data["player"]["coins"] += definition["reward_coins"]
+
+    ACHIEVEMENTS.record(data, "quests_completed")
+    return {
+        "success": True,
+        "rewards": {
+            "xp": definition["reward_xp"],
+            "coins": definition["reward_coins"]
+        }
+    }
+
+
+# Player actions by name, shared by the single-action routes and /api/batch
+ACTIONS = {
+    "complete_task": action_complete_task,
+    "allocate_stat": action_allocate_stat,
+    "buy_item": action_buy_item,
+    "use_item": action_use_item,
+    "claim_achievement": action_claim_achievement,
+    "add_personal_quest": action_add_personal_quest,
+    "complete_personal_quest": action_complete_personal_quest,
+    "delete_personal_quest": action_delete_personal_quest,
+    "complete_quest": action_complete_quest,
+    "update_settings": action_update_settings,
+}
+
+
+def apply_batch(data, actions):
+    """Apply actions in order, all or nothing
+
+    Returns (success, results, new_data). Derived state is recomputed once
+    at the end; on the first failure the original data is left untouched.
+    """
+    working = thaw(data)
+    results = []
+    with deferred_derived_state() as changed:
+        for action in actions:
+            name = action.get('action') if isinstance(action, dict) else None
+            if name not in ACTIONS:
+                results.append({"success": False, "error": "Unknown action"})
+                return False, results, data
+            result = ACTIONS[name](working, action)
+            results.append(result)
+            if not result.get("success"):
+                return False, results, data
+            # A later action in the batch may claim what this one unlocked
+            ACHIEVEMENTS.notify_player(working)
+    refresh_derived_state(working, changed)
+    return True, results, working
+
+
+class CodecJSONProvider(DefaultJSONProvider):
+    """Flask's JSON (jsonify, request.json) through JSON_CODEC"""
+
+    def dumps(self, obj, **kwargs):
+        try:
+            return JSON_CODEC.dumps(obj, sort_keys=self.sort_keys)
+        except TypeError:
+            # Types only Flask's encoder handles, such as dates
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return JSON_CODEC.loads(s)
+
+
+app.json = CodecJSONProvider(app)
+
+# Initialize the player store
+store = WriteBehindStore(open_store(STORE_BACKEND, STORE_PATH,
+                                   **STORE_OPTIONS.get(STORE_BACKEND, {})),
+                         durability=PERSISTENCE_DURABILITY,
+                         interval=PERSISTENCE_FLUSH_INTERVAL_MS / 1000,
+                         cache_size=PLAYER_CACHE_SIZE,
+                         cache_model=GameState,
+                         hot_size=PLAYER_HOT_CACHE_SIZE,
+                         on_load=index_quests,
+                         to_store=without_indexes)
+# Flush dirty players on shutdown
+atexit.register(store.close)
+import_legacy_game_data()
+
+def archive_leaderboard(window, bucket, rows):
+    """Write the final standings of an expired leaderboard window"""
+    os.makedirs(LEADERBOARD_ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(LEADERBOARD_ARCHIVE_DIR, f"{window}-{bucket}.json")
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({"window": window, "bucket": bucket, "players": rows}, f)
+    os.replace(tmp_path, path)
+
+
+# Per-player push channels for /api/events
+events = EventBroker(heartbeat=EVENTS_HEARTBEAT)
+
+# Leaderboards are indexed in memory and kept current on every save
+leaderboard = Leaderboard(archive=archive_leaderboard)
+leaderboard.build_async(store.iter_players())
+
+
+def scheduled_reset(player_id):
+    """Apply a player's due daily reset, returning their next reset time"""
+    if not store.version_of(player_id):
+        # Deleted since it was scheduled
+        return None
+    data, _version = load_game_data(player_id)
+    return data["reset_at"]
+
+
+# Daily resets are applied in batches as they come due; load_game_data
+# still resets anyone the scheduler has not reached
+reset_scheduler = ResetScheduler(scheduled_reset,
+                                 batch_size=RESET_BATCH_SIZE,
+                                 interval=RESET_INTERVAL)
+reset_scheduler.seed_async(store.iter_players())
+reset_scheduler.start()
+atexit.register(reset_scheduler.close)
 
 
 @app.route('/')
@@ -422,342 +850,273 @@ def index():
 
 @app.route('/api/player')
 def get_player():
+    game_data = get_game_data()
     return jsonify(game_data["player"])
 
 
-@app.route('/api/daily-tasks')
-def get_daily_tasks():
-    total_seconds = game_data["timer"]["hours"] * 3600 + game_data["timer"][
-        "minutes"] * 60 + game_data["timer"]["seconds"]
-    timer_string = f"{game_data['timer']['hours']:02d}:{game_data['timer']['minutes']:02d}:{game_data['timer']['seconds']:02d}"
+def timer_payload(game_data):
+    """Countdown to the next daily reset, computed from its deadline"""
+    total_seconds = max(int(game_data["reset_at"] - time.time()), 0)
+    hours, remainder = divmod(total_seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return {
+        "timer": f"{hours:02d}:{minutes:02d}:{seconds:02d}",
+        "timer_seconds": total_seconds,
+        "reset_at": game_data["reset_at"]
+    }
 
-    return jsonify({
+
+def daily_tasks_section(game_data):
+    """Daily tasks, streak and reset deadline; unchanged as time passes"""
+    return {
         "tasks": game_data["daily_tasks"],
-        "timer": timer_string,
-        "timer_seconds": total_seconds,
-        "streak": game_data["player"]["streak"]
-    })
+        "streak": game_data["player"]["streak"],
+        "reset_at": game_data["reset_at"]
+    }
+
+
+def daily_tasks_payload(game_data):
+    """Daily tasks with the reset timer and current streak"""
+    return dict(daily_tasks_section(game_data), **timer_payload(game_data))
+
+
+# Sections served by /api/state, matching the individual endpoints
+STATE_SECTIONS = {
+    "player": lambda game_data: game_data["player"],
+    "daily_tasks": daily_tasks_section,
+    "inventory":
+    lambda game_data: CATALOG.inventory_view(game_data["inventory"]),
+    "quests": lambda game_data: CATALOG.quests_view(game_data["quests"]),
+    "personal_quests": lambda game_data: personal_quests_page(game_data),
+    "shop": lambda game_data: CATALOG.shop,
+    "achievements":
+    lambda game_data: CATALOG.achievements_view(game_data["achievements"]),
+}
+
+
+@app.route('/api/daily-tasks')
+def get_daily_tasks():
+    game_data = get_game_data()
+    return jsonify(daily_tasks_payload(game_data))
 
 
 @app.route('/api/inventory')
 def get_inventory():
-    return jsonify(game_data["inventory"])
+    game_data = get_game_data()
+    return jsonify(CATALOG.inventory_view(game_data["inventory"]))
 
 
 @app.route('/api/quests')
 def get_quests():
-    return jsonify(game_data["quests"])
+    game_data = get_game_data()
+    return jsonify(CATALOG.quests_view(game_data["quests"]))
 
 
 @app.route('/api/achievements')
 def get_achievements():
-    return jsonify(game_data["achievements"])
+    game_data = get_game_data()
+    return jsonify(CATALOG.achievements_view(game_data["achievements"]))
+
+
+def catalog_response(body):
+    """Catalog JSON that browsers and proxies may cache until it changes"""
+    headers = {
+        "ETag": f'"{CATALOG.version}"',
+        "Cache-Control": f"public, max-age={CATALOG_MAX_AGE}"
+    }
+    if CATALOG.version in request.if_none_match:
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype='application/json', headers=headers)
 
 
 @app.route('/api/shop')
 def get_shop():
-    return jsonify(game_data["shop"])
+    return catalog_response(CATALOG.shop_json)
+
+
+@app.route('/api/catalog')
+def get_catalog():
+    """Get every item, shop, quest and achievement definition"""
+    return catalog_response(CATALOG.json)
+
+
+def conflict_response():
+    return jsonify({
+        "success": False,
+        "error": "Too many concurrent updates, please retry"
+    }), 409
+
+
+def run_action(name, params):
+    """Apply one action for the calling player and save if it succeeded"""
+    if params is None:
+        params = {}
+    elif not isinstance(params, dict):
+        return jsonify({
+            "success": False,
+            "error": "Request body must be an object"
+        }), 400
+    result = mutate_game_data(lambda data: (ACTIONS[name](data, params), data))
+    if result is None:
+        return conflict_response()
+    return jsonify(result)
 
 
 @app.route('/api/complete-task', methods=['POST'])
 def complete_task():
-    task_index = request.json.get('task_index')
-    if 0 <= task_index < len(game_data["daily_tasks"]):
-        task = game_data["daily_tasks"][task_index]
-        if not task["completed"]:
-            task["completed"] = True
-            task["progress"] = task["max"]
-
-            # Award XP and coins
-            award_experience(game_data, task["xp_reward"])
-            game_data["player"]["coins"] += task["coin_reward"]
-
-            # Check if all tasks completed for streak
-            if all(t["completed"] for t in game_data["daily_tasks"]):
-                game_data["player"]["streak"] += 1
-                game_data["player"]["max_streak"] = max(
-                    game_data["player"]["max_streak"],
-                    game_data["player"]["streak"])
-
-            # Update quest progress
-            if "PUSHUPS" in task["name"] or "SITUPS" in task["name"]:
-                game_data["quests"]["strength_training"]["progress"] = min(
-                    100,
-                    game_data["quests"]["strength_training"]["progress"] + 10)
-            elif "MEDITATE" in task["name"]:
-                game_data["quests"]["spiritual_training"]["progress"] = min(
-                    100,
-                    game_data["quests"]["spiritual_training"]["progress"] + 15)
-            elif "RUN" in task["name"]:
-                game_data["quests"]["discipline"]["progress"] = min(
-                    100, game_data["quests"]["discipline"]["progress"] + 20)
-
-            check_achievements(game_data)
-            save_game_data(game_data)
-
-    return jsonify({"success": True})
+    return run_action('complete_task', request.json)
 
 
 @app.route('/api/allocate-stat', methods=['POST'])
 def allocate_stat():
-    stat_name = request.json.get('stat_name')
-    if stat_name in game_data["player"]["stats"] and game_data["player"][
-            "stats"]["available_points"] > 0:
-        game_data["player"]["stats"][stat_name] += 1
-        game_data["player"]["stats"]["available_points"] -= 1
-
-        # Update damage reduction based on stats
-        game_data["player"]["physical_damage_reduction"] = int(
-            game_data["player"]["stats"]["vitality"] * 0.5)
-        game_data["player"]["magical_damage_reduction"] = int(
-            game_data["player"]["stats"]["intelligence"] * 0.3)
-
-        update_class_and_title(game_data)
-        save_game_data(game_data)
-
-    return jsonify({"success": True})
+    return run_action('allocate_stat', request.json)
 
 
 @app.route('/api/buy-item', methods=['POST'])
 def buy_item():
-    item_name = request.json.get('item_name')
-    shop_item = next(
-        (item for item in game_data["shop"] if item["name"] == item_name),
-        None)
-
-    if shop_item and game_data["player"]["coins"] >= shop_item["price"]:
-        game_data["player"]["coins"] -= shop_item["price"]
-
-        if shop_item["type"] == "consumable":
-            # Add to inventory
-            existing_item = next((item for item in game_data["inventory"]
-                                  if item["name"] == item_name), None)
-            if existing_item:
-                existing_item["quantity"] += 1
-            else:
-                game_data["inventory"].append({
-                    "name": item_name,
-                    "quantity": 1,
-                    "type": shop_item["type"],
-                    "effect": shop_item["effect"]
-                })
-        elif shop_item["type"] == "permanent":
-            if item_name == "Stat Point":
-                game_data["player"]["stats"]["available_points"] += 1
-
-        save_game_data(game_data)
-        return jsonify({"success": True})
-
-    return jsonify({"success": False, "error": "Insufficient coins"})
+    return run_action('buy_item', request.json)
 
 
 @app.route('/api/use-item', methods=['POST'])
 def use_item():
-    item_name = request.json.get('item_name')
-    item = next((item for item in game_data["inventory"]
-                 if item["name"] == item_name and item["quantity"] > 0), None)
-
-    if item:
-        item["quantity"] -= 1
-        if item["quantity"] == 0:
-            game_data["inventory"].remove(item)
-
-        # Apply item effects
-        if item_name == "Health Potion":
-            # Heal effect (for future combat system)
-            pass
-        elif item_name == "Energy Drink":
-            game_data["player"]["energy"] = min(
-                game_data["player"]["max_energy"],
-                game_data["player"]["energy"] + 30)
-
-        save_game_data(game_data)
-        return jsonify({"success": True})
-
-    return jsonify({"success": False, "error": "Item not available"})
+    return run_action('use_item', request.json)
 
 
 @app.route('/api/claim-achievement', methods=['POST'])
 def claim_achievement():
-    achievement_index = request.json.get('achievement_index')
-    if 0 <= achievement_index < len(game_data["achievements"]):
-        achievement = game_data["achievements"][achievement_index]
-        if achievement["unlocked"] and not achievement.get("claimed", False):
-            # Mark as claimed and award coins
-            achievement["claimed"] = True
-            game_data["player"]["coins"] += achievement["reward_coins"]
-
-            save_game_data(game_data)
-            return jsonify({
-                "success": True,
-                "coins_awarded": achievement["reward_coins"]
-            })
-        else:
-            return jsonify({
-                "success": False,
-                "error": "Achievement not available for claiming"
-            })
-
-    return jsonify({"success": False, "error": "Invalid achievement"})
+    return run_action('claim_achievement', request.json)
 
 
 @app.route('/api/update-timer', methods=['POST'])
 def update_timer():
-    """Update countdown timer"""
-    if game_data["timer"]["seconds"] > 0:
-        game_data["timer"]["seconds"] -= 1
-    elif game_data["timer"]["minutes"] > 0:
-        game_data["timer"]["minutes"] -= 1
-        game_data["timer"]["seconds"] = 59
-    elif game_data["timer"]["hours"] > 0:
-        game_data["timer"]["hours"] -= 1
-        game_data["timer"]["minutes"] = 59
-        game_data["timer"]["seconds"] = 59
+    """Get the countdown to the next daily reset
 
-    save_game_data(game_data)
-    return jsonify({"success": True})
+    Kept for older clients. The countdown is derived from the stored reset
+    deadline, so nothing is written.
+    """
+    game_data = get_game_data()
+    return jsonify(dict(timer_payload(game_data), success=True))
+
+
+def personal_quests_page(game_data, **query):
+    """A page of personal quests with the cursor for the next one"""
+    quests, next_cursor = query_quests(game_data, **query)
+    return {"quests": quests, "next_cursor": next_cursor}
 
 
 @app.route('/api/personal-quests')
 def get_personal_quests():
-    """Get personal quests"""
-    if "personal_quest_list" not in game_data:
-        game_data["personal_quest_list"] = []
-    return jsonify(game_data["personal_quest_list"])
+    """Get one page of personal quests
+
+    Filters: completed=true|false, created_from/created_to and
+    completed_from/completed_to (YYYY-MM-DD, inclusive) and prefix= on the
+    name. Pass the returned next_cursor as cursor= for the next page.
+    """
+    game_data = get_game_data()
+    args = request.args
+    filters = {}
+
+    def bad_request(error):
+        return jsonify({"success": False, "error": error}), 400
+
+    if 'completed' in args:
+        completed = args['completed'].lower()
+        if completed not in ('true', 'false', '1', '0'):
+            return bad_request("completed must be true or false")
+        filters['completed'] = completed in ('true', '1')
+    for name in ('created_from', 'created_to', 'completed_from',
+                 'completed_to'):
+        if args.get(name):
+            try:
+                datetime.strptime(args[name], "%Y-%m-%d")
+            except ValueError:
+                return bad_request(f"{name} must be a YYYY-MM-DD date")
+            filters[name] = args[name]
+    try:
+        limit = min(max(int(args.get('limit', DEFAULT_PAGE_SIZE)), 1),
+                    MAX_PAGE_SIZE)
+    except ValueError:
+        return bad_request("Invalid pagination parameters")
+
+    try:
+        page = personal_quests_page(game_data,
+                                    prefix=args.get('prefix'),
+                                    cursor=args.get('cursor'),
+                                    limit=limit,
+                                    **filters)
+    except ValueError as e:
+        return bad_request(str(e))
+    return jsonify(page)
 
 
 @app.route('/api/add-personal-quest', methods=['POST'])
 def add_personal_quest():
     """Add a new personal quest"""
-    quest_data = request.json
-    quest_name = quest_data.get('name', '').strip()
-    quest_description = quest_data.get('description', '').strip()
-
-    if not quest_name:
-        return jsonify({"success": False, "error": "Quest name is required"})
-
-    if "personal_quest_list" not in game_data:
-        game_data["personal_quest_list"] = []
-
-    new_quest = {
-        "id": len(game_data["personal_quest_list"]) + 1,
-        "name": quest_name,
-        "description": quest_description,
-        "completed": False,
-        "created_date": datetime.now().strftime("%Y-%m-%d"),
-        "reward_xp": 100,
-        "reward_coins": 50
-    }
-
-    game_data["personal_quest_list"].append(new_quest)
-    game_data["quests"]["personal_quests"] = len(
-        [q for q in game_data["personal_quest_list"] if not q["completed"]])
-
-    save_game_data(game_data)
-    return jsonify({"success": True, "quest": new_quest})
+    return run_action('add_personal_quest', request.json)
 
 
 @app.route('/api/complete-personal-quest', methods=['POST'])
 def complete_personal_quest():
     """Complete a personal quest"""
-    quest_id = request.json.get('quest_id')
-
-    if "personal_quest_list" not in game_data:
-        return jsonify({"success": False, "error": "No personal quests found"})
-
-    quest = next(
-        (q for q in game_data["personal_quest_list"] if q["id"] == quest_id),
-        None)
-
-    if not quest:
-        return jsonify({"success": False, "error": "Quest not found"})
-
-    if quest["completed"]:
-        return jsonify({"success": False, "error": "Quest already completed"})
-
-    quest["completed"] = True
-    quest["completion_date"] = datetime.now().strftime("%Y-%m-%d")
-
-    # Award rewards
-    award_experience(game_data, quest["reward_xp"])
-    game_data["player"]["coins"] += quest["reward_coins"]
-
-    # Update personal quests count
-    game_data["quests"]["personal_quests"] = len(
-        [q for q in game_data["personal_quest_list"] if not q["completed"]])
-
-    check_achievements(game_data)
-    save_game_data(game_data)
-
-    return jsonify({
-        "success": True,
-        "rewards": {
-            "xp": quest["reward_xp"],
-            "coins": quest["reward_coins"]
-        }
-    })
+    return run_action('complete_personal_quest', request.json)
 
 
 @app.route('/api/delete-personal-quest', methods=['POST'])
 def delete_personal_quest():
     """Delete a personal quest"""
-    quest_id = request.json.get('quest_id')
-
-    if "personal_quest_list" not in game_data:
-        return jsonify({"success": False, "error": "No personal quests found"})
-
-    quest_index = next((i
-                        for i, q in enumerate(game_data["personal_quest_list"])
-                        if q["id"] == quest_id), None)
-
-    if quest_index is None:
-        return jsonify({"success": False, "error": "Quest not found"})
-
-    game_data["personal_quest_list"].pop(quest_index)
-
-    # Update personal quests count
-    game_data["quests"]["personal_quests"] = len(
-        [q for q in game_data["personal_quest_list"] if not q["completed"]])
-
-    save_game_data(game_data)
-    return jsonify({"success": True})
+    return run_action('delete_personal_quest', request.json)
 
 
 @app.route('/api/complete-quest', methods=['POST'])
 def complete_quest():
     """Complete a major quest"""
-    quest_name = request.json.get('quest_name')
-
-    if quest_name in game_data["quests"] and isinstance(
-            game_data["quests"][quest_name], dict):
-        quest = game_data["quests"][quest_name]
-        if quest["progress"] >= quest["max"] and not quest["completed"]:
-            quest["completed"] = True
-
-            # Award rewards
-            award_experience(game_data, quest["reward_xp"])
-            game_data["player"]["coins"] += quest["reward_coins"]
+    return run_action('complete_quest', request.json)
+
+
+@app.route('/api/update-settings', methods=['POST'])
+def update_settings():
+    return run_action('update_settings', request.json)
+
+
+@app.route('/api/batch', methods=['POST'])
+def batch_actions():
+    """Apply an ordered list of actions atomically with a single save
+
+    Body: {"actions": [{"action": "buy_item", "item_name": "Health Potion",
+    "quantity": 10}, {"action": "allocate_stat", "stat_name": "strength",
+    "points": 5}, ...]}
+    """
+    body = request.json
+    actions = body.get('actions') if isinstance(body, dict) else None
+    if not isinstance(actions, list) or not actions:
+        return jsonify({"success": False, "error": "No actions given"}), 400
+    if len(actions) > MAX_BATCH_ACTIONS:
+        return jsonify({
+            "success": False,
+            "error": f"At most {MAX_BATCH_ACTIONS} actions per batch"
+        }), 400
+
+    def run_batch(game_data):
+        success, results, new_data = apply_batch(game_data, actions)
+        if not success:
+            return {
+                "success": False,
+                "error": "Batch rolled back",
+                "failed_index": len(results) - 1,
+                "results": results
+            }, game_data
+        return {"success": True, "results": results}, new_data
 
-            check_achievements(game_data)
-            save_game_data(game_data)
-
-            return jsonify({
-                "success": True,
-                "rewards": {
-                    "xp": quest["reward_xp"],
-                    "coins": quest["reward_coins"]
-                }
-            })
-
-    return jsonify({
-        "success": False,
-        "error": "Quest not ready for completion"
-    })
+    result = mutate_game_data(run_batch)
+    if result is None:
+        return conflict_response()
+    return jsonify(result)
 
 
 @app.route('/api/stats')
 def get_stats():
     """Get comprehensive player statistics"""
+    game_data = get_game_data()
     return jsonify({
         "total_tasks_completed":
         sum(1 for task in game_data["daily_tasks"] if task["completed"]),
@@ -766,8 +1125,8 @@ def get_stats():
         "highest_streak":
         game_data["player"]["max_streak"],
         "achievements_unlocked":
-        sum(1 for achievement in game_data["achievements"]
-            if achievement["unlocked"]),
+        sum(1 for state in game_data["achievements"].values()
+            if state.get("unlocked")),
         "quests_completed":
         sum(1 for quest in game_data["quests"].values()
             if isinstance(quest, dict) and quest.get("completed", False))
@@ -776,125 +1135,219 @@ def get_stats():
 
 @app.route('/api/leaderboard')
 def get_leaderboard():
-    """Get leaderboard data with top players"""
-    # For demo purposes, create sample leaderboard data
-    # In a real app, this would query a database of all players
-    current_player = game_data["player"]
-
-    # Create sample players for demonstration
-    sample_players = [{
-        "name": current_player["name"],
-        "level": current_player["level"],
-        "total_experience": current_player["total_experience"],
-        "rank": current_player["rank"],
-        "class": current_player["class"],
-        "max_streak": current_player["max_streak"],
-        "rank_score": calculate_rank_score(game_data)
-    }]
-
-    # Add some sample competitors
-    competitors = [{
-        "name": "SHADOW KING",
-        "level": 25,
-        "total_experience": 15000,
-        "rank": "S",
-        "class": "ARCHMAGE",
-        "max_streak": 45,
-        "rank_score": 1250
-    }, {
-        "name": "LIGHTNING HUNTER",
-        "level": 22,
-        "total_experience": 12000,
-        "rank": "A",
-        "class": "ASSASSIN",
-        "max_streak": 35,
-        "rank_score": 980
-    }, {
-        "name": "IRON FIST",
-        "level": 20,
-        "total_experience": 10000,
-        "rank": "A",
-        "class": "BERSERKER",
-        "max_streak": 30,
-        "rank_score": 850
-    }, {
-        "name": "MYSTIC SAGE",
-        "level": 18,
-        "total_experience": 8500,
-        "rank": "B",
-        "class": "MAGE",
-        "max_streak": 28,
-        "rank_score": 720
-    }, {
-        "name": "STORM BLADE",
-        "level": 16,
-        "total_experience": 7000,
-        "rank": "B",
-        "class": "WARRIOR",
-        "max_streak": 25,
-        "rank_score": 650
-    }, {
-        "name": "VOID WALKER",
-        "level": 14,
-        "total_experience": 5500,
-        "rank": "C",
-        "class": "ROGUE",
-        "max_streak": 20,
-        "rank_score": 580
-    }, {
-        "name": "EARTH GUARDIAN",
-        "level": 12,
-        "total_experience": 4000,
-        "rank": "C",
-        "class": "TANK",
-        "max_streak": 15,
-        "rank_score": 450
-    }, {
-        "name": "WIND RUNNER",
-        "level": 10,
-        "total_experience": 3000,
-        "rank": "D",
-        "class": "SCOUT",
-        "max_streak": 12,
-        "rank_score": 350
-    }, {
-        "name": "FIRE STARTER",
-        "level": 8,
-        "total_experience": 2000,
-        "rank": "D",
-        "class": "FIGHTER",
-        "max_streak": 10,
-        "rank_score": 280
-    }, {
-        "name": "ICE BREAKER",
-        "level": 6,
-        "total_experience": 1200,
-        "rank": "E",
-        "class": "BEGINNER",
-        "max_streak": 8,
-        "rank_score": 180
-    }]
-
-    # Add current player to the list
-    all_players = sample_players + competitors
-
-    # Sort by total experience (descending)
-    all_players.sort(key=lambda x: x["total_experience"], reverse=True)
-
-    # Add position numbers
-    for i, player in enumerate(all_players):
-        player["position"] = i + 1
-
-    # Find current player position
-    current_player_position = next(
-        (p["position"]
-         for p in all_players if p["name"] == current_player["name"]), 1)
+    """Get a page of the leaderboard and the caller's position
+
+    by= orders by total_experience or rank_score, or ranks XP earned in
+    the current daily, weekly or season window.
+    """
+    game_data = get_game_data()
+    order_by = request.args.get('by', 'total_experience')
+    is_window = order_by in leaderboard.windows
+    if order_by not in leaderboard.orderings and not is_window:
+        return jsonify({
+            "success": False,
+            "error": "Invalid leaderboard ordering"
+        }), 400
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', 10)), 1), 100)
+        around = request.args.get('around')
+        around = min(max(int(around), 0), 50) if around is not None else None
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": "Invalid pagination parameters"
+        }), 400
+
+    # Make sure the caller is indexed even if the background build is
+    # still running
+    leaderboard.update(request_player_id(), game_data["player"])
+
+    def public_entries(entries):
+        for entry in entries:
+            entry["current_player"] = entry.pop("player_id") == g.player_id
+        return entries
+
+    response = {
+        "players":
+        public_entries(leaderboard.page(order_by, offset, limit)),
+        "current_player_position":
+        leaderboard.position(order_by, g.player_id),
+        "total_players":
+        leaderboard.window_size(order_by) if is_window else len(leaderboard),
+        "order_by": order_by,
+        "offset": offset,
+        "limit": limit
+    }
+    if is_window:
+        response["bucket"] = leaderboard.bucket(order_by)
+    if around is not None:
+        response["around"] = public_entries(
+            leaderboard.around(order_by, g.player_id, around))
+    return jsonify(response)
+
+
+@app.route('/api/events')
+def player_events():
+    """Stream the player's state deltas as Server-Sent Events"""
+    player_id = current_player_id()
+    last_event_id = (request.headers.get('Last-Event-ID')
+                     or request.args.get('last_event_id'))
+    return Response(events.stream(player_id, last_event_id),
+                    mimetype='text/event-stream',
+                    headers={
+                        "Cache-Control": "no-cache",
+                        "X-Accel-Buffering": "no"
+                    })
+
+
+@app.route('/api/admin/persistence')
+def get_persistence_stats():
+    """Get write-behind, player cache, conflict and reset counters"""
+    return jsonify(
+        dict(store.stats(),
+             **concurrency_stats,
+             reset_scheduler=reset_scheduler.stats()))
+
+
+def admin_denied():
+    """403 response unless the request carries the admin token, else None"""
+    token = request.headers.get('X-Admin-Token', '')
+    if not ADMIN_TOKEN or not hmac.compare_digest(token.encode(),
+                                                  ADMIN_TOKEN.encode()):
+        return jsonify({
+            "success": False,
+            "error": "Admin token required"
+        }), 403
+    return None
+
+
+@app.route('/api/admin/export')
+def export_all_players():
+    """Stream every player as gzipped NDJSON, one player per line
+
+    after= resumes an interrupted download after the last player received.
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    batches = export_batches(store,
+                             request.args.get('after', ''),
+                             codec=JSON_CODEC)
+    return Response((member for _last_id, _count, member in batches),
+                    mimetype='application/gzip',
+                    headers={
+                        "Content-Disposition":
+                        'attachment; filename="players.ndjson.gz"'
+                    })
+
+
+@app.route('/api/admin/import', methods=['POST'])
+def import_all_players():
+    """Import players from a gzipped or plain NDJSON request body
+
+    Valid players are saved in batches and invalid lines are skipped. The
+    response's "lines" is the last line saved; after an interrupted
+    upload, send the file again with start_line= set to it.
+    skip_existing=true keeps players already in the store.
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    try:
+        start_line = int(request.args.get('start_line', '0'))
+    except ValueError:
+        return jsonify({"success": False, "error": "Invalid start_line"}), 400
+    skip_existing = request.args.get('skip_existing') == 'true'
+    result = {
+        "lines": start_line,
+        "imported": 0,
+        "skipped": 0,
+        "invalid": 0,
+        "errors": []
+    }
 
-    return jsonify({
-        "players": all_players[:10],  # Top 10
-        "current_player_position": current_player_position,
-        "total_players": len(all_players)
-    })
+    def invalid(line_number, message):
+        result["invalid"] += 1
+        if len(result["errors"]) < MAX_IMPORT_ERRORS:
+            result["errors"].append(f"line {line_number}: {message}")
+
+    batches = import_batches(open_lines(request.stream),
+                             start_line=start_line,
+                             codec=JSON_CODEC,
+                             errors=invalid)
+    try:
+        for line_number, players in batches:
+            # Saved as loaded from the store, with their quests indexed
+            players = [(player_id, index_quests(data))
+                       for player_id, data in players]
+            saved, skipped = save_players(store, players, skip_existing)
+            for player_id, data in saved:
+                leaderboard.update(player_id, data["player"])
+                # Saves from before reset_at are reset when next loaded
+                reset_scheduler.schedule(player_id,
+                                         data.get("reset_at") or time.time())
+            result["lines"] = line_number
+            result["imported"] += len(saved)
+            result["skipped"] += len(skipped)
+    except (OSError, EOFError):
+        # Truncated or corrupt gzip data
+        return jsonify(dict(result,
+                            success=False,
+                            error="Import body ended unexpectedly")), 400
+    return jsonify(dict(result, success=True))
+
+
+@app.route('/api/state')
+def get_state():
+    """Get several state sections in one response
+
+    fields= selects sections (all by default). Each section carries a
+    content version; sections listed in known=name:version that still
+    match are sent without data. The response has a strong ETag so an
+    unchanged selection returns 304 Not Modified.
+    """
+    game_data = get_game_data()
+    fields = request.args.get('fields')
+    names = fields.split(',') if fields else list(STATE_SECTIONS)
+    unknown = [name for name in names if name not in STATE_SECTIONS]
+    if unknown:
+        return jsonify({
+            "success": False,
+            "error": f"Unknown state sections: {', '.join(unknown)}"
+        }), 400
+
+    known = {}
+    for item in request.args.get('known', '').split(','):
+        name, _, version = item.partition(':')
+        if name and version:
+            known[name] = version
+
+    parts = []
+    versions = []
+    for name in names:
+        body = JSON_CODEC.dumps(STATE_SECTIONS[name](game_data),
+                                sort_keys=True)
+        version = hashlib.sha1(body.encode()).hexdigest()[:16]
+        versions.append(f"{name}:{version}")
+        if known.get(name) == version:
+            parts.append(f'"{name}":{{"version":"{version}",'
+                         f'"unchanged":true}}')
+        else:
+            parts.append(f'"{name}":{{"version":"{version}","data":{body}}}')
+
+    etag = hashlib.sha1((",".join(versions) + "|" +
+                         request.args.get('known', '')).encode()).hexdigest()
+    headers = {
+        "ETag": f'"{etag}"',
+        "Cache-Control": "private, no-cache",
+        "Vary": "Cookie, X-Player-Id"
+    }
+    if etag in request.if_none_match:
+        return Response(status=304, headers=headers)
+    return Response('{"sections":{' + ",".join(parts) + '}}',
+                    mimetype='application/json',
+                    headers=headers)
 
 
 # Legacy endpoint for compatibility with existing frontend
@@ -0,0 +1,278 @@
+"""Bulk maintenance over every player in the store
+
+Usage: python maintenance.py TASK [--workers N] [--chunk-size N]
+                             [--checkpoint PATH] [--xp-base N]
+                             [--xp-growth F]
+
+Tasks:
+  daily-reset        apply due daily resets (streak check, task scaling,
+                     energy restore)
+  recompute-derived  recompute class, title, rank score, rank and damage
+                     reductions, e.g. after changing the rank thresholds
+  recompute-levels   recompute level and XP progress from total experience
+                     with a new XP curve; level-up rewards are not re-granted
+                     or taken back
+
+Players are read in id order in chunks, processed in a pool of worker
+processes and written back with one compare-and-swap transaction per chunk.
+Players changed by the running server in the meantime are reprocessed from
+their latest state. Progress is checkpointed after every chunk, so an
+interrupted run started again with the same checkpoint continues where it
+stopped. The store is chosen by SOLO_STORE, SOLO_DB_PATH and
+SOLO_STORE_BINARY, as for the server; run journal stores only while the
+server is stopped.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from derived import DerivedState
+from progression import XPCurve
+from scheduler import check_daily_reset
+from storage import VersionConflict, open_store
+
+# Attempts to reprocess a player that changed during its chunk
+MAX_CONFLICT_RETRIES = 3
+
+
+def daily_reset_task():
+    # Saves from before reset_at are upgraded and reset when next loaded
+    return lambda data: "reset_at" in data and check_daily_reset(data)
+
+
+def recompute_derived_task():
+    derived = DerivedState()
+
+    def apply(data):
+        before = dict(data["player"])
+        derived.refresh(data["player"])
+        return data["player"] != before
+
+    return apply
+
+
+def recompute_levels_task(xp_base=100, xp_growth=1.2):
+    curve = XPCurve(base_xp=xp_base, growth=xp_growth)
+    derived = DerivedState()
+
+    def apply(data):
+        player = data["player"]
+        before = dict(player)
+        (player["level"], player["current_xp"],
+         player["xp_to_next_level"]) = curve.level_for(
+             player["total_experience"])
+        derived.refresh(player, ("level", ))
+        return player != before
+
+    return apply
+
+
+# Task name -> factory for a function that updates one player's data in
+# place and returns True if it changed anything
+TASKS = {
+    "daily-reset": daily_reset_task,
+    "recompute-derived": recompute_derived_task,
+    "recompute-levels": recompute_levels_task,
+}
+
+# The task each worker process applies, set up by _init_worker
+_task = None
+
+
+def _init_worker(name, options):
+    global _task
+    _task = TASKS[name](**options)
+
+
+def _run_chunk(chunk):
+    """Apply the worker's task to (player_id, data, version) rows
+
+    Returns the changed rows as (player_id, version, data).
+    """
+    return [(player_id, version, data) for player_id, data, version in chunk
+            if _task(data)]
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def load_checkpoint(path, task, options):
+    """Saved progress of a run, or a fresh start if there is none"""
+    state = {
+        "task": task,
+        "options": options,
+        "after": "",
+        "processed": 0,
+        "updated": 0,
+        "conflicts": 0,
+        "skipped": 0,
+        "elapsed": 0.0
+    }
+    if path is None or not os.path.exists(path):
+        return state
+    with open(path) as f:
+        saved = json.load(f)
+    if saved.get("task") != task or saved.get("options") != options:
+        raise ValueError(f"Checkpoint {path} is for a different run")
+    state.update(saved)
+    return state
+
+
+def save_checkpoint(path, state):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def _retry_conflicts(store, task, player_ids, op):
+    """Reprocess players from their latest state; (updated, skipped)"""
+    updated = skipped = 0
+    for player_id in player_ids:
+        for _ in range(MAX_CONFLICT_RETRIES):
+            loaded = store.load_versioned(player_id)
+            if loaded is None:
+                break
+            data, version = loaded
+            if not task(data):
+                break
+            try:
+                store.compare_and_swap(player_id, version, data, op=op)
+            except VersionConflict:
+                continue
+            updated += 1
+            break
+        else:
+            skipped += 1
+    return updated, skipped
+
+
+def run_maintenance(store,
+                    task,
+                    options=None,
+                    workers=None,
+                    chunk_size=500,
+                    checkpoint=None,
+                    progress=None):
+    """Apply a task to every player and return the run's counters
+
+    Chunks are committed in id order, and the checkpoint file (if given)
+    records the last committed player after each one. progress(state) is
+    called after every chunk. The checkpoint is removed when the run
+    completes.
+    """
+    if task not in TASKS:
+        raise ValueError(f"Unknown maintenance task: {task}")
+    options = options or {}
+    state = load_checkpoint(checkpoint, task, options)
+    local_task = TASKS[task](**options)
+    op = f"maintenance:{task}"
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter() - state["elapsed"]
+
+    rows = store.iter_versioned(after=state["after"], batch_size=chunk_size)
+    in_flight = deque()
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_worker,
+                             initargs=(task, options)) as pool:
+        chunks = _chunks(rows, chunk_size)
+        while True:
+            # Keep every worker busy with one chunk queued behind it
+            while len(in_flight) < workers * 2:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                in_flight.append(
+                    (chunk[-1][0], len(chunk), pool.submit(_run_chunk,
+                                                           chunk)))
+            if not in_flight:
+                break
+            last_id, count, future = in_flight.popleft()
+            changed = future.result()
+            conflicts = store.compare_and_swap_many(
+                (player_id, version, data, op)
+                for player_id, version, data in changed)
+            updated, skipped = _retry_conflicts(store, local_task, conflicts,
+                                                op)
+
+            state["after"] = last_id
+            state["processed"] += count
+            state["updated"] += len(changed) - len(conflicts) + updated
+            state["conflicts"] += len(conflicts)
+            state["skipped"] += skipped
+            state["elapsed"] = time.perf_counter() - started
+            if checkpoint is not None:
+                save_checkpoint(checkpoint, state)
+            if progress is not None:
+                progress(state)
+
+    if checkpoint is not None and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    state["elapsed"] = time.perf_counter() - started
+    return state
+
+
+def report(state):
+    rate = state["processed"] / state["elapsed"] if state["elapsed"] else 0
+    print(
+        f"{state['processed']:,} players, {state['updated']:,} updated, "
+        f"{state['conflicts']:,} conflicts, {rate:,.0f} players/s "
+        f"(last id {state['after']!r})",
+        file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a maintenance task over every player")
+    parser.add_argument("task", choices=sorted(TASKS))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--checkpoint",
+                        help="progress file for resuming an interrupted run")
+    parser.add_argument("--xp-base",
+                        type=int,
+                        default=int(os.environ.get('SOLO_XP_BASE', '100')))
+    parser.add_argument("--xp-growth",
+                        type=float,
+                        default=float(os.environ.get('SOLO_XP_GROWTH',
+                                                     '1.2')))
+    args = parser.parse_args()
+
+    options = {}
+    if args.task == "recompute-levels":
+        options = {"xp_base": args.xp_base, "xp_growth": args.xp_growth}
+    backend = os.environ.get('SOLO_STORE', 'sqlite')
+    path = os.environ.get(
+        'SOLO_DB_PATH',
+        'game_data.journal' if backend == 'journal' else 'game_data.db')
+    store_options = {}
+    if backend == 'sqlite' and os.environ.get('SOLO_STORE_BINARY'):
+        store_options["binary"] = os.environ['SOLO_STORE_BINARY']
+    store = open_store(backend, path, **store_options)
+    try:
+        state = run_maintenance(store,
+                                args.task,
+                                options=options,
+                                workers=args.workers,
+                                chunk_size=args.chunk_size,
+                                checkpoint=args.checkpoint,
+                                progress=report)
+    finally:
+        store.close()
+    report(state)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import keyword
+import sys
+
+_ABSENT = object()
+
+
+def _attr(key):
+    return key + "_" if keyword.iskeyword(key) else key
+
+
+class _Model:
+    """Slotted record converted to and from one JSON object
+
+    FIELDS are the JSON keys held in slots (a keyword such as "class" is
+    stored as class_). Keys the model does not know are kept in extra, and
+    keys missing from a save stay missing, so conversion round-trips. The
+    INTERNED fields come from a small vocabulary and share one string
+    object across players.
+    """
+
+    __slots__ = ("extra", )
+    FIELDS = ()
+    INTERNED = ()
+    NESTED = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._ATTRS = tuple((key, _attr(key)) for key in cls.FIELDS)
+        cls._KNOWN = frozenset(cls.FIELDS)
+
+    @classmethod
+    def from_dict(cls, data):
+        self = cls.__new__(cls)
+        for key, attr in cls._ATTRS:
+            value = data.get(key, _ABSENT)
+            if value is not _ABSENT:
+                nested = cls.NESTED.get(key)
+                if nested is not None:
+                    value = nested.from_dict(value)
+                elif key in cls.INTERNED and isinstance(value, str):
+                    value = sys.intern(value)
+            setattr(self, attr, value)
+        self.extra = None
+        if not cls._KNOWN.issuperset(data):
+            self.extra = {
+                key: value
+                for key, value in data.items() if key not in cls._KNOWN
+            }
+        return self
+
+    def to_dict(self):
+        data = {}
+        for key, attr in self._ATTRS:
+            value = getattr(self, attr)
+            if value is _ABSENT:
+                continue
+            if key in self.NESTED:
+                value = value.to_dict()
+            data[key] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Stats(_Model):
+    FIELDS = ("strength", "agility", "perception", "vitality", "intelligence",
+              "available_points")
+    __slots__ = FIELDS
+
+
+class Player(_Model):
+    FIELDS = ("name", "level", "current_xp", "xp_to_next_level", "class",
+              "title", "rank", "rank_name", "rank_score",
+              "points_to_next_rank", "total_experience", "stats",
+              "leaderboard_points", "physical_damage_reduction",
+              "magical_damage_reduction", "streak", "max_streak", "coins",
+              "energy", "max_energy")
+    INTERNED = ("class", "title", "rank", "rank_name")
+    NESTED = {"stats": Stats}
+    __slots__ = tuple(_attr(key) for key in FIELDS)
+
+
+class DailyTask(_Model):
+    FIELDS = ("name", "completed", "progress", "max", "xp_reward",
+              "coin_reward")
+    INTERNED = ("name", )
+    __slots__ = FIELDS
+
+
+class Quest(_Model):
+    FIELDS = ("progress", "completed")
+    __slots__ = FIELDS
+
+
+class PersonalQuest(_Model):
+    FIELDS = ("id", "name", "description", "completed", "created_date",
+              "completion_date", "reward_xp", "reward_coins")
+    INTERNED = ("created_date", "completion_date")
+    __slots__ = FIELDS
+
+
+class Achievement(_Model):
+    FIELDS = ("unlocked", "claimed")
+    __slots__ = FIELDS
+
+
+class GameState:
+    """Compact resident form of one player's game data
+
+    to_dict() rebuilds the JSON shape written to the store; from_dict()
+    accepts anything that shape produced. Catalog definitions are not part
+    of a player's state, see catalog.Catalog.
+    """
+
+    __slots__ = ("player", "daily_tasks", "quests", "personal_quests",
+                 "achievements", "extra")
+
+    _LISTS = (("daily_tasks", DailyTask), )
+    _KNOWN = frozenset(("player", "quests", "personal_quests",
+                        "achievements") + tuple(key for key, _ in _LISTS))
+
+    @classmethod
+    def from_dict(cls, data):
+        self = cls.__new__(cls)
+        self.player = Player.from_dict(data["player"])
+        for key, model in cls._LISTS:
+            items = data.get(key)
+            setattr(
+                self, key,
+                _ABSENT if items is None else
+                [model.from_dict(item) for item in items])
+        quests = data.get("quests")
+        # Quest entries are objects, except for counters such as
+        # "personal_quests"
+        self.quests = _ABSENT if quests is None else {
+            sys.intern(key):
+            Quest.from_dict(value) if isinstance(value, dict) else value
+            for key, value in quests.items()
+        }
+        personal_quests = data.get("personal_quests")
+        self.personal_quests = _ABSENT if personal_quests is None else dict(
+            personal_quests,
+            items={
+                key: PersonalQuest.from_dict(quest)
+                for key, quest in personal_quests["items"].items()
+            })
+        achievements = data.get("achievements")
+        self.achievements = {
+            sys.intern(key): Achievement.from_dict(value)
+            for key, value in achievements.items()
+        } if isinstance(achievements, dict) else _ABSENT
+        self.extra = {
+            key: value
+            for key, value in data.items() if key not in cls._KNOWN
+        }
+        if achievements is not None and self.achievements is _ABSENT:
+            # Saves from before the catalog list their achievements
+            self.extra["achievements"] = achievements
+        return self
+
+    def to_dict(self):
+        data = {"player": self.player.to_dict()}
+        for key, _model in self._LISTS:
+            items = getattr(self, key)
+            if items is not _ABSENT:
+                data[key] = [item.to_dict() for item in items]
+        if self.quests is not _ABSENT:
+            data["quests"] = {
+                key: value.to_dict() if isinstance(value, Quest) else value
+                for key, value in self.quests.items()
+            }
+        if self.personal_quests is not _ABSENT:
+            data["personal_quests"] = dict(
+                self.personal_quests,
+                items={
+                    key: quest.to_dict()
+                    for key, quest in self.personal_quests["items"].items()
+                })
+        if self.achievements is not _ABSENT:
+            data["achievements"] = {
+                key: value.to_dict()
+                for key, value in self.achievements.items()
+            }
+        data.update(self.extra)
+        return data
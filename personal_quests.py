@@ -0,0 +1,288 @@
+import base64
+import bisect
+import heapq
+import json
+
+# Secondary indexes of the quest store, one set per status ("open",
+# "completed") so a status filter narrows every scan; all sorted
+# ascending:
+#   id         - quest ids
+#   created    - [created_date, id]
+#   completion - [completion_date, id]
+#   name       - [lower-cased name, id]
+# They are built when a player is loaded and never saved, see
+# index_quests and without_indexes.
+STATUSES = ("open", "completed")
+INDEXES = ("id", "created", "completion", "name")
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def quest_store(data):
+    """The player's personal quest store, created on first use
+
+    Quests are kept in creation order under the string form of their id.
+    Ids come from next_id and are never reused, even after a delete.
+    """
+    store = data.get("personal_quests")
+    if store is None:
+        store = data["personal_quests"] = {"next_id": 1, "items": {}}
+    if "indexes" not in store:
+        store["indexes"] = _build_indexes(store["items"])
+    return store
+
+
+def index_quests(data):
+    """Rebuild the quest indexes of data loaded from the store"""
+    store = data.get("personal_quests")
+    if isinstance(store, dict) and isinstance(store.get("items"), dict):
+        store["indexes"] = _build_indexes(store["items"])
+    return data
+
+
+def without_indexes(data):
+    """The form of data to save: the same, sharing all but the paths to
+    the quest indexes, which are left out"""
+    store = data.get("personal_quests")
+    if not isinstance(store, dict) or "indexes" not in store:
+        return data
+    return dict(data,
+                personal_quests={
+                    key: value
+                    for key, value in store.items() if key != "indexes"
+                })
+
+
+def _build_indexes(items):
+    indexes = {status: {name: [] for name in INDEXES} for status in STATUSES}
+    for quest in items.values():
+        for status, name, entry in _entries(quest):
+            indexes[status][name].append(entry)
+    for status_indexes in indexes.values():
+        for keys in status_indexes.values():
+            keys.sort()
+    return indexes
+
+
+def _entries(quest):
+    """(status, index name, sorted entry) triples for one quest"""
+    status = "completed" if quest["completed"] else "open"
+    yield status, "id", quest["id"]
+    yield status, "created", [quest.get("created_date", ""), quest["id"]]
+    if quest.get("completion_date"):
+        yield status, "completion", [quest["completion_date"], quest["id"]]
+    yield status, "name", [quest["name"].lower(), quest["id"]]
+
+
+def _index(indexes, quest):
+    for status, name, entry in _entries(quest):
+        bisect.insort(indexes[status][name], entry)
+
+
+def _unindex(indexes, quest):
+    for status, name, entry in _entries(quest):
+        keys = indexes[status][name]
+        position = bisect.bisect_left(keys, entry)
+        if position < len(keys) and keys[position] == entry:
+            del keys[position]
+
+
+def migrate_personal_quest_list(data):
+    """Move a save's personal_quest_list into the indexed store
+
+    Duplicate ids left by the old len() + 1 allocator are given fresh ids.
+    Returns True if the save was changed.
+    """
+    quests = data.pop("personal_quest_list", None)
+    if quests is None:
+        return False
+    ids = [quest["id"] for quest in quests if isinstance(quest["id"], int)]
+    next_id = max(ids, default=0) + 1
+    items = {}
+    for quest in quests:
+        if str(quest["id"]) in items:
+            quest["id"] = next_id
+            next_id += 1
+        items[str(quest["id"])] = quest
+    data["personal_quests"] = {"next_id": next_id, "items": items}
+    quest_store(data)
+    data["quests"]["personal_quests"] = sum(1 for quest in items.values()
+                                            if not quest["completed"])
+    return True
+
+
+def add_quest(data, quest):
+    """Store a new quest under the next id and return it"""
+    store = quest_store(data)
+    quest["id"] = store["next_id"]
+    store["next_id"] += 1
+    store["items"][str(quest["id"])] = quest
+    _index(store["indexes"], quest)
+    return quest
+
+
+def complete_quest(data, quest, completion_date):
+    """Mark a stored quest completed on a date"""
+    indexes = quest_store(data)["indexes"]
+    _unindex(indexes, quest)
+    quest["completed"] = True
+    quest["completion_date"] = completion_date
+    _index(indexes, quest)
+
+
+def get_quest(data, quest_id):
+    """The quest with an id, or None"""
+    if not isinstance(quest_id, int) or isinstance(quest_id, bool):
+        return None
+    return quest_store(data)["items"].get(str(quest_id))
+
+
+def remove_quest(data, quest_id):
+    """Remove and return the quest with an id, or None"""
+    quest = get_quest(data, quest_id)
+    if quest is None:
+        return None
+    store = quest_store(data)
+    _unindex(store["indexes"], quest)
+    return store["items"].pop(str(quest_id))
+
+
+def encode_cursor(index, key):
+    payload = json.dumps([index, key], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (index, key), raising ValueError for a malformed cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        index, key = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if index not in INDEXES or not _valid_key(index, key):
+        raise ValueError("Invalid cursor")
+    return index, key
+
+
+def _valid_key(index, key):
+    # Keys are compared with the index's entries, so their types must match
+    if index == "id":
+        return _is_id(key)
+    return (isinstance(key, list) and len(key) == 2
+            and isinstance(key[0], str) and _is_id(key[1]))
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def query_quests(data,
+                 completed=None,
+                 created_from=None,
+                 created_to=None,
+                 completed_from=None,
+                 completed_to=None,
+                 prefix=None,
+                 cursor=None,
+                 limit=DEFAULT_PAGE_SIZE):
+    """One page of quests matching every given filter
+
+    Only the indexes of the requested status are scanned. The narrowest
+    other filter (name prefix, then completion dates, then creation dates)
+    picks the index that drives the scan, and results come in that index's
+    order; the remaining filters are checked per quest. Returns
+    (quests, next_cursor), with next_cursor None on the last page. Raises
+    ValueError if the cursor belongs to a different query.
+    """
+    store = quest_store(data)
+    items = store["items"]
+    prefix = prefix.lower() if prefix else None
+    # Sorts after every id with the same date
+    any_id = float("inf")
+    if prefix:
+        # Names with the prefix are contiguous from [prefix]; the scan
+        # stops at the first name without it
+        index, low, high = "name", [prefix], None
+    elif completed_from or completed_to:
+        index = "completion"
+        low = [completed_from or ""]
+        high = [completed_to, any_id] if completed_to else None
+    elif created_from or created_to:
+        index = "created"
+        low = [created_from or ""]
+        high = [created_to, any_id] if created_to else None
+    elif completed is not None:
+        index, low, high = "id", None, None
+    else:
+        index, low, high = "created", None, None
+    if completed is None:
+        statuses = STATUSES
+    else:
+        statuses = ("completed", ) if completed else ("open", )
+
+    after = None
+    if cursor is not None:
+        cursor_index, after = decode_cursor(cursor)
+        if cursor_index != index:
+            raise ValueError("Cursor does not match this query")
+    # Entries are unique across statuses, so their scans merge into one
+    # sorted scan
+    keys = heapq.merge(*(_scan(store["indexes"][status][index], low, high,
+                               prefix, after) for status in statuses))
+
+    page = []
+    for key in keys:
+        quest = items[str(key[1] if isinstance(key, list) else key)]
+        if not _matches(quest, completed, created_from, created_to,
+                        completed_from, completed_to, prefix):
+            continue
+        page.append(quest)
+        if len(page) == limit:
+            more = next(keys, None) is not None
+            return page, encode_cursor(index, key) if more else None
+    return page, None
+
+
+def _scan(keys, low, high, prefix, after):
+    """Entries of one sorted index from low, or after a cursor key, while
+    they are in range"""
+    if after is not None:
+        start = bisect.bisect_right(keys, after)
+    elif low is not None:
+        start = bisect.bisect_left(keys, low)
+    else:
+        start = 0
+    for position in range(start, len(keys)):
+        key = keys[position]
+        if not _in_range(key, high, prefix):
+            return
+        yield key
+
+
+def _in_range(key, high, prefix):
+    if prefix:
+        return key[0].startswith(prefix)
+    return high is None or key <= high
+
+
+def _matches(quest, completed, created_from, created_to, completed_from,
+             completed_to, prefix):
+    if completed is not None and quest["completed"] != completed:
+        return False
+    created = quest.get("created_date", "")
+    if created_from and created < created_from:
+        return False
+    if created_to and created > created_to:
+        return False
+    if completed_from or completed_to:
+        completion = quest.get("completion_date")
+        if not completion:
+            return False
+        if completed_from and completion < completed_from:
+            return False
+        if completed_to and completion > completed_to:
+            return False
+    if prefix and not quest["name"].lower().startswith(prefix):
+        return False
+    return True
@@ -0,0 +1,64 @@
+import bisect
+import threading
+
+
+class XPCurve:
+    """Precomputed cumulative XP table with bisect level lookups
+
+    Each level needs int(previous * growth) XP, starting at base_xp for
+    level 1 -> 2. The integer truncation matches the original level-by-level
+    loop exactly. The table is extended lazily for very high totals.
+    """
+
+    def __init__(self, base_xp=100, growth=1.2, initial_levels=200):
+        if base_xp < 1:
+            raise ValueError("base_xp must be at least 1")
+        if growth < 1:
+            raise ValueError("growth must be at least 1")
+        self.base_xp = base_xp
+        self.growth = growth
+        # thresholds[i] is the total XP needed to reach level i + 1
+        self._thresholds = [0]
+        # steps[i] is the XP needed to go from level i + 1 to level i + 2
+        self._steps = [base_xp]
+        self._lock = threading.Lock()
+        self._extend(initial_levels)
+
+    def _extend(self, levels):
+        thresholds = self._thresholds
+        steps = self._steps
+        for _ in range(levels):
+            thresholds.append(thresholds[-1] + steps[-1])
+            steps.append(int(steps[-1] * self.growth))
+
+    def _ensure(self, total_xp):
+        if total_xp < self._thresholds[-1]:
+            return
+        with self._lock:
+            while total_xp >= self._thresholds[-1]:
+                self._extend(max(16, len(self._thresholds) // 2))
+
+    def level_for(self, total_xp):
+        """Return (level, current_xp, xp_to_next_level) for a total"""
+        if total_xp < 0:
+            return 1, total_xp, self.base_xp
+        self._ensure(total_xp)
+        level = bisect.bisect_right(self._thresholds, total_xp)
+        return (level, total_xp - self._thresholds[level - 1],
+                self._steps[level - 1])
+
+    def table(self, total_xp):
+        """Return (thresholds, steps) lists up to the level after a total
+
+        thresholds[i] is the total XP needed to reach level i + 1 and
+        steps[i] the XP from level i + 1 to i + 2, as used by level_for.
+        """
+        self._ensure(total_xp)
+        levels = bisect.bisect_right(self._thresholds, total_xp) + 1
+        return self._thresholds[:levels], self._steps[:levels]
+
+    def total_for_level(self, level):
+        """Total XP needed to reach a level"""
+        while level > len(self._thresholds):
+            self._ensure(self._thresholds[-1])
+        return self._thresholds[level - 1]
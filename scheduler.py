@@ -0,0 +1,249 @@
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, time as wall_time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+logger = logging.getLogger(__name__)
+
+# Seconds before a reset that failed is tried again
+RETRY_DELAY = 60.0
+
+
+def parse_reset_time(value):
+    """Return (hour, minute) of an "HH:MM" time, raising ValueError"""
+    try:
+        hour, minute = (int(part) for part in value.split(":"))
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError(f"Invalid reset time: {value!r}")
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"Invalid reset time: {value!r}")
+    return hour, minute
+
+
+def get_zone(name):
+    """The time zone with an IANA name, or None for server local time
+
+    Raises ValueError for an unknown name.
+    """
+    if name is None:
+        return None
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, TypeError, ValueError):
+        raise ValueError(f"Unknown time zone: {name!r}")
+
+
+def next_reset_at(now, reset_time="00:00", timezone=None):
+    """Unix time of the first reset_time after now, in a time zone"""
+    hour, minute = parse_reset_time(reset_time)
+    zone = get_zone(timezone)
+    local = datetime.fromtimestamp(now, zone)
+    due = local.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if due <= local:
+        due = datetime.combine(local.date() + timedelta(days=1),
+                               wall_time(hour, minute),
+                               tzinfo=zone)
+    return due.timestamp()
+
+
+def local_date(now, timezone=None):
+    """The "YYYY-MM-DD" date of a Unix time in a time zone"""
+    local = datetime.fromtimestamp(now, get_zone(timezone))
+    return local.strftime("%Y-%m-%d")
+
+
+def next_player_reset(data, now):
+    """Unix time of a player's first daily reset after now
+
+    Follows the daily_reset_time and timezone settings.
+    """
+    settings = data.get("settings", {})
+    return next_reset_at(now, settings.get("daily_reset_time", "00:00"),
+                         settings.get("timezone"))
+
+
+def reset_due(data, now=None):
+    """Whether a player's daily reset deadline has passed"""
+    return (time.time() if now is None else now) >= data["reset_at"]
+
+
+def progressive_target(streak):
+    """Pushups or situps for a streak: 12, plus 2 per day of streak"""
+    return 12 + (streak * 2)
+
+
+def check_daily_reset(data, now=None):
+    """Reset daily tasks if the reset deadline has passed, True if so"""
+    now = time.time() if now is None else now
+    if reset_due(data, now):
+        # Check if all tasks were completed yesterday
+        all_completed = all(task["completed"] for task in data["daily_tasks"])
+        # A player not reset for more than a day missed the days between
+        missed_days = now >= next_player_reset(data, data["reset_at"])
+
+        # Reset streak if not all tasks completed
+        if missed_days or not all_completed:
+            data["player"]["streak"] = 0
+
+        # Calculate progressive difficulty based on streak
+        streak = data["player"]["streak"]
+        pushup_count = progressive_target(streak)
+        situp_count = progressive_target(streak)
+
+        # Reset daily tasks with progressive difficulty
+        for task in data["daily_tasks"]:
+            task["completed"] = False
+            task["progress"] = 0
+
+            # Update pushups and situps with progressive difficulty
+            if "PUSHUPS" in task["name"]:
+                task["name"] = f"{pushup_count} PUSHUPS"
+                task["max"] = pushup_count
+            elif "SITUPS" in task["name"]:
+                task["name"] = f"{situp_count} SITUPS"
+                task["max"] = situp_count
+
+        # Schedule the next reset
+        data["last_reset"] = local_date(
+            now, data.get("settings", {}).get("timezone"))
+        data["reset_at"] = next_player_reset(data, now)
+
+        # Restore energy
+        data["player"]["energy"] = data["player"]["max_energy"]
+
+        return True
+
+    return False
+
+
+class ResetScheduler:
+    """Priority queue of players keyed by their next daily reset
+
+    A background thread pops players whose reset is due and calls
+    reset(player_id), which applies the reset and returns the player's next
+    due time (or None to drop them). At most batch_size resets run per
+    interval, so a midnight shared by many players is spread out instead of
+    stampeding the store; players the scheduler has not reached yet are
+    reset when they are next loaded.
+
+    schedule() is cheap to call on every save: a player whose due time is
+    unchanged is not pushed again, and entries superseded by a later
+    schedule() are skipped when popped.
+    """
+
+    def __init__(self, reset, batch_size=500, interval=1.0):
+        self.reset = reset
+        self.batch_size = batch_size
+        self.interval = interval
+        self._heap = []
+        self._due = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+        self._counters = {
+            "scheduled": 0,
+            "resets": 0,
+            "reset_errors": 0,
+            "batches": 0,
+            "last_batch_ms": 0.0,
+            "max_lag_seconds": 0.0,
+        }
+
+    def schedule(self, player_id, due):
+        """Set the time of a player's next reset"""
+        with self._cond:
+            if self._due.get(player_id) == due:
+                return
+            self._due[player_id] = due
+            heapq.heappush(self._heap, (due, player_id))
+            self._counters["scheduled"] += 1
+
+    def seed(self, players):
+        """Schedule every (player_id, data) pair from an iterable"""
+        for player_id, data in players:
+            # Saves from before reset_at are due now
+            self.schedule(player_id, data.get("reset_at") or time.time())
+
+    def seed_async(self, players):
+        """Seed the queue in a background thread"""
+        thread = threading.Thread(target=self.seed,
+                                  args=(players, ),
+                                  name="reset-scheduler-seed",
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    def _pop_due(self, now):
+        batch = []
+        with self._cond:
+            while (self._heap and self._heap[0][0] <= now
+                   and len(batch) < self.batch_size):
+                due, player_id = heapq.heappop(self._heap)
+                if self._due.get(player_id) != due:
+                    continue
+                del self._due[player_id]
+                batch.append((due, player_id))
+        return batch
+
+    def run_due(self, now=None):
+        """Apply one batch of due resets and return how many ran"""
+        now = time.time() if now is None else now
+        batch = self._pop_due(now)
+        if not batch:
+            return 0
+        started = time.perf_counter()
+        errors = 0
+        for due, player_id in batch:
+            try:
+                next_due = self.reset(player_id)
+            except Exception:
+                logger.exception("Daily reset of %s failed", player_id)
+                errors += 1
+                next_due = now + RETRY_DELAY
+            if next_due is not None:
+                self.schedule(player_id, next_due)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._cond:
+            self._counters["resets"] += len(batch) - errors
+            self._counters["reset_errors"] += errors
+            self._counters["batches"] += 1
+            self._counters["last_batch_ms"] = elapsed_ms
+            self._counters["max_lag_seconds"] = max(
+                self._counters["max_lag_seconds"], now - batch[0][0])
+        return len(batch)
+
+    def start(self):
+        """Start applying due resets in a background thread"""
+        self._thread = threading.Thread(target=self._run_loop,
+                                        name="reset-scheduler",
+                                        daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                self._cond.wait(self.interval)
+                if self._closed:
+                    return
+            self.run_due()
+
+    def stats(self):
+        """Queue size and reset counters"""
+        now = time.time()
+        with self._cond:
+            stats = dict(self._counters)
+            stats["queued_players"] = len(self._due)
+            stats["due_players"] = sum(1 for due in self._due.values()
+                                       if due <= now)
+        return stats
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=max(1.0, self.interval * 4))
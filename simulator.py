@@ -0,0 +1,301 @@
+"""Offline progression simulator for balancing XP, rank and task rewards
+
+Usage: python simulator.py [--players N] [--days N] [--save PATH] ...
+       python simulator.py --check
+
+Every synthetic player starts as the player in a sample save and plays the
+save's daily tasks for a number of days. Each player has an engagement
+level drawn from a beta distribution: the chance of completing each task on
+a day they play. Pushups and situps get harder with the streak, exactly as
+in the daily reset, and are completed less often the harder they are.
+Players skip whole days at random, which breaks their streak; they spend
+unallocated stat points and buy stat points in the shop at random. Level-ups
+pay out as in award_experience. Per-day distributions of level, coins and
+rank are printed as a table or as JSON lines.
+
+Players are simulated as NumPy arrays, using vectorized versions of the
+level, rank score and rank functions. --check compares those with the
+scalar versions the server uses. Requires NumPy, which the server does not.
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from derived import RANK_SCORE_WEIGHTS, RANKS, rank_for_score, rank_score
+from progression import XPCurve
+from scheduler import progressive_target
+
+# Level-up rewards per level, as in award_experience
+LEVEL_UP_POINTS = 2
+LEVEL_UP_COINS = 50
+
+# Shop price of one stat point
+STAT_POINT_PRICE = 200
+
+RANK_THRESHOLDS = np.array([threshold for threshold, _letter, _name in RANKS],
+                           dtype=np.int64)
+RANK_LETTERS = np.array([letter for _threshold, letter, _name in RANKS])
+
+
+def levels_for(curve, total_xp):
+    """Vectorized XPCurve.level_for
+
+    Returns (level, current_xp, xp_to_next_level) arrays.
+    """
+    total_xp = np.asarray(total_xp, dtype=np.int64)
+    thresholds, steps = curve.table(int(total_xp.max(initial=0)))
+    thresholds = np.array(thresholds, dtype=np.int64)
+    steps = np.array(steps, dtype=np.int64)
+    level = np.maximum(
+        np.searchsorted(thresholds, total_xp, side="right"), 1)
+    return level, total_xp - thresholds[level - 1], steps[level - 1]
+
+
+def rank_scores(level, stats, max_streak, total_experience):
+    """Vectorized derived.rank_score; stats is the allocated stat total"""
+    values = {
+        "level": level,
+        "stats": stats,
+        "max_streak": max_streak,
+        "total_experience": total_experience
+    }
+    score = np.zeros(np.shape(level), dtype=np.int64)
+    for field, points, per in RANK_SCORE_WEIGHTS:
+        score += np.asarray(values[field], dtype=np.int64) // per * points
+    return score
+
+
+def rank_indexes(scores):
+    """Vectorized position in RANKS of derived.rank_for_score"""
+    return np.maximum(
+        np.searchsorted(RANK_THRESHOLDS, scores, side="right") - 1, 0)
+
+
+def rank_letters(scores):
+    """Vectorized rank letter of derived.rank_for_score"""
+    return RANK_LETTERS[rank_indexes(scores)]
+
+
+def progressive_targets(streak):
+    """Vectorized scheduler.progressive_target"""
+    return progressive_target(np.asarray(streak, dtype=np.int64))
+
+
+def check(curve, count=200000, seed=0):
+    """Assert the vectorized functions match the scalar ones"""
+    rng = np.random.default_rng(seed)
+    # Random totals, plus every level threshold and its neighbours
+    thresholds = np.array(curve.table(10**7)[0], dtype=np.int64)
+    total_xp = np.concatenate([
+        rng.integers(-1000, 10**7, count), thresholds - 1, thresholds,
+        thresholds + 1
+    ])
+    level, current, to_next = levels_for(curve, total_xp)
+    for index, total in enumerate(total_xp.tolist()):
+        expected = curve.level_for(total)
+        actual = (int(level[index]), int(current[index]),
+                  int(to_next[index]))
+        assert actual == expected, (total, actual, expected)
+
+    level = rng.integers(1, 200, count)
+    stats = rng.integers(0, 2000, count)
+    max_streak = rng.integers(0, 400, count)
+    total_experience = rng.integers(-1000, 10**7, count)
+    scores = rank_scores(level, stats, max_streak, total_experience)
+    letters = rank_letters(scores)
+    for index in range(count):
+        player = {
+            "level": int(level[index]),
+            # rank_score only sums the allocated stats
+            "stats": {
+                "strength": int(stats[index]),
+                "available_points": 7
+            },
+            "max_streak": int(max_streak[index]),
+            "total_experience": int(total_experience[index])
+        }
+        score = rank_score(player)
+        assert int(scores[index]) == score, (player, int(scores[index]))
+        assert letters[index] == rank_for_score(score)[0], score
+    edges = np.concatenate([RANK_THRESHOLDS - 1, RANK_THRESHOLDS])
+    for score, letter in zip(edges.tolist(), rank_letters(edges)):
+        assert letter == rank_for_score(score)[0], score
+
+    streak = np.arange(0, 1000)
+    assert progressive_targets(streak).tolist() == [
+        progressive_target(value) for value in streak.tolist()
+    ]
+
+
+def simulate(sample,
+             curve,
+             players,
+             days,
+             seed=42,
+             engagement=(4.0, 2.0),
+             skip_probability=0.1,
+             difficulty=1.0,
+             allocate_probability=0.5,
+             shop_probability=0.2):
+    """Yield per-day summaries of a simulated population"""
+    rng = np.random.default_rng(seed)
+    player = sample["player"]
+    tasks = sample["daily_tasks"]
+    progressive = np.array([
+        "PUSHUPS" in task["name"] or "SITUPS" in task["name"]
+        for task in tasks
+    ])
+    xp_rewards = np.array([task["xp_reward"] for task in tasks],
+                          dtype=np.int64)
+    coin_rewards = np.array([task["coin_reward"] for task in tasks],
+                            dtype=np.int64)
+
+    def full(value):
+        return np.full(players, value, dtype=np.int64)
+
+    total_xp = full(player["total_experience"])
+    level = levels_for(curve, total_xp)[0]
+    coins = full(player["coins"])
+    streak = full(player["streak"])
+    max_streak = full(player["max_streak"])
+    stats = full(
+        sum(value for key, value in player["stats"].items()
+            if key != "available_points"))
+    available = full(player["stats"]["available_points"])
+    chance = rng.beta(*engagement, players)
+
+    for day in range(1, days + 1):
+        plays = rng.random(players) >= skip_probability
+        # Pushups and situps are done less often as the target grows
+        easiest = progressive_target(0)
+        targets = progressive_targets(streak)
+        completed = np.empty((len(tasks), players), dtype=bool)
+        for index in range(len(tasks)):
+            task_chance = chance
+            if progressive[index]:
+                task_chance = chance * (easiest / targets)**difficulty
+            completed[index] = plays & (rng.random(players) < task_chance)
+
+        total_xp += xp_rewards @ completed
+        coins += coin_rewards @ completed
+        all_done = completed.all(axis=0)
+        streak = np.where(all_done, streak + 1, 0)
+        max_streak = np.maximum(max_streak, streak)
+
+        new_level = levels_for(curve, total_xp)[0]
+        gained = new_level - level
+        level = new_level
+        available += gained * LEVEL_UP_POINTS
+        coins += gained * LEVEL_UP_COINS
+
+        buys = (coins >= STAT_POINT_PRICE) & (rng.random(players) <
+                                               shop_probability)
+        coins -= buys * STAT_POINT_PRICE
+        available += buys
+        allocates = rng.random(players) < allocate_probability
+        stats += np.where(allocates, available, 0)
+        available = np.where(allocates, 0, available)
+
+        ranks = rank_indexes(rank_scores(level, stats, max_streak, total_xp))
+        yield {
+            "day": day,
+            "level": np.percentile(level, (10, 50, 90)).tolist(),
+            "coins": np.percentile(coins, (10, 50, 90)).tolist(),
+            "streak": np.percentile(streak, (10, 50, 90)).tolist(),
+            "ranks": {
+                letter: float(share)
+                for letter, share in zip(
+                    RANK_LETTERS.tolist(),
+                    np.bincount(ranks, minlength=len(RANKS)) / players)
+            }
+        }
+
+
+def format_row(summary):
+    percentiles = " ".join(
+        "/".join(f"{value:,.0f}" for value in summary[key])
+        for key in ("level", "coins", "streak"))
+    ranks = " ".join(f"{letter}:{share:5.1%}"
+                     for letter, share in summary["ranks"].items())
+    return f"{summary['day']:>5} {percentiles}  {ranks}"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simulate player progression over many days")
+    parser.add_argument("--players", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save",
+                        default="game_data.json",
+                        help="sample save with the starting player and "
+                        "daily tasks")
+    parser.add_argument("--xp-base",
+                        type=int,
+                        default=int(os.environ.get('SOLO_XP_BASE', '100')))
+    parser.add_argument("--xp-growth",
+                        type=float,
+                        default=float(os.environ.get('SOLO_XP_GROWTH',
+                                                     '1.2')))
+    parser.add_argument("--engagement",
+                        type=float,
+                        nargs=2,
+                        default=(4.0, 2.0),
+                        metavar=("ALPHA", "BETA"),
+                        help="beta distribution of task completion chance")
+    parser.add_argument("--skip-probability", type=float, default=0.1)
+    parser.add_argument("--difficulty",
+                        type=float,
+                        default=1.0,
+                        help="how strongly harder pushups/situps lower the "
+                        "completion chance")
+    parser.add_argument("--allocate-probability", type=float, default=0.5)
+    parser.add_argument("--shop-probability", type=float, default=0.2)
+    parser.add_argument("--every",
+                        type=int,
+                        default=7,
+                        help="print every Nth day (and the last)")
+    parser.add_argument("--json",
+                        action="store_true",
+                        help="print every day as a JSON line")
+    parser.add_argument("--check",
+                        action="store_true",
+                        help="check vectorized functions against the "
+                        "scalar ones and exit")
+    args = parser.parse_args()
+
+    curve = XPCurve(base_xp=args.xp_base, growth=args.xp_growth)
+    if args.check:
+        check(curve, seed=args.seed)
+        print("vectorized level, rank score, rank and task target "
+              "functions match the scalar ones")
+        return
+
+    with open(args.save) as f:
+        sample = json.load(f)
+    summaries = simulate(sample,
+                         curve,
+                         args.players,
+                         args.days,
+                         seed=args.seed,
+                         engagement=tuple(args.engagement),
+                         skip_probability=args.skip_probability,
+                         difficulty=args.difficulty,
+                         allocate_probability=args.allocate_probability,
+                         shop_probability=args.shop_probability)
+    if not args.json:
+        print("  day level p10/p50/p90 coins p10/p50/p90 "
+              "streak p10/p50/p90  rank shares")
+    for summary in summaries:
+        if args.json:
+            json.dump(summary, sys.stdout)
+            sys.stdout.write("\n")
+        elif summary["day"] % args.every == 0 or summary["day"] == args.days:
+            print(format_row(summary))
+
+
+if __name__ == "__main__":
+    main()
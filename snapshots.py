@@ -0,0 +1,143 @@
+"""Copy-on-write views of shared player snapshots
+
+Stored game data is shared by every request reading it and must not be
+modified. thaw() gives a writer a view of a snapshot to modify in place:
+each dict or list in it is copied, one level deep, the first time it is
+reached, so a mutation copies only the containers on the paths it touches
+and shares the rest of the snapshot. freeze() turns the view back into
+plain dicts and lists, ready to be saved as the next snapshot.
+"""
+
+
+class _CopyOnWriteDict(dict):
+    """Shallow copy of a shared dict whose values are copied when reached"""
+
+    __slots__ = ("_owned", )
+
+    def __init__(self, shared):
+        super().__init__(shared)
+        # Keys whose values are private to this view
+        self._owned = set()
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if key in self._owned:
+            return value
+        self._owned.add(key)
+        copied = _thaw_value(value)
+        if copied is not value:
+            dict.__setitem__(self, key, copied)
+        return copied
+
+    def __setitem__(self, key, value):
+        self._owned.add(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._owned.discard(key)
+        dict.__delitem__(self, key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        if key not in self:
+            return dict.pop(self, key, *default)
+        value = self[key]
+        del self[key]
+        return value
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+
+class _CopyOnWriteList(list):
+    """Shallow copy of a shared list whose items are copied when reached"""
+
+    __slots__ = ("_owned", )
+
+    def __init__(self, shared):
+        # A view is copied as it stands, without copying its items
+        super().__init__(
+            shared if type(shared) is list else list.__iter__(shared))
+        # Ids of the items private to this view; items may move
+        self._owned = set()
+
+    def _own(self, index):
+        value = list.__getitem__(self, index)
+        if id(value) in self._owned:
+            return value
+        copied = _thaw_value(value)
+        if copied is not value:
+            list.__setitem__(self, index, copied)
+            self._owned.add(id(copied))
+        return copied
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._own(i) for i in range(len(self))[index]]
+        return self._own(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._own(index)
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = list(value)
+            self._owned.update(id(item) for item in value)
+        else:
+            self._owned.add(id(value))
+        list.__setitem__(self, index, value)
+
+    def append(self, value):
+        self._owned.add(id(value))
+        list.append(self, value)
+
+    def insert(self, index, value):
+        self._owned.add(id(value))
+        list.insert(self, index, value)
+
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+    def pop(self, index=-1):
+        value = self._own(index)
+        list.pop(self, index)
+        return value
+
+
+def _thaw_value(value):
+    if isinstance(value, dict):
+        return _CopyOnWriteDict(value)
+    if isinstance(value, list):
+        return _CopyOnWriteList(value)
+    return value
+
+
+def thaw(snapshot):
+    """A view of a snapshot, or of another view, that can be modified
+    without changing it"""
+    return _thaw_value(snapshot)
+
+
+def freeze(value):
+    """Plain dicts and lists of a view, sharing what it did not copy"""
+    if isinstance(value, _CopyOnWriteDict):
+        return {key: freeze(item) for key, item in dict.items(value)}
+    if isinstance(value, _CopyOnWriteList):
+        return [freeze(item) for item in list.__iter__(value)]
+    return value
@@ -10,6 +10,8 @@ class SoloLevelerApp {
         this.shop = [];
         this.streak = 0;
         this.timer = null;
+        this.events = null;
+        this.eventsConnected = false;
         
         this.init();
     }
@@ -17,6 +19,7 @@ class SoloLevelerApp {
     init() {
         this.setupNavigation();
         this.loadAllData();
+        this.connectEvents();
         this.startTimer();
         this.setupTaskInteractions();
         this.setupStatAllocation();
@@ -53,20 +56,149 @@ class SoloLevelerApp {
     }
     
     async loadAllData() {
+        await this.loadState(Object.keys(this.stateSections()));
+    }
+    
+    stateSections() {
+        return {
+            player: data => {
+                this.playerData = data;
+                this.updatePlayerDisplay();
+            },
+            daily_tasks: data => {
+                this.dailyTasks = data.tasks;
+                this.streak = data.streak;
+                this.resetAt = data.reset_at;
+                this.renderTasks();
+                this.updateStreak();
+            },
+            inventory: data => {
+                this.inventory = data;
+                this.renderInventory();
+            },
+            quests: data => {
+                this.quests = data;
+                this.renderQuests();
+            },
+            personal_quests: data => {
+                this.personalQuests = data.quests;
+                this.personalQuestsCursor = data.next_cursor;
+                this.renderPersonalQuests();
+            },
+            shop: data => {
+                this.shop = data;
+                this.renderShop();
+            },
+            achievements: data => {
+                this.achievements = data;
+                this.renderAchievements();
+            }
+        };
+    }
+    
+    async loadState(fields) {
+        // One request for several sections; unchanged ones come back without data
+        this.sectionVersions = this.sectionVersions || {};
+        const known = fields
+            .filter(name => this.sectionVersions[name])
+            .map(name => `${name}:${this.sectionVersions[name]}`)
+            .join(',');
+        const params = new URLSearchParams({ fields: fields.join(',') });
+        if (known) params.set('known', known);
+        
         try {
-            await Promise.all([
-                this.loadPlayerData(),
-                this.loadDailyTasks(),
-                this.loadInventory(),
-                this.loadQuests(),
-                this.loadShop(),
-                this.loadAchievements()
-            ]);
+            const response = await fetch(`/api/state?${params}`);
+            const result = await response.json();
+            const sections = this.stateSections();
+            
+            Object.entries(result.sections).forEach(([name, section]) => {
+                this.sectionVersions[name] = section.version;
+                if (!section.unchanged) sections[name](section.data);
+            });
         } catch (error) {
             console.error('Error loading data:', error);
         }
     }
     
+    connectEvents() {
+        if (!window.EventSource) return;
+        
+        // The browser resumes with Last-Event-ID after a dropped connection
+        this.events = new EventSource('/api/events');
+        this.events.onopen = () => {
+            this.eventsConnected = true;
+        };
+        this.events.onerror = () => {
+            this.eventsConnected = false;
+        };
+        
+        const handlers = {
+            xp: data => this.applyPlayerDelta(data),
+            coins: data => this.applyPlayerDelta({ coins: data.coins }),
+            player: data => this.applyPlayerDelta(data),
+            rank_changed: data => {
+                this.applyPlayerDelta({ rank: data.rank, rank_name: data.rank_name });
+                this.addRankUpEffect(data.rank);
+            },
+            task_completed: data => {
+                this.dailyTasks[data.task_index] = data.task;
+                this.streak = data.streak;
+                this.renderTasks();
+                this.updateStreak();
+            },
+            task: data => {
+                this.dailyTasks[data.task_index] = data.task;
+                this.renderTasks();
+            },
+            achievement_unlocked: data => {
+                this.achievements[data.achievement_index] = data.achievement;
+                this.renderAchievements();
+                this.showNotification(`Achievement unlocked: ${data.achievement.name}!`);
+            },
+            achievement_claimed: data => {
+                this.achievements[data.achievement_index] = data.achievement;
+                this.renderAchievements();
+            },
+            inventory: data => {
+                this.inventory = data.inventory;
+                this.renderInventory();
+            },
+            quests: data => {
+                this.quests = data.quests;
+                this.renderQuests();
+            },
+            personal_quest: data => {
+                this.personalQuests = this.personalQuests || [];
+                const index = this.personalQuests.findIndex(q => q.id === data.quest.id);
+                if (index >= 0) this.personalQuests[index] = data.quest;
+                else this.personalQuests.push(data.quest);
+                this.renderPersonalQuests();
+            },
+            personal_quest_deleted: data => {
+                this.personalQuests = (this.personalQuests || []).filter(q => q.id !== data.quest_id);
+                this.renderPersonalQuests();
+            },
+            resync: () => this.loadAllData()
+        };
+        
+        Object.entries(handlers).forEach(([type, handler]) => {
+            this.events.addEventListener(type, event => handler(JSON.parse(event.data)));
+        });
+    }
+    
+    applyPlayerDelta(delta) {
+        Object.assign(this.playerData, delta);
+        this.updatePlayerDisplay();
+    }
+    
+    async refreshAfterMutation(...loaders) {
+        // Live deltas arrive over /api/events; only re-poll without a stream
+        if (this.eventsConnected) return;
+        for (const loader of loaders) {
+            await loader.call(this);
+        }
+    }
+    
     async loadPlayerData() {
         try {
             const response = await fetch('/api/player');
@@ -84,6 +216,7 @@ class SoloLevelerApp {
             
             this.dailyTasks = data.tasks;
             this.streak = data.streak;
+            this.resetAt = data.reset_at;
             
             this.renderTasks();
             this.updateStreak();
@@ -117,8 +250,25 @@ class SoloLevelerApp {
     
     async loadPersonalQuests() {
         try {
-            const response = await fetch('/api/personal-quests');
-            this.personalQuests = await response.json();
+            const response = await fetch('/api/personal-quests?limit=50');
+            const page = await response.json();
+            this.personalQuests = page.quests;
+            this.personalQuestsCursor = page.next_cursor;
+            this.renderPersonalQuests();
+        } catch (error) {
+            console.error('Error loading personal quests:', error);
+        }
+    }
+
+    async loadMorePersonalQuests() {
+        if (!this.personalQuestsCursor) return;
+        try {
+            const cursor = encodeURIComponent(this.personalQuestsCursor);
+            const response = await fetch(`/api/personal-quests?limit=50&cursor=${cursor}`);
+            const page = await response.json();
+            const known = new Set(this.personalQuests.map(q => q.id));
+            this.personalQuests.push(...page.quests.filter(q => !known.has(q.id)));
+            this.personalQuestsCursor = page.next_cursor;
             this.renderPersonalQuests();
         } catch (error) {
             console.error('Error loading personal quests:', error);
@@ -156,22 +306,15 @@ class SoloLevelerApp {
     }
     
     loadScreenData(screenName) {
-        switch(screenName) {
-            case 'inventory':
-                this.loadInventory();
-                break;
-            case 'quests':
-                this.loadQuests();
-                break;
-            case 'shop':
-                this.loadShop();
-                break;
-            case 'achievements':
-                this.loadAchievements();
-                break;
-            case 'status':
-                this.loadPlayerData();
-                break;
+        const screenSections = {
+            inventory: ['inventory'],
+            quests: ['quests', 'personal_quests'],
+            shop: ['shop'],
+            achievements: ['achievements'],
+            status: ['player']
+        };
+        if (screenSections[screenName]) {
+            this.loadState(screenSections[screenName]);
         }
     }
     
@@ -391,8 +534,7 @@ class SoloLevelerApp {
             
             const result = await response.json();
             if (result.success) {
-                await this.loadQuests();
-                await this.loadPlayerData();
+                await this.refreshAfterMutation(this.loadQuests, this.loadPlayerData);
                 this.showNotification(`Quest completed! +${result.rewards.xp} XP +${result.rewards.coins} coins!`);
                 this.addQuestCompleteShockwave();
                 this.addRewardClaimEffect();
@@ -507,13 +649,15 @@ class SoloLevelerApp {
             });
             
             if (response.ok) {
-                await this.loadDailyTasks();
-                await this.loadPlayerData();
-                
-                // Check for rank up
-                const newRank = this.playerData?.rank || 'E';
-                if (oldRank !== newRank) {
-                    this.addRankUpEffect(newRank);
+                if (!this.eventsConnected) {
+                    await this.loadDailyTasks();
+                    await this.loadPlayerData();
+                    
+                    // Check for rank up (pushed as rank_changed when streaming)
+                    const newRank = this.playerData?.rank || 'E';
+                    if (oldRank !== newRank) {
+                        this.addRankUpEffect(newRank);
+                    }
                 }
                 
                 this.showNotification('Task completed! +XP +Coins');
@@ -536,7 +680,7 @@ class SoloLevelerApp {
             });
             
             if (response.ok) {
-                await this.loadPlayerData();
+                await this.refreshAfterMutation(this.loadPlayerData);
                 this.showNotification(`${statName.toUpperCase()} increased!`);
             }
         } catch (error) {
@@ -556,9 +700,7 @@ class SoloLevelerApp {
             
             const result = await response.json();
             if (result.success) {
-                await this.loadPlayerData();
-                await this.loadInventory();
-                await this.loadShop();
+                await this.refreshAfterMutation(this.loadPlayerData, this.loadInventory);
                 this.showNotification(`Purchased ${itemName}!`);
             } else {
                 this.showNotification(result.error, 'error');
@@ -580,8 +722,7 @@ class SoloLevelerApp {
             
             const result = await response.json();
             if (result.success) {
-                await this.loadPlayerData();
-                await this.loadInventory();
+                await this.refreshAfterMutation(this.loadPlayerData, this.loadInventory);
                 this.showNotification(`Used ${itemName}!`);
             } else {
                 this.showNotification(result.error, 'error');
@@ -603,8 +744,7 @@ class SoloLevelerApp {
             
             const result = await response.json();
             if (result.success) {
-                await this.loadPlayerData();
-                await this.loadAchievements();
+                await this.refreshAfterMutation(this.loadPlayerData, this.loadAchievements);
                 this.showNotification(`Achievement claimed! +${result.coins_awarded} coins!`);
                 this.addRewardClaimEffect();
             } else {
@@ -631,11 +771,17 @@ class SoloLevelerApp {
     
     updateTimer() {
         const now = new Date();
-        const tomorrow = new Date(now);
-        tomorrow.setDate(tomorrow.getDate() + 1);
-        tomorrow.setHours(0, 0, 0, 0);
-        
-        const timeRemaining = tomorrow - now;
+        let deadline;
+        if (this.resetAt) {
+            // Server-side reset deadline, in Unix seconds
+            deadline = new Date(this.resetAt * 1000);
+        } else {
+            deadline = new Date(now);
+            deadline.setDate(deadline.getDate() + 1);
+            deadline.setHours(0, 0, 0, 0);
+        }
+
+        const timeRemaining = Math.max(deadline - now, 0);
         const hours = Math.floor(timeRemaining / (1000 * 60 * 60));
         const minutes = Math.floor((timeRemaining % (1000 * 60 * 60)) / (1000 * 60));
         const seconds = Math.floor((timeRemaining % (1000 * 60)) / 1000);
@@ -869,6 +1015,14 @@ class SoloLevelerApp {
             
             personalQuestsList.appendChild(questElement);
         });
+
+        if (this.personalQuestsCursor) {
+            const loadMore = document.createElement('button');
+            loadMore.className = 'load-more-btn';
+            loadMore.textContent = 'LOAD MORE';
+            loadMore.onclick = () => this.loadMorePersonalQuests();
+            personalQuestsList.appendChild(loadMore);
+        }
     }
     
     async addPersonalQuest() {
@@ -896,8 +1050,7 @@ class SoloLevelerApp {
             if (result.success) {
                 document.getElementById('newQuestName').value = '';
                 document.getElementById('newQuestDescription').value = '';
-                await this.loadPersonalQuests();
-                await this.loadQuests(); // Refresh quest count
+                await this.refreshAfterMutation(this.loadPersonalQuests, this.loadQuests);
                 this.showNotification('Personal quest added!');
             } else {
                 this.showNotification(result.error, 'error');
@@ -920,9 +1073,7 @@ class SoloLevelerApp {
             
             const result = await response.json();
             if (result.success) {
-                await this.loadPersonalQuests();
-                await this.loadQuests(); // Refresh quest count
-                await this.loadPlayerData();
+                await this.refreshAfterMutation(this.loadPersonalQuests, this.loadQuests, this.loadPlayerData);
                 this.showNotification(`Quest completed! +${result.rewards.xp} XP +${result.rewards.coins} coins!`);
             } else {
                 this.showNotification(result.error, 'error');
@@ -949,8 +1100,7 @@ class SoloLevelerApp {
             
             const result = await response.json();
             if (result.success) {
-                await this.loadPersonalQuests();
-                await this.loadQuests(); // Refresh quest count
+                await this.refreshAfterMutation(this.loadPersonalQuests, this.loadQuests);
                 this.showNotification('Quest deleted!');
             } else {
                 this.showNotification(result.error, 'error');
@@ -975,7 +1125,7 @@ class SoloLevelerApp {
         leaderboardList.innerHTML = '';
         
         this.leaderboard.players.forEach((player, index) => {
-            const isCurrentPlayer = player.name === this.playerData.name;
+            const isCurrentPlayer = player.current_player;
             const entryElement = document.createElement('div');
             entryElement.className = `leaderboard-entry ${isCurrentPlayer ? 'current-player' : ''} ${index < 3 ? 'top-three' : ''}`;
             
@@ -0,0 +1,329 @@
+import importlib
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from codec import PayloadFormat
+
+
+class VersionConflict(Exception):
+    """A compare-and-swap write lost against a newer committed version"""
+
+
+def swap_items(items):
+    """Compare-and-swap items as (player_id, expected_version, data, op,
+    version) tuples, version being None where an item leaves it out"""
+    for item in items:
+        yield item if len(item) == 5 else (*item, None)
+
+
+class PlayerStore:
+    """Base class for per-player game data storage backends
+
+    Every player has a version number that starts at 1 and grows with each
+    write; version 0 means the player does not exist yet.
+    """
+
+    def load(self, player_id):
+        """Return the player's game data, or None if the player is unknown"""
+        loaded = self.load_versioned(player_id)
+        return loaded[0] if loaded is not None else None
+
+    def load_versioned(self, player_id):
+        """Return (data, version), or None if the player is unknown"""
+        raise NotImplementedError
+
+    def load_snapshot(self, player_id):
+        """Return (data, version) for reading only, or None if unknown
+
+        The data may be shared with other readers and must not be
+        modified; copy it first to make changes.
+        """
+        return self.load_versioned(player_id)
+
+    def version_of(self, player_id):
+        """Current version of a player, 0 if unknown"""
+        loaded = self.load_versioned(player_id)
+        return loaded[1] if loaded is not None else 0
+
+    def save(self, player_id, data, op=None, version=None):
+        """Persist the player's game data unconditionally
+
+        op names the mutation that produced this state, for backends that
+        record it. version sets the stored version instead of incrementing.
+        """
+        raise NotImplementedError
+
+    def save_many(self, items):
+        """Persist many (player_id, data, op, version) tuples"""
+        for player_id, data, op, version in items:
+            self.save(player_id, data, op=op, version=version)
+
+    def compare_and_swap(self,
+                         player_id,
+                         expected_version,
+                         data,
+                         op=None,
+                         version=None):
+        """Save only if the stored version still matches, return the new one
+
+        version sets the new version instead of expected_version + 1.
+        Raises VersionConflict if another writer committed first.
+        """
+        raise NotImplementedError
+
+    def compare_and_swap_many(self, items):
+        """Compare-and-swap many (player_id, expected_version, data, op)
+
+        Items may end with the version to set, as for compare_and_swap.
+        Returns the ids of players whose version no longer matched; the
+        others are saved.
+        """
+        conflicts = []
+        for player_id, expected_version, data, op, version in swap_items(
+                items):
+            try:
+                self.compare_and_swap(player_id,
+                                      expected_version,
+                                      data,
+                                      op=op,
+                                      version=version)
+            except VersionConflict:
+                conflicts.append(player_id)
+        return conflicts
+
+    def delete(self, player_id):
+        """Remove a player from the store"""
+        raise NotImplementedError
+
+    def count(self):
+        """Number of players in the store"""
+        raise NotImplementedError
+
+    def iter_players(self, batch_size=500):
+        """Yield (player_id, data) pairs without loading everyone at once"""
+        raise NotImplementedError
+
+    def iter_versioned(self, after="", batch_size=500):
+        """Yield (player_id, data, version) in id order after a player id"""
+        raise NotImplementedError
+
+    def close(self):
+        """Release any resources held by the store"""
+
+
+class SQLitePlayerStore(PlayerStore):
+    """Player store backed by SQLite in WAL mode with pooled connections
+
+    Each player is one row keyed by id, so loading or saving a player only
+    touches that player's row regardless of how many players exist. Data
+    is stored as JSON text from codec, or as msgpack if binary is
+    "msgpack".
+    """
+
+    def __init__(self,
+                 path,
+                 pool_size=8,
+                 timeout=5.0,
+                 codec=None,
+                 binary=None):
+        self.path = path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.payloads = PayloadFormat(codec, binary)
+        self._pool = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+        with self.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS players (
+                    id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 1,
+                    updated_at REAL NOT NULL
+                )""")
+            columns = [
+                row[1]
+                for row in conn.execute("PRAGMA table_info(players)")
+            ]
+            if "version" not in columns:
+                conn.execute("ALTER TABLE players ADD COLUMN "
+                             "version INTEGER NOT NULL DEFAULT 1")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path,
+                               timeout=self.timeout,
+                               check_same_thread=False,
+                               isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection, opening a new one if the pool allows"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.pool_size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                conn = self._pool.get(timeout=self.timeout)
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def load_versioned(self, player_id):
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT data, version FROM players WHERE id = ?",
+                (player_id, )).fetchone()
+        if row is None:
+            return None
+        return self.payloads.decode(row[0]), row[1]
+
+    def version_of(self, player_id):
+        with self.connection() as conn:
+            row = conn.execute("SELECT version FROM players WHERE id = ?",
+                               (player_id, )).fetchone()
+        return row[0] if row is not None else 0
+
+    _UPSERT = """INSERT INTO players (id, data, version, updated_at)
+                 VALUES (?, ?, COALESCE(?, 1), ?)
+                 ON CONFLICT(id) DO UPDATE SET
+                     data = excluded.data,
+                     version = COALESCE(?, players.version + 1),
+                     updated_at = excluded.updated_at"""
+
+    def save(self, player_id, data, op=None, version=None):
+        payload = self.payloads.encode(data)
+        with self.connection() as conn:
+            conn.execute(self._UPSERT,
+                         (player_id, payload, version, time.time(), version))
+
+    def save_many(self, items):
+        now = time.time()
+        rows = [(player_id, self.payloads.encode(data), version, now, version)
+                for player_id, data, _op, version in items]
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(self._UPSERT, rows)
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _swap(self, conn, player_id, expected_version, data, version):
+        """Compare-and-swap one row, returning True if it was written"""
+        payload = self.payloads.encode(data)
+        if expected_version == 0:
+            cursor = conn.execute(
+                """INSERT INTO players (id, data, version, updated_at)
+                   VALUES (?, ?, ?, ?) ON CONFLICT(id) DO NOTHING""",
+                (player_id, payload, version, time.time()))
+        else:
+            cursor = conn.execute(
+                """UPDATE players
+                   SET data = ?, version = ?, updated_at = ?
+                   WHERE id = ? AND version = ?""",
+                (payload, version, time.time(), player_id, expected_version))
+        return cursor.rowcount == 1
+
+    def compare_and_swap(self,
+                         player_id,
+                         expected_version,
+                         data,
+                         op=None,
+                         version=None):
+        version = version or expected_version + 1
+        with self.connection() as conn:
+            swapped = self._swap(conn, player_id, expected_version, data,
+                                 version)
+        if not swapped:
+            raise VersionConflict(player_id)
+        return version
+
+    def compare_and_swap_many(self, items):
+        conflicts = []
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for player_id, expected_version, data, _op, version in (
+                        swap_items(items)):
+                    if not self._swap(conn, player_id, expected_version,
+                                      data, version
+                                      or expected_version + 1):
+                        conflicts.append(player_id)
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        return conflicts
+
+    def delete(self, player_id):
+        with self.connection() as conn:
+            conn.execute("DELETE FROM players WHERE id = ?", (player_id, ))
+
+    def count(self):
+        with self.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM players").fetchone()[0]
+
+    def iter_players(self, batch_size=500):
+        for player_id, data, _version in self.iter_versioned(
+                batch_size=batch_size):
+            yield player_id, data
+
+    def iter_versioned(self, after="", batch_size=500):
+        # Keyset pagination keeps memory bounded to one batch of rows
+        last_id = after
+        while True:
+            with self.connection() as conn:
+                rows = conn.execute(
+                    "SELECT id, data, version FROM players WHERE id > ? "
+                    "ORDER BY id LIMIT ?", (last_id, batch_size)).fetchall()
+            if not rows:
+                return
+            for player_id, payload, version in rows:
+                yield player_id, self.payloads.decode(payload), version
+            last_id = rows[-1][0]
+
+    def close(self):
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+STORE_BACKENDS = {
+    "sqlite": "storage:SQLitePlayerStore",
+    "journal": "journal:JournalPlayerStore",
+}
+
+
+def open_store(backend, path, **options):
+    """Create a player store for the given backend name"""
+    try:
+        module_name, class_name = STORE_BACKENDS[backend].split(":")
+    except KeyError:
+        raise ValueError(f"Unknown player store backend: {backend}")
+    store_class = getattr(importlib.import_module(module_name), class_name)
+    return store_class(path, **options)
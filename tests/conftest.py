@@ -0,0 +1,32 @@
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The server opens its store when main is imported, so point it at a
+# scratch database first
+_data_dir = tempfile.mkdtemp(prefix="sololevelup-tests-")
+os.environ["SOLO_DB_PATH"] = os.path.join(_data_dir, "game_data.db")
+os.environ.setdefault("SOLO_LEADERBOARD_ARCHIVE",
+                      os.path.join(_data_dir, "leaderboard_archive"))
+os.environ.setdefault("SOLO_RESET_INTERVAL", "3600")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_player_ids = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def main():
+    import main
+    return main
+
+
+@pytest.fixture
+def client(main):
+    """Test client for a fresh player, sent as X-Player-Id"""
+    client = main.app.test_client()
+    client.environ_base["HTTP_X_PLAYER_ID"] = f"test-{next(_player_ids)}"
+    return client
@@ -0,0 +1,40 @@
+from achievements import DEFAULT_ACHIEVEMENTS, Achievement, AchievementEngine
+
+RICH = Achievement("rich", "Rich", "Hold 150 coins", "coins", 150, 10)
+LEARNER = Achievement("learner", "Learner", "Earn 50 XP", "total_experience",
+                      50, 10)
+
+
+def test_notify_player_checks_every_watched_field():
+    engine = AchievementEngine(DEFAULT_ACHIEVEMENTS + (RICH, LEARNER))
+    data = {
+        "player": {
+            "coins": 205,
+            "total_experience": 130,
+            "level": 1,
+            "streak": 0
+        },
+        "achievements": {}
+    }
+
+    assert sorted(engine.notify_player(data)) == ["learner", "rich"]
+    assert engine.notify_player(data) == []
+
+
+def test_player_field_achievements_unlock_during_play(main, client,
+                                                      monkeypatch):
+    monkeypatch.setattr(
+        main, "ACHIEVEMENTS",
+        AchievementEngine(DEFAULT_ACHIEVEMENTS + (RICH, LEARNER)))
+    assert client.get('/api/player').get_json()["coins"] < RICH.threshold
+    quest = client.post('/api/add-personal-quest', json={
+        "name": "Read"
+    }).get_json()["quest"]
+
+    client.post('/api/complete-personal-quest',
+                json={"quest_id": quest["id"]})
+
+    player_id = client.environ_base["HTTP_X_PLAYER_ID"]
+    achievements = main.store.load(player_id)["achievements"]
+    assert achievements["rich"]["unlocked"]
+    assert achievements["learner"]["unlocked"]
@@ -0,0 +1,61 @@
+import copy
+
+import pytest
+
+
+@pytest.mark.parametrize("path, body", [
+    ('/api/buy-item', {"item_name": ["Health Potion"]}),
+    ('/api/buy-item', {"item_id": {"id": "health_potion"}}),
+    ('/api/use-item', {"item_name": {"name": "Health Potion"}}),
+    ('/api/allocate-stat', {"stat_name": ["strength"]}),
+    ('/api/add-personal-quest', {"name": 5}),
+    ('/api/complete-quest', {"quest_name": ["discipline"]}),
+])
+def test_non_string_params_fail_the_action(client, path, body):
+    response = client.post(path, json=body)
+
+    assert response.status_code == 200
+    assert response.get_json()["success"] is False
+
+
+@pytest.mark.parametrize("path", ['/api/buy-item', '/api/batch'])
+def test_non_object_body_is_rejected(client, path):
+    response = client.post(path, json=["health_potion"])
+
+    assert response.status_code == 400
+    assert response.get_json()["success"] is False
+
+
+def test_batch_action_with_non_string_params_rolls_back(client):
+    coins = client.get('/api/player').get_json()["coins"]
+
+    response = client.post('/api/batch',
+                           json={
+                               "actions": [{
+                                   "action": "buy_item",
+                                   "item_name": "Health Potion"
+                               }, {
+                                   "action": "use_item",
+                                   "item_id": ["health_potion"]
+                               }]
+                           })
+
+    assert response.get_json()["failed_index"] == 1
+    assert client.get('/api/player').get_json()["coins"] == coins
+
+
+def test_actions_copy_only_what_they_change(client, main):
+    client.post('/api/add-personal-quest', json={"name": "Run 5km"})
+    player_id = client.environ_base["HTTP_X_PLAYER_ID"]
+    before, _version = main.store.load_snapshot(player_id)
+    player = copy.deepcopy(before["player"])
+
+    response = client.post('/api/buy-item',
+                           json={"item_name": "Health Potion"})
+
+    assert response.get_json()["success"] is True
+    after, _version = main.store.load_snapshot(player_id)
+    assert before["player"] == player
+    assert after["player"]["coins"] < player["coins"]
+    assert after["personal_quests"] is before["personal_quests"]
+    assert after["daily_tasks"] is before["daily_tasks"]
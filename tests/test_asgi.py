@@ -0,0 +1,86 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def asgi_app(main):
+    import asgi
+    return asgi.app
+
+
+def call(app, method, path, chunks=(b"", ), headers=(), query=b""):
+    """Run one request; returns (status, headers, body messages)"""
+
+    async def run():
+        messages = [{
+            "type": "http.request",
+            "body": chunk,
+            "more_body": index < len(chunks) - 1
+        } for index, chunk in enumerate(chunks)]
+        sent = []
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await asyncio.Event().wait()
+
+        async def send(message):
+            sent.append(message)
+
+        await app(
+            {
+                "type": "http",
+                "method": method,
+                "path": path,
+                "query_string": query,
+                "headers": [(name.encode(), value.encode())
+                            for name, value in headers]
+            }, receive, send)
+        return sent
+
+    sent = asyncio.run(run())
+    start = sent[0]
+    assert start["type"] == "http.response.start"
+    assert not sent[-1].get("more_body")
+    return start["status"], dict(start["headers"]), sent[1:]
+
+
+def test_json_request_in_chunks(asgi_app, client):
+    player_id = client.environ_base["HTTP_X_PLAYER_ID"]
+    body = json.dumps({"name": "Swim", "description": "1km"}).encode()
+    status, headers, messages = call(asgi_app,
+                                     "POST",
+                                     "/api/add-personal-quest",
+                                     chunks=(body[:5], body[5:]),
+                                     headers=[("x-player-id", player_id),
+                                              ("content-type",
+                                               "application/json")])
+    assert status == 200
+    result = json.loads(b"".join(message["body"] for message in messages))
+    assert result["quest"]["name"] == "Swim"
+
+
+def test_export_streams_one_message_per_batch(asgi_app, main, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    main.store.save_many((f"asgi-{index:04d}", {
+        "player": {
+            "name": "A"
+        }
+    }, None, None) for index in range(1200))
+    status, headers, messages = call(asgi_app,
+                                     "GET",
+                                     "/api/admin/export",
+                                     headers=[("x-admin-token", "secret")],
+                                     query=b"after=asgi-")
+    assert status == 200
+    bodies = [message["body"] for message in messages if message["body"]]
+    assert len(bodies) >= 3
+    ids = [
+        json.loads(line)["id"]
+        for line in gzip.decompress(b"".join(bodies)).splitlines()
+    ]
+    assert [player_id for player_id in ids if player_id.startswith("asgi-")
+            ] == [f"asgi-{index:04d}" for index in range(1200)]
@@ -0,0 +1,94 @@
+import pytest
+
+from storage import STORE_BACKENDS, VersionConflict, open_store
+from write_behind import DURABILITY_LEVELS, WriteBehindStore
+
+STORES = [(backend, None) for backend in STORE_BACKENDS] + [
+    ("sqlite", durability) for durability in DURABILITY_LEVELS
+]
+
+
+@pytest.fixture(params=STORES,
+                ids=lambda param: "-".join(filter(None, param)))
+def store(request, tmp_path):
+    backend, durability = request.param
+    path = str(tmp_path / backend)
+    if backend == "journal":
+        store = open_store(backend, path, compact_interval=3600)
+    else:
+        store = open_store(backend, path + ".db")
+    if durability is not None:
+        store = WriteBehindStore(store,
+                                 durability=durability,
+                                 interval=0.01,
+                                 cache_size=10)
+    yield store
+    store.close()
+
+
+def test_stale_versions_conflict(store):
+    assert store.compare_and_swap("p1", 0, {"coins": 1}) == 1
+
+    for expected_version in (0, 2):
+        with pytest.raises(VersionConflict):
+            store.compare_and_swap("p1", expected_version, {"coins": 2})
+    assert store.compare_and_swap_many([("p1", 0, {"coins": 3}, None),
+                                        ("p2", 0, {"coins": 4}, None),
+                                        ("p3", 1, {"coins": 5}, None)
+                                        ]) == ["p1", "p3"]
+
+    assert store.load_versioned("p1") == ({"coins": 1}, 1)
+    assert store.load_versioned("p2") == ({"coins": 4}, 1)
+    assert store.load_versioned("p3") is None
+
+
+@pytest.fixture
+def racing_store(main, monkeypatch):
+    """Lets a test commit another writer's change to a player just before
+    each of the next saves of it"""
+    writes = []
+    compare_and_swap = main.store.compare_and_swap
+
+    def racing(player_id, expected_version, data, **options):
+        if writes:
+            other, version = main.store.load_versioned(player_id)
+            writes.pop(0)(other)
+            compare_and_swap(player_id, version, other)
+        return compare_and_swap(player_id, expected_version, data, **options)
+
+    monkeypatch.setattr(main.store, "compare_and_swap", racing)
+    return writes
+
+
+def add_coins(data):
+    data["player"]["coins"] += 1000
+
+
+def test_conflicting_action_is_retried_on_the_other_commit(
+        client, main, racing_store):
+    coins = client.get('/api/player').get_json()["coins"]
+    conflicts = main.concurrency_stats["conflicts"]
+    racing_store.append(add_coins)
+
+    response = client.post('/api/buy-item',
+                           json={"item_name": "Health Potion"})
+
+    assert response.status_code == 200
+    assert response.get_json()["success"] is True
+    assert client.get('/api/player').get_json()["coins"] == coins + 975
+    assert main.concurrency_stats["conflicts"] == conflicts + 1
+
+
+def test_action_that_always_conflicts_gets_409(client, main, racing_store):
+    coins = client.get('/api/player').get_json()["coins"]
+    exhausted = main.concurrency_stats["retries_exhausted"]
+    racing_store.extend([add_coins] * main.MAX_MUTATION_RETRIES)
+
+    response = client.post('/api/buy-item',
+                           json={"item_name": "Health Potion"})
+
+    assert response.status_code == 409
+    assert response.get_json()["success"] is False
+    player = client.get('/api/player').get_json()
+    assert player["coins"] == coins + 1000 * main.MAX_MUTATION_RETRIES
+    assert main.concurrency_stats["retries_exhausted"] == exhausted + 1
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from journal import JournalPlayerStore
+
+
+def test_save_many_fsyncs_once(tmp_path, monkeypatch):
+    store = JournalPlayerStore(str(tmp_path / "journal"),
+                               compact_interval=3600)
+    fsyncs = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync",
+                        lambda fd: fsyncs.append(fd) or real_fsync(fd))
+    try:
+        store.save_many((f"p{index}", {"coins": index}, None, None)
+                        for index in range(50))
+        assert len(fsyncs) == 1
+        assert store.compare_and_swap_many([("p1", 1, {"coins": 7}, None),
+                                            ("p2", 5, {"coins": 7}, None)
+                                            ]) == ["p2"]
+        assert len(fsyncs) == 2
+    finally:
+        store.close()
+
+    reopened = JournalPlayerStore(str(tmp_path / "journal"),
+                                  compact_interval=3600)
+    try:
+        assert reopened.load_versioned("p1") == ({"coins": 7}, 2)
+        assert reopened.load_versioned("p49") == ({"coins": 49}, 1)
+    finally:
+        reopened.close()
+
+
+def test_compaction_after_a_failed_one_keeps_the_live_segment(
+        tmp_path, monkeypatch):
+    path = str(tmp_path / "journal")
+    store = JournalPlayerStore(path, compact_interval=3600)
+    store.save("p1", {"coins": 1})
+
+    def fail(src, dst):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(os, "replace", fail)
+        with pytest.raises(OSError):
+            store.compact()
+    store.compact()
+    store.save("p1", {"coins": 2})
+
+    # Reopened without closing, as after a crash
+    reopened = JournalPlayerStore(path, compact_interval=3600)
+    try:
+        assert reopened.load_versioned("p1") == ({"coins": 2}, 2)
+    finally:
+        reopened.close()
+        store.close()
@@ -0,0 +1,190 @@
+import bisect
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import leaderboard as leaderboard_module
+from leaderboard import (_NIL, MAX_LEVELS, IndexableSkipList, Leaderboard,
+                         window_bucket)
+
+
+def check_widths(skip_list, expected):
+    # Each link's width is how far it moves along the sorted keys
+    for level in range(MAX_LEVELS):
+        node, position = skip_list._head, 0
+        while node is not _NIL:
+            position += node.width[level]
+            node = node.next[level]
+            if node is not _NIL:
+                assert node.key == expected[position - 1]
+        assert position == len(expected) + 1
+
+
+def test_skip_list_matches_a_sorted_list():
+    rng = random.Random(5)
+    skip_list, expected = IndexableSkipList(), []
+    for step in range(3000):
+        if expected and rng.random() < 0.4:
+            key = expected.pop(rng.randrange(len(expected)))
+            skip_list.remove(key)
+        else:
+            key = (rng.randrange(200), step)
+            bisect.insort(expected, key)
+            skip_list.insert(key)
+        if step % 100 == 0:
+            check_widths(skip_list, expected)
+
+        assert len(skip_list) == len(expected)
+        probe = (rng.randrange(-5, 205), rng.randrange(3000))
+        assert skip_list.rank(probe) == bisect.bisect_left(expected, probe)
+        start = rng.randrange(-3, len(expected) + 3)
+        stop = max(start + rng.randrange(0, 20), 0)
+        assert skip_list.slice(start, stop) == expected[max(start, 0):stop]
+    with pytest.raises(KeyError):
+        skip_list.remove((999, 0))
+
+
+def player_ids(entries):
+    return [entry["player_id"] for entry in entries]
+
+
+def test_leaderboard_matches_a_sorted_list():
+    rng = random.Random(7)
+    board = Leaderboard(windows=())
+    experience = {}
+    for step in range(2000):
+        player_id = f"p{rng.randrange(300)}"
+        if player_id in experience and rng.random() < 0.2:
+            del experience[player_id]
+            board.remove(player_id)
+        else:
+            experience[player_id] = rng.randrange(50) * 100
+            board.update(player_id, {
+                "name": player_id,
+                "total_experience": experience[player_id]
+            })
+        if step % 50:
+            continue
+
+        ranked = sorted(experience, key=lambda pid: (-experience[pid], pid))
+        offset, limit = rng.randrange(len(ranked) + 5), rng.randrange(1, 30)
+        page = board.page("total_experience", offset, limit)
+        assert player_ids(page) == ranked[offset:offset + limit]
+        positions = [entry["position"] for entry in page]
+        assert positions == list(range(offset + 1, offset + len(page) + 1))
+
+        player_id = rng.choice(ranked)
+        position = ranked.index(player_id) + 1
+        assert board.position("total_experience", player_id) == position
+        radius = rng.randrange(5)
+        around = board.around("total_experience", player_id, radius)
+        start = max(position - 1 - radius, 0)
+        assert player_ids(around) == ranked[start:position + radius]
+    assert len(board) == len(experience)
+
+
+class Clock(datetime):
+    current = datetime(2025, 7, 24, 12, 0)
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+
+def test_expired_window_is_archived_and_restarted(monkeypatch):
+    monkeypatch.setattr(leaderboard_module, "datetime", Clock)
+    archived = []
+    board = Leaderboard(windows=("daily", ),
+                        archive=lambda *args: archived.append(args))
+    for number, xp in enumerate([30, 50, 10]):
+        player = {"name": f"p{number}", "total_experience": xp}
+        leaderboard_module.record_window_xp(player, xp, Clock.current)
+        board.update(f"p{number}", player)
+    page = board.page("daily", 0, 10)
+    assert [entry["window_xp"] for entry in page] == [50, 30, 10]
+
+    monkeypatch.setattr(Clock, "current", Clock.current + timedelta(days=1))
+
+    assert board.page("daily", 0, 10) == []
+    assert board.bucket("daily") == "2025-07-25"
+    [(window, bucket, rows)] = archived
+    assert (window, bucket) == ("daily", "2025-07-24")
+    assert [(row["name"], row["window_xp"], row["position"])
+            for row in rows] == [("p1", 50, 1), ("p0", 30, 2), ("p2", 10, 3)]
+    # A counter from the expired bucket is not ranked in the new one
+    board.update("p3", {
+        "name": "p3",
+        "xp_windows": {
+            "daily": {
+                "bucket": "2025-07-24",
+                "xp": 99
+            }
+        }
+    })
+    assert board.window_size("daily") == 0
+
+
+@pytest.fixture
+def board(main, monkeypatch):
+    """A leaderboard of 20 players, p00 to p19, with 100 XP more each and
+    weekly XP in the opposite order"""
+    board = Leaderboard(windows=("weekly", ))
+    monkeypatch.setattr(main, "leaderboard", board)
+    bucket = window_bucket("weekly", datetime.now())
+    for number in range(20):
+        board.update(
+            f"p{number:02d}", {
+                "name": f"P{number:02d}",
+                "total_experience": (number + 1) * 100,
+                "xp_windows": {
+                    "weekly": {
+                        "bucket": bucket,
+                        "xp": (20 - number) * 10
+                    }
+                }
+            })
+    return board
+
+
+def names(entries):
+    return [entry["name"] for entry in entries]
+
+
+def test_leaderboard_route_pages(client, board):
+    response = client.get('/api/leaderboard?offset=5&limit=3&around=1')
+
+    result = response.get_json()
+    assert names(result["players"]) == ["P14", "P13", "P12"]
+    assert [entry["position"] for entry in result["players"]] == [6, 7, 8]
+    assert result["total_players"] == 21
+    # The caller has no XP yet
+    assert result["current_player_position"] == 21
+    assert names(result["around"])[0] == "P00"
+    assert [entry["current_player"]
+            for entry in result["around"]] == [False, True]
+
+    result = client.get('/api/leaderboard?offset=-4&limit=500').get_json()
+    assert (result["offset"], result["limit"]) == (0, 100)
+    assert len(result["players"]) == 21
+
+
+def test_leaderboard_route_by_week(client, board):
+    response = client.get('/api/leaderboard?by=weekly&limit=3&around=1')
+
+    result = response.get_json()
+    assert names(result["players"]) == ["P00", "P01", "P02"]
+    window_xp = [entry["window_xp"] for entry in result["players"]]
+    assert window_xp == [200, 190, 180]
+    assert result["bucket"] == window_bucket("weekly", datetime.now())
+    assert result["total_players"] == 20
+    assert result["current_player_position"] is None
+    assert result["around"] == []
+
+
+@pytest.mark.parametrize("query", ["by=monthly", "offset=x", "around=-"])
+def test_leaderboard_route_rejects_bad_queries(client, board, query):
+    response = client.get(f'/api/leaderboard?{query}')
+
+    assert response.status_code == 400
+    assert response.get_json()["success"] is False
@@ -0,0 +1,141 @@
+import random
+
+from personal_quests import (_matches, add_quest as add_quest_entry,
+                             complete_quest, encode_cursor, query_quests,
+                             remove_quest)
+
+
+def add_quest(client, name="Run 5km"):
+    response = client.post('/api/add-personal-quest',
+                           json={
+                               "name": name,
+                               "description": ""
+                           })
+    assert response.status_code == 200
+    return response.get_json()["quest"]
+
+
+def test_complete_personal_quest(client):
+    quest = add_quest(client)
+    experience = client.get('/api/player').get_json()["total_experience"]
+
+    response = client.post('/api/complete-personal-quest',
+                           json={"quest_id": quest["id"]})
+
+    assert response.status_code == 200
+    assert response.get_json()["success"] is True
+    player = client.get('/api/player').get_json()
+    assert player["total_experience"] == experience + quest["reward_xp"]
+    quests = client.get('/api/personal-quests?completed=true').get_json()
+    assert [item["id"] for item in quests["quests"]] == [quest["id"]]
+
+    response = client.post('/api/complete-personal-quest',
+                           json={"quest_id": quest["id"]})
+    assert response.get_json() == {
+        "success": False,
+        "error": "Quest already completed"
+    }
+
+
+def test_cursor_key_must_match_index(client):
+    add_quest(client)
+    for index, key in (("created", 5), ("id", ["a", 1]),
+                       ("name", ["a", True]), ("created", ["a"])):
+        cursor = encode_cursor(index, key)
+        query = "completed=false&" if index == "id" else ""
+        response = client.get(
+            f'/api/personal-quests?{query}cursor={cursor}')
+        assert response.status_code == 400
+        assert response.get_json()["error"] == "Invalid cursor"
+
+
+def test_prefix_finds_names_beyond_the_basic_plane(client):
+    for name in ("a\U0001F600 run", "ab", "b"):
+        add_quest(client, name)
+
+    response = client.get('/api/personal-quests?prefix=a&limit=1')
+    page = response.get_json()
+    names = [quest["name"] for quest in page["quests"]]
+    response = client.get(
+        f'/api/personal-quests?prefix=a&cursor={page["next_cursor"]}')
+    page = response.get_json()
+    names += [quest["name"] for quest in page["quests"]]
+
+    assert names == ["ab", "a\U0001F600 run"]
+    assert page["next_cursor"] is None
+
+
+def test_queries_match_a_scan_of_every_quest():
+    rng = random.Random(16)
+    data = {}
+    for number in range(300):
+        quest = add_quest_entry(
+            data, {
+                "name": rng.choice(["run", "Read", "rest", "swim"]) +
+                str(number),
+                "completed": False,
+                "created_date": f"2025-07-{rng.randint(1, 28):02d}"
+            })
+        if rng.random() < 0.8:
+            complete_quest(data, quest, f"2025-08-{rng.randint(1, 28):02d}")
+    for number in range(0, 300, 7):
+        remove_quest(data, number + 1)
+    quests = list(data["personal_quests"]["items"].values())
+    queries = [{}, {
+        "completed": False
+    }, {
+        "completed": True
+    }, {
+        "completed": False,
+        "created_from": "2025-07-10"
+    }, {
+        "created_from": "2025-07-05",
+        "created_to": "2025-07-20"
+    }, {
+        "completed": True,
+        "completed_to": "2025-08-14"
+    }, {
+        "completed": False,
+        "completed_from": "2025-08-01"
+    }, {
+        "prefix": "R",
+        "created_to": "2025-07-14"
+    }, {
+        "completed": False,
+        "prefix": "re"
+    }]
+
+    for query in queries:
+        expected = [quest["id"] for quest in quests if _matches(
+            quest, query.get("completed"), query.get("created_from"),
+            query.get("created_to"), query.get("completed_from"),
+            query.get("completed_to"), query.get("prefix", "").lower())]
+        found, cursor = [], None
+        while True:
+            page, cursor = query_quests(data, cursor=cursor, limit=7, **query)
+            found += [quest["id"] for quest in page]
+            if cursor is None:
+                break
+        assert sorted(found) == sorted(expected), query
+        assert len(found) == len(set(found)), query
+
+
+def test_quest_indexes_are_rebuilt_on_load_not_saved(client, main):
+    for name in ("b", "a", "c"):
+        add_quest(client, name)
+    player_id = client.environ_base["HTTP_X_PLAYER_ID"]
+    main.store.flush()
+
+    stored = main.store.inner.load_versioned(player_id)[0]
+    assert "indexes" not in stored["personal_quests"]
+
+    with main.store._cond:
+        main.store._forget(player_id)
+    response = client.get('/api/personal-quests?completed=false&prefix=')
+    assert [quest["name"] for quest in response.get_json()["quests"]] == [
+        "b", "a", "c"
+    ]
+    snapshot = main.store.load_snapshot(player_id)[0]
+    assert snapshot["personal_quests"]["indexes"]["open"]["name"] == [
+        ["a", 2], ["b", 1], ["c", 3]
+    ]
@@ -0,0 +1,40 @@
+import random
+
+import pytest
+
+from progression import XPCurve
+
+
+def level_by_loop(total_xp, base_xp=100, growth=1.2):
+    """The original level-by-level calculation"""
+    level = 1
+    xp_needed = base_xp
+    current_xp = total_xp
+
+    while current_xp >= xp_needed:
+        current_xp -= xp_needed
+        level += 1
+        xp_needed = int(xp_needed * growth)
+
+    return level, current_xp, xp_needed
+
+
+def test_curve_matches_the_loop_for_consecutive_totals():
+    curve = XPCurve()
+
+    for total_xp in range(-10, 200000):
+        assert curve.level_for(total_xp) == level_by_loop(total_xp)
+
+
+@pytest.mark.parametrize("base_xp, growth", [(100, 1.2), (3, 1.5),
+                                             (1000, 2.5)])
+def test_curve_matches_the_loop_for_large_totals(base_xp, growth):
+    rng = random.Random(4)
+    curve = XPCurve(base_xp=base_xp, growth=growth, initial_levels=10)
+
+    for _ in range(20000):
+        total_xp = rng.randrange(10**rng.randint(1, 15))
+        level, current_xp, xp_needed = curve.level_for(total_xp)
+        assert (level, current_xp, xp_needed) == level_by_loop(
+            total_xp, base_xp, growth)
+        assert curve.total_for_level(level) == total_xp - current_xp
@@ -0,0 +1,60 @@
+import copy
+import time
+
+import pytest
+
+from scheduler import check_daily_reset, next_player_reset
+
+DAY = 86400
+
+
+@pytest.fixture
+def data(main):
+    data = copy.deepcopy(main.new_game_data("scheduler"))
+    data["player"]["streak"] = 1
+    for task in data["daily_tasks"]:
+        task["completed"] = True
+    return data
+
+
+def pushup_target(data):
+    return next(task["max"] for task in data["daily_tasks"]
+                if "PUSHUPS" in task["name"])
+
+
+def test_reset_after_a_completed_day_keeps_the_streak(data):
+    now = time.time()
+    data["reset_at"] = now - 60
+
+    assert check_daily_reset(data, now)
+
+    assert data["player"]["streak"] == 1
+    assert pushup_target(data) == 14
+    assert data["reset_at"] == next_player_reset(data, now)
+
+
+def test_missed_days_end_the_streak(data):
+    now = time.time()
+    data["reset_at"] = now - 3 * DAY
+
+    assert check_daily_reset(data, now)
+
+    assert data["player"]["streak"] == 0
+    assert pushup_target(data) == 12
+    assert data["reset_at"] > now
+
+
+def test_loading_a_player_after_missed_days_ends_the_streak(client, main):
+    player_id = client.environ_base["HTTP_X_PLAYER_ID"]
+    client.get('/api/player')
+    data, version = main.store.load_versioned(player_id)
+    data = copy.deepcopy(data)
+    data["player"]["streak"] = 1
+    for task in data["daily_tasks"]:
+        task["completed"] = True
+    data["reset_at"] = time.time() - 3 * DAY
+    main.store.compare_and_swap(player_id, version, data)
+
+    player = client.get('/api/player').get_json()
+
+    assert player["streak"] == 0
@@ -0,0 +1,28 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("numpy")
+
+import simulator  # noqa: E402
+from progression import XPCurve  # noqa: E402
+
+SAMPLE_SAVE = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                           "game_data.json")
+
+
+@pytest.mark.parametrize("curve", [XPCurve(), XPCurve(base_xp=50, growth=1.5)])
+def test_vectorized_functions_match_the_server(curve):
+    simulator.check(curve, count=20000)
+
+
+def test_simulate_summarizes_every_day():
+    with open(SAMPLE_SAVE) as f:
+        sample = json.load(f)
+
+    days = list(simulator.simulate(sample, XPCurve(), players=500, days=5))
+
+    assert [summary["day"] for summary in days] == [1, 2, 3, 4, 5]
+    assert sum(days[-1]["ranks"].values()) == pytest.approx(1.0)
+    assert days[-1]["level"][1] >= days[0]["level"][1]
@@ -0,0 +1,81 @@
+import bisect
+import copy
+
+from snapshots import freeze, thaw
+
+
+def snapshot():
+    return {
+        "player": {
+            "coins": 10,
+            "stats": {
+                "strength": 1
+            }
+        },
+        "daily_tasks": [{
+            "completed": False
+        }, {
+            "completed": False
+        }],
+        "personal_quests": {
+            "items": {
+                "1": {
+                    "name": "Run"
+                }
+            },
+            "names": [["run", 1]]
+        }
+    }
+
+
+def test_writes_leave_the_snapshot_unchanged():
+    shared = snapshot()
+    original = copy.deepcopy(shared)
+
+    data = thaw(shared)
+    data["player"]["coins"] += 5
+    for task in data["daily_tasks"]:
+        task["completed"] = True
+    data["personal_quests"]["items"]["2"] = {"name": "Swim"}
+    bisect.insort(data["personal_quests"]["names"], ["swim", 2])
+    del data["personal_quests"]["items"]["1"]
+    new = freeze(data)
+
+    assert shared == original
+    assert new["player"] == {"coins": 15, "stats": {"strength": 1}}
+    assert new["daily_tasks"] == [{"completed": True}] * 2
+    assert new["personal_quests"] == {
+        "items": {
+            "2": {
+                "name": "Swim"
+            }
+        },
+        "names": [["run", 1], ["swim", 2]]
+    }
+
+
+def test_untouched_parts_are_shared():
+    shared = snapshot()
+
+    data = thaw(shared)
+    data["player"]["coins"] = 0
+    new = freeze(data)
+
+    assert new["player"] is not shared["player"]
+    assert new["player"]["stats"] is shared["player"]["stats"]
+    assert new["daily_tasks"] is shared["daily_tasks"]
+    assert new["personal_quests"] is shared["personal_quests"]
+    assert type(new) is dict and type(new["player"]) is dict
+
+
+def test_a_view_of_a_view_leaves_the_first_unchanged():
+    data = thaw(snapshot())
+    data["player"]["coins"] = 1
+
+    attempt = thaw(data)
+    attempt["player"]["coins"] = 2
+    attempt["daily_tasks"][0]["completed"] = True
+
+    assert freeze(data)["player"]["coins"] == 1
+    assert freeze(data)["daily_tasks"][0]["completed"] is False
+    assert freeze(attempt)["player"]["coins"] == 2
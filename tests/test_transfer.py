@@ -0,0 +1,66 @@
+import copy
+import json
+
+import pytest
+
+
+@pytest.fixture
+def admin(main, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    return {"X-Admin-Token": "secret"}
+
+
+def exported(client, main):
+    client.get('/api/player')
+    player_id = client.environ_base["HTTP_X_PLAYER_ID"]
+    return copy.deepcopy(main.store.load_snapshot(player_id)[0])
+
+
+def legacy(data):
+    data = copy.deepcopy(data)
+    # Saves from before personal_quests carry no save_format either
+    data.pop("personal_quests", None)
+    data.pop("save_format", None)
+    data["personal_quest_list"] = [{
+        "id": 1,
+        "name": "Run 5km",
+        "description": "",
+        "completed": False,
+        "created_date": "2025-07-24",
+        "reward_xp": 100,
+        "reward_coins": 50
+    }]
+    return data
+
+
+def test_import_checks_what_loading_a_player_needs(client, main, admin):
+    data = exported(client, main)
+    no_quests = legacy(data)
+    del no_quests["quests"]
+    unnamed = legacy(data)
+    del unnamed["personal_quest_list"][0]["name"]
+    lines = [{
+        "id": "import-legacy",
+        "data": legacy(data)
+    }, {
+        "id": "import-no-quests",
+        "data": no_quests
+    }, {
+        "id": "import-unnamed",
+        "data": unnamed
+    }]
+    body = "".join(json.dumps(line) + "\n" for line in lines)
+
+    response = client.post('/api/admin/import', data=body, headers=admin)
+
+    result = response.get_json()
+    assert result["imported"] == 1
+    assert result["errors"] == [
+        "line 2: import-no-quests: quests is not an object",
+        "line 3: import-unnamed: invalid personal quest"
+    ]
+    client.environ_base["HTTP_X_PLAYER_ID"] = "import-legacy"
+    assert client.get('/api/player').status_code == 200
+    quests = client.get('/api/personal-quests').get_json()["quests"]
+    assert [quest["name"] for quest in quests] == ["Run 5km"]
+    assert client.get('/api/quests').get_json()["personal_quests"] == 1
@@ -0,0 +1,199 @@
+import threading
+
+import pytest
+
+from storage import SQLitePlayerStore, VersionConflict
+from write_behind import DURABILITY_LEVELS, WriteBehindStore
+
+
+@pytest.fixture(params=DURABILITY_LEVELS)
+def stores(request, tmp_path):
+    path = str(tmp_path / "players.db")
+    store = WriteBehindStore(SQLitePlayerStore(path),
+                             durability=request.param,
+                             interval=0.01,
+                             cache_size=10)
+    other = SQLitePlayerStore(path)
+    yield store, other
+    store.close()
+    other.close()
+
+
+def test_cached_player_sees_writes_from_another_process(stores):
+    store, other = stores
+    store.compare_and_swap("p1", 0, {"coins": 100})
+    store.flush()
+    assert store.load_snapshot("p1") == ({"coins": 100}, 1)
+
+    other.compare_and_swap("p1", 1, {"coins": 9999})
+
+    assert store.load_snapshot("p1") == ({"coins": 9999}, 2)
+    assert store.version_of("p1") == 2
+
+
+def test_stale_cached_version_conflicts(stores):
+    store, other = stores
+    store.compare_and_swap("p1", 0, {"coins": 100})
+    store.flush()
+    store.load_snapshot("p1")
+    other.compare_and_swap("p1", 1, {"coins": 9999})
+
+    with pytest.raises(VersionConflict):
+        store.compare_and_swap("p1", 1, {"coins": 80})
+    store.flush()
+    assert other.load_versioned("p1") == ({"coins": 9999}, 2)
+
+
+@pytest.mark.parametrize("durability", ["sync", "group"])
+def test_two_stores_never_lose_an_increment(tmp_path, durability):
+    path = str(tmp_path / "players.db")
+    stores = [
+        WriteBehindStore(SQLitePlayerStore(path),
+                         durability=durability,
+                         interval=0.005,
+                         cache_size=10) for _ in range(2)
+    ]
+    stores[0].compare_and_swap("p1", 0, {"coins": 0})
+    stores[0].flush()
+
+    def increment(store, times):
+        while times:
+            data, version = store.load_versioned("p1")
+            data["coins"] += 1
+            try:
+                store.compare_and_swap("p1", version, data)
+            except VersionConflict:
+                continue
+            times -= 1
+
+    threads = [
+        threading.Thread(target=increment, args=(store, 200))
+        for store in stores
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for store in stores:
+        store.close()
+
+    reader = SQLitePlayerStore(path)
+    assert reader.load_versioned("p1") == ({"coins": 400}, 401)
+    reader.close()
+
+
+def test_async_flush_keeps_a_newer_commit(tmp_path):
+    path = str(tmp_path / "players.db")
+    store = WriteBehindStore(SQLitePlayerStore(path),
+                             durability="async",
+                             interval=0.01,
+                             cache_size=10)
+    other = SQLitePlayerStore(path)
+    try:
+        store.compare_and_swap("p1", 0, {"coins": 100})
+        store.flush()
+        # Holds off the flusher until the other commit is in
+        with store._flush_lock:
+            store.compare_and_swap("p1", 1, {"coins": 80})
+            store.compare_and_swap("p1", 2, {"coins": 60})
+            other.compare_and_swap("p1", 1, {"coins": 9999})
+            store._flush()
+
+        assert other.load_versioned("p1") == ({"coins": 9999}, 2)
+        assert store.load_versioned("p1") == ({"coins": 9999}, 2)
+        assert store.stats()["flush_conflicts"] == 1
+    finally:
+        store.close()
+        other.close()
+
+
+def test_save_many_waits_for_one_group_commit(tmp_path):
+    store = WriteBehindStore(SQLitePlayerStore(str(tmp_path / "players.db")),
+                             durability="group",
+                             interval=0.01,
+                             cache_size=10)
+    try:
+        store.save("p0", {"coins": 1})
+        flushes = store.stats()["flushes"]
+        store.save_many((f"p{index}", {"coins": index}, "import", None)
+                        for index in range(200))
+        assert store.stats()["flushes"] - flushes <= 2
+        assert store.load_versioned("p0") == ({"coins": 0}, 2)
+        assert store.inner.load_versioned("p199") == ({"coins": 199}, 1)
+    finally:
+        store.close()
+
+
+def test_cache_model_round_trips_players(tmp_path):
+    from models import GameState
+    store = WriteBehindStore(SQLitePlayerStore(str(tmp_path / "players.db")),
+                             durability="sync",
+                             cache_size=10,
+                             cache_model=GameState,
+                             hot_size=0)
+    data = {
+        "player": {
+            "name": "A",
+            "level": 3,
+            "stats": {
+                "strength": 10
+            }
+        },
+        "daily_tasks": [{
+            "name": "12 PUSHUPS",
+            "completed": False
+        }],
+        "settings": {
+            "timezone": None
+        }
+    }
+    try:
+        store.compare_and_swap("p1", 0, data)
+        assert isinstance(store._cache["p1"][0], GameState)
+        assert store.load_snapshot("p1") == (data, 1)
+        assert store.load_versioned("p1") == (data, 1)
+    finally:
+        store.close()
+
+
+def test_hot_players_are_cached_as_saved(tmp_path):
+    from models import GameState
+    store = WriteBehindStore(SQLitePlayerStore(str(tmp_path / "players.db")),
+                             durability="sync",
+                             cache_size=10,
+                             cache_model=GameState,
+                             hot_size=1)
+    first = {"player": {"name": "A", "level": 1}}
+    second = {"player": {"name": "B", "level": 2}}
+    try:
+        store.compare_and_swap("p1", 0, first)
+        assert store.load_snapshot("p1")[0] is first
+
+        store.compare_and_swap("p2", 0, second)
+        assert isinstance(store._cache["p1"][0], GameState)
+        assert store.load_snapshot("p2")[0] is second
+
+        data, version = store.load_snapshot("p1")
+        assert (data, version) == (first, 1)
+        assert store.load_snapshot("p1")[0] is data
+        assert isinstance(store._cache["p2"][0], GameState)
+    finally:
+        store.close()
+
+
+def test_cache_model_keeps_legacy_saves(tmp_path):
+    from models import GameState
+    data = {
+        "player": {
+            "name": "A"
+        },
+        "achievements": [{
+            "name": "First Steps",
+            "unlocked": True
+        }],
+        "inventory": [{
+            "name": "Health Potion",
+            "quantity": 3
+        }]
+    }
+    assert GameState.from_dict(data).to_dict() == data
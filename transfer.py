@@ -0,0 +1,398 @@
+"""Streaming export and import of every player as gzipped NDJSON
+
+Usage: python transfer.py export PATH [--batch-size N] [--level N]
+                          [--checkpoint PATH]
+       python transfer.py import PATH [--batch-size N] [--skip-existing]
+                          [--strict] [--checkpoint PATH]
+
+Each line holds one player: {"id": ..., "version": ..., "data": {...}}.
+Export reads players in id order a batch at a time and writes each batch as
+its own gzip member, so the file is a complete gzip stream (readable by
+zcat or gzip.open) after every batch. Import reads a file a line at a time,
+validates each player and saves them one batch per transaction; plain
+uncompressed NDJSON is accepted too. Imported players get a new version,
+so a running server reloads them rather than serving its cached copies,
+and its buffered saves of the same players are dropped, not written over
+them.
+
+With --checkpoint, progress is saved after every batch, and an interrupted
+run started again with the same checkpoint continues where it stopped. The
+store is chosen by SOLO_STORE, SOLO_DB_PATH and SOLO_STORE_BINARY, as for
+the server; run journal stores only while the server is stopped.
+"""
+import argparse
+import gzip
+import io
+import json
+import os
+import re
+import sys
+import time
+
+from codec import get_codec
+from maintenance import save_checkpoint
+from storage import open_store
+
+# Player ids accepted by the server and by imports
+PLAYER_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+# gzip level of exported batches; higher levels are smaller but slower
+COMPRESS_LEVEL = 6
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Fields every imported player must have, with their types
+PLAYER_FIELDS = {
+    "name": str,
+    "level": int,
+    "current_xp": int,
+    "total_experience": int,
+    "coins": int,
+    "energy": int,
+    "max_energy": int,
+    "streak": int,
+    "max_streak": int,
+    "stats": dict,
+}
+TASK_FIELDS = {"name": str, "completed": bool}
+# Fields every personal quest must have, in either stored form
+PERSONAL_QUEST_FIELDS = {"id": int, "name": str, "completed": bool}
+
+# Optional sections of an imported player's data, with their types. Lists
+# are the forms of saves from before the catalog, upgraded when the player
+# is next loaded
+SECTION_TYPES = {
+    "inventory": (dict, list),
+    "personal_quests": dict,
+    "personal_quest_list": list,
+    "achievements": (dict, list),
+    "lifetime": dict,
+    "settings": dict,
+    "last_reset": str,
+    "reset_at": (int, float),
+}
+
+
+def _is_type(value, expected):
+    # bool is an int subclass, but never a valid count
+    if isinstance(value, bool) and expected is not bool:
+        return False
+    return isinstance(value, expected)
+
+
+def validate_player(record):
+    """Return (player_id, data) of an export line, raising ValueError"""
+    if not isinstance(record, dict):
+        raise ValueError("line is not an object")
+    player_id = record.get("id")
+    if not isinstance(player_id, str) or not PLAYER_ID_PATTERN.match(
+            player_id):
+        raise ValueError(f"invalid player id {player_id!r}")
+    data = record.get("data")
+    if not isinstance(data, dict):
+        raise ValueError(f"{player_id}: data is not an object")
+    player = data.get("player")
+    if not isinstance(player, dict):
+        raise ValueError(f"{player_id}: player is not an object")
+    for field, expected in PLAYER_FIELDS.items():
+        if not _is_type(player.get(field), expected):
+            raise ValueError(f"{player_id}: invalid player.{field}")
+    for name, value in player["stats"].items():
+        if not _is_type(value, int):
+            raise ValueError(f"{player_id}: invalid player.stats.{name}")
+    tasks = data.get("daily_tasks")
+    if not isinstance(tasks, list):
+        raise ValueError(f"{player_id}: daily_tasks is not a list")
+    for index, task in enumerate(tasks):
+        if not isinstance(task, dict) or not all(
+                _is_type(task.get(field), expected)
+                for field, expected in TASK_FIELDS.items()):
+            raise ValueError(f"{player_id}: invalid daily_tasks[{index}]")
+    # Loading a player counts its open personal quests into quests
+    if not isinstance(data.get("quests"), dict):
+        raise ValueError(f"{player_id}: quests is not an object")
+    for section, expected in SECTION_TYPES.items():
+        if section in data and not _is_type(data[section], expected):
+            raise ValueError(f"{player_id}: invalid {section}")
+    quests = list(data.get("personal_quest_list", []))
+    if "personal_quests" in data:
+        items = data["personal_quests"].get("items")
+        if not isinstance(items, dict):
+            raise ValueError(f"{player_id}: invalid personal_quests.items")
+        quests.extend(items.values())
+    for quest in quests:
+        if not isinstance(quest, dict) or not all(
+                _is_type(quest.get(field), expected)
+                for field, expected in PERSONAL_QUEST_FIELDS.items()):
+            raise ValueError(f"{player_id}: invalid personal quest")
+    return player_id, data
+
+
+def export_batches(store,
+                   after="",
+                   batch_size=500,
+                   codec=None,
+                   level=COMPRESS_LEVEL):
+    """Yield (last_id, count, gzip member) per batch of players after an id
+
+    Concatenated, the members are one gzipped NDJSON stream. Players are
+    read as they are when their batch is reached, so a long export of a
+    running server is not a point-in-time copy.
+    """
+    codec = codec or get_codec()
+    lines = []
+    last_id = after
+    for player_id, data, version in store.iter_versioned(
+            after=after, batch_size=batch_size):
+        lines.append(
+            codec.dumps({
+                "id": player_id,
+                "version": version,
+                "data": data
+            }))
+        last_id = player_id
+        if len(lines) == batch_size:
+            yield last_id, len(lines), _compress(lines, level)
+            lines = []
+    if lines:
+        yield last_id, len(lines), _compress(lines, level)
+
+
+def _compress(lines, level):
+    lines.append("")
+    return gzip.compress("\n".join(lines).encode(), compresslevel=level)
+
+
+def open_lines(source):
+    """Binary line reader over gzipped or plain NDJSON from a file object"""
+    if not hasattr(source, "peek"):
+        source = io.BufferedReader(source)
+    if source.peek(2)[:2] == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=source)
+    return source
+
+
+def import_batches(lines,
+                   batch_size=500,
+                   start_line=0,
+                   codec=None,
+                   strict=False,
+                   errors=None):
+    """Yield (line_number, players) batches of valid players from lines
+
+    players is a list of (player_id, data) and line_number the last line
+    read. The first start_line lines are skipped without being parsed.
+    Invalid lines are passed to errors(line_number, message) and skipped,
+    or raise ValueError if strict.
+    """
+    codec = codec or get_codec()
+    batch = []
+    line_number = 0
+    for line_number, line in enumerate(lines, 1):
+        if line_number <= start_line or not line.strip():
+            continue
+        try:
+            batch.append(validate_player(codec.loads(line)))
+        except ValueError as exc:
+            message = str(exc) or "invalid JSON"
+            if strict:
+                raise ValueError(f"line {line_number}: {message}")
+            if errors is not None:
+                errors(line_number, message)
+            continue
+        if len(batch) == batch_size:
+            yield line_number, batch
+            batch = []
+    if batch or line_number > start_line:
+        yield line_number, batch
+
+
+def save_players(store, players, skip_existing=False, op="import"):
+    """Save a batch of (player_id, data) in one call to save_many
+
+    Returns the saved (player_id, data) pairs and the skipped ids.
+    """
+    saved = []
+    skipped = []
+    for player_id, data in players:
+        if skip_existing and store.version_of(player_id):
+            skipped.append(player_id)
+        else:
+            saved.append((player_id, data))
+    store.save_many((player_id, data, op, None) for player_id, data in saved)
+    return saved, skipped
+
+
+def load_checkpoint(path, mode, target):
+    """Saved progress of a transfer, or a fresh start if there is none"""
+    state = {
+        "mode": mode,
+        "path": os.path.abspath(target),
+        "after": "",
+        "offset": 0,
+        "lines": 0,
+        "exported": 0,
+        "imported": 0,
+        "skipped": 0,
+        "invalid": 0,
+        "elapsed": 0.0
+    }
+    if path is None or not os.path.exists(path):
+        return state
+    with open(path) as f:
+        saved = json.load(f)
+    if saved.get("mode") != mode or saved.get("path") != state["path"]:
+        raise ValueError(f"Checkpoint {path} is for a different run")
+    state.update(saved)
+    return state
+
+
+def export_players(store,
+                   path,
+                   batch_size=500,
+                   level=COMPRESS_LEVEL,
+                   checkpoint=None,
+                   progress=None):
+    """Write every player to a gzipped NDJSON file and return the counters
+
+    A resumed export truncates the file to the last checkpointed batch and
+    appends the players after it. progress(state) is called after every
+    batch. The checkpoint is removed when the export completes.
+    """
+    state = load_checkpoint(checkpoint, "export", path)
+    started = time.perf_counter() - state["elapsed"]
+    with open(path, 'r+b' if state["offset"] else 'wb') as f:
+        f.truncate(state["offset"])
+        f.seek(state["offset"])
+        for last_id, count, member in export_batches(
+                store, state["after"], batch_size, level=level):
+            f.write(member)
+            state["after"] = last_id
+            state["offset"] += len(member)
+            state["exported"] += count
+            state["elapsed"] = time.perf_counter() - started
+            if checkpoint is not None:
+                f.flush()
+                os.fsync(f.fileno())
+                save_checkpoint(checkpoint, state)
+            if progress is not None:
+                progress(state)
+    if checkpoint is not None and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    state["elapsed"] = time.perf_counter() - started
+    return state
+
+
+def import_players(store,
+                   path,
+                   batch_size=500,
+                   skip_existing=False,
+                   strict=False,
+                   checkpoint=None,
+                   progress=None,
+                   errors=None):
+    """Load every player from an NDJSON file and return the counters
+
+    A resumed import skips the lines covered by the checkpoint.
+    progress(state) is called after every batch and errors(line_number,
+    message) for every invalid line. The checkpoint is removed when the
+    import completes.
+    """
+    state = load_checkpoint(checkpoint, "import", path)
+    started = time.perf_counter() - state["elapsed"]
+
+    def invalid(line_number, message):
+        state["invalid"] += 1
+        if errors is not None:
+            errors(line_number, message)
+
+    with open(path, 'rb') as f:
+        for line_number, players in import_batches(open_lines(f),
+                                                   batch_size,
+                                                   state["lines"],
+                                                   strict=strict,
+                                                   errors=invalid):
+            saved, skipped = save_players(store, players, skip_existing)
+            state["lines"] = line_number
+            if players:
+                state["after"] = players[-1][0]
+            state["imported"] += len(saved)
+            state["skipped"] += len(skipped)
+            state["elapsed"] = time.perf_counter() - started
+            if checkpoint is not None:
+                save_checkpoint(checkpoint, state)
+            if progress is not None:
+                progress(state)
+    if checkpoint is not None and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    state["elapsed"] = time.perf_counter() - started
+    return state
+
+
+def report(state):
+    count = state[state["mode"] + "ed"]
+    rate = count / state["elapsed"] if state["elapsed"] else 0
+    message = f"{count:,} players {state['mode']}ed"
+    if state["mode"] == "export":
+        message += f", {state['offset'] / 2**20:,.1f} MiB"
+    else:
+        message += (f", {state['skipped']:,} skipped, "
+                    f"{state['invalid']:,} invalid, line {state['lines']:,}")
+    print(f"{message}, {rate:,.0f} players/s (last id {state['after']!r})",
+          file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export or import every player as gzipped NDJSON")
+    parser.add_argument("mode", choices=("export", "import"))
+    parser.add_argument("path")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--level",
+                        type=int,
+                        default=COMPRESS_LEVEL,
+                        help="gzip level of exports (1-9)")
+    parser.add_argument("--skip-existing",
+                        action="store_true",
+                        help="keep players already in the store")
+    parser.add_argument("--strict",
+                        action="store_true",
+                        help="stop at the first invalid line")
+    parser.add_argument("--checkpoint",
+                        help="progress file for resuming an interrupted run")
+    args = parser.parse_args()
+
+    backend = os.environ.get('SOLO_STORE', 'sqlite')
+    path = os.environ.get(
+        'SOLO_DB_PATH',
+        'game_data.journal' if backend == 'journal' else 'game_data.db')
+    store_options = {}
+    if backend == 'sqlite' and os.environ.get('SOLO_STORE_BINARY'):
+        store_options["binary"] = os.environ['SOLO_STORE_BINARY']
+    store = open_store(backend, path, **store_options)
+    try:
+        if args.mode == "export":
+            state = export_players(store,
+                                   args.path,
+                                   batch_size=args.batch_size,
+                                   level=args.level,
+                                   checkpoint=args.checkpoint,
+                                   progress=report)
+        else:
+            state = import_players(
+                store,
+                args.path,
+                batch_size=args.batch_size,
+                skip_existing=args.skip_existing,
+                strict=args.strict,
+                checkpoint=args.checkpoint,
+                progress=report,
+                errors=lambda line, message: print(
+                    f"line {line}: {message}", file=sys.stderr))
+    finally:
+        store.close()
+    report(state)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,567 @@
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+from storage import PlayerStore, VersionConflict, swap_items
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_LEVELS = ("sync", "group", "async")
+
+
+class _Buffered:
+    """A dirty player's latest state, shared by the saves it coalesces
+
+    base is the stored version the first of those saves was checked
+    against, or None if one of them was unconditional.
+    """
+
+    __slots__ = ("data", "op", "version", "base", "conflicted", "replaced")
+
+    def __init__(self, base):
+        self.base = base
+        self.conflicted = False
+        # Entries of an earlier failed flush that this one also writes
+        self.replaced = []
+
+    def conflict(self):
+        self.conflicted = True
+        for entry in self.replaced:
+            entry.conflict()
+
+
+class WriteBehindStore(PlayerStore):
+    """Coalesces saves for dirty players and flushes them in batches
+
+    Durability levels:
+      sync  - every save is written through before returning
+      group - saves wait for the next group commit (one per interval)
+      async - saves return immediately and are flushed every interval
+
+    Repeated saves of the same player between flushes collapse into a
+    single write of the latest state. Versions of buffered players are
+    tracked here, and a flush writes each compare-and-swapped player only if
+    the store still holds the version its first buffered save was checked
+    against, so writes from other processes are never overwritten. When that
+    check fails, the buffered saves are dropped: with group durability
+    their compare_and_swap raises VersionConflict once the flush is done,
+    while with async durability they have already returned and are lost.
+
+    Up to cache_size recently used players are also kept in memory after
+    they are written or loaded, so hot players are served without reading
+    their data from the underlying store. Dirty players are pinned until
+    they are flushed and only then become evictable, least recently used
+    first. A cached player is only used while its stored version still
+    matches, so writes from other processes (such as maintenance.py or
+    transfer.py) are picked up at any durability. With a cache_model (such
+    as models.GameState), only the hot_size most recently used players are
+    kept as their data; the others are converted to its compact form, away
+    from the lock, and rebuilt with to_dict() when next read.
+
+    Saved data is kept as is and shared with readers, without being
+    copied, so callers must not modify it once it is saved.
+
+    Players may hold in-memory state, such as indexes, that is not written
+    to the underlying store: to_store(data) returns the form of saved data
+    to write, and on_load(data) restores that state in data read from the
+    store, before it is cached or returned.
+    """
+
+    def __init__(self,
+                 inner,
+                 durability="group",
+                 interval=0.05,
+                 cache_size=0,
+                 cache_model=None,
+                 hot_size=1000,
+                 on_load=None,
+                 to_store=None):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unknown durability level: {durability}")
+        self.inner = inner
+        self.durability = durability
+        self.interval = interval
+        self._dirty = {}
+        self._flushing = {}
+        self.cache_size = cache_size
+        self.cache_model = cache_model
+        self.hot_size = hot_size
+        self.on_load = on_load
+        self.to_store = to_store
+        # (data or cache_model record, version) by player, in LRU order
+        self._cache = OrderedDict()
+        # Cached players held as data, in LRU order, and those to convert
+        self._hot = OrderedDict()
+        self._cold = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._started_generation = 0
+        self._durable_generation = 0
+        self._closed = False
+        self._counters = {
+            "saves": 0,
+            "writes": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "flush_conflicts": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "cache_evictions": 0,
+            "cache_invalidations": 0,
+        }
+
+        self._flusher = None
+        if durability != "sync":
+            self._flusher = threading.Thread(target=self._flush_loop,
+                                             name="write-behind-flusher",
+                                             daemon=True)
+            self._flusher.start()
+
+    def _pending(self, player_id):
+        return self._dirty.get(player_id) or self._flushing.get(player_id)
+
+    def load_versioned(self, player_id):
+        loaded = self.load_snapshot(player_id)
+        if loaded is None:
+            return None
+        return copy.deepcopy(loaded[0]), loaded[1]
+
+    def load_snapshot(self, player_id):
+        # Buffered and cached states are never modified once stored, so
+        # readers can share them; writers replace them with new objects
+        with self._cond:
+            pending = self._pending(player_id)
+            if pending is not None:
+                self._counters["cache_hits"] += 1
+                return pending.data, pending.version
+            cached = self._cache.get(player_id)
+        # Other processes may write the store; its version is checked
+        # without loading the data
+        if cached is not None and self.inner.version_of(
+                player_id) == cached[1]:
+            data, version = cached
+            if not isinstance(data, dict):
+                # Converted to cache_model; hot again from now on
+                data = data.to_dict()
+            with self._cond:
+                if self._cache.get(player_id) is cached:
+                    self._remember(player_id, data, version)
+                self._counters["cache_hits"] += 1
+            self._compact_cold()
+            return data, version
+        with self._cond:
+            if cached is not None:
+                self._forget(player_id)
+            self._counters["cache_misses"] += 1
+        loaded = self.inner.load_versioned(player_id)
+        if loaded is not None and self.on_load is not None:
+            self.on_load(loaded[0])
+        if loaded is not None and self.cache_size:
+            with self._cond:
+                self._remember(player_id, loaded[0], loaded[1])
+            self._compact_cold()
+        return loaded
+
+    def version_of(self, player_id):
+        with self._cond:
+            pending = self._pending(player_id)
+            if pending is not None:
+                return pending.version
+        return self.inner.version_of(player_id)
+
+    def _remember(self, player_id, data, version):
+        # Called with the condition held. A load that raced with a newer
+        # save must not replace it
+        if not self.cache_size or self._pending(player_id) is not None:
+            return
+        cached = self._cache.get(player_id)
+        if cached is not None and cached[1] > version:
+            return
+        self._cache[player_id] = (data, version)
+        self._cache.move_to_end(player_id)
+        if self.cache_model is not None:
+            self._hot[player_id] = None
+            self._hot.move_to_end(player_id)
+            while len(self._hot) > self.hot_size:
+                self._cold.append(self._hot.popitem(last=False)[0])
+        while len(self._cache) > self.cache_size:
+            self._hot.pop(self._cache.popitem(last=False)[0], None)
+            self._counters["cache_evictions"] += 1
+
+    def _uncache(self, player_id):
+        # Called with the condition held
+        self._hot.pop(player_id, None)
+        return self._cache.pop(player_id, None) is not None
+
+    def _forget(self, player_id):
+        # Called with the condition held
+        if self._uncache(player_id):
+            self._counters["cache_invalidations"] += 1
+
+    def _compact_cold(self):
+        """Convert players that left the hot part of the cache to
+        cache_model, without the condition held"""
+        while True:
+            with self._cond:
+                if not self._cold:
+                    return
+                player_id = self._cold.popleft()
+                cached = self._cache.get(player_id)
+                if (cached is None or player_id in self._hot
+                        or not isinstance(cached[0], dict)):
+                    continue
+            try:
+                record = self.cache_model.from_dict(cached[0])
+            except Exception:
+                # Caching is optional; the player is loaded when needed
+                logger.exception("Cannot cache %s as %s", player_id,
+                                 self.cache_model.__name__)
+                record = None
+            with self._cond:
+                if self._cache.get(player_id) is not cached:
+                    continue
+                if record is None:
+                    self._uncache(player_id)
+                else:
+                    # Keeps its place in the LRU order
+                    self._cache[player_id] = (record, cached[1])
+
+    def save(self, player_id, data, op=None, version=None):
+        if self.durability == "sync":
+            started = time.perf_counter()
+            self.inner.save(player_id,
+                            self._stored(data),
+                            op=op,
+                            version=version)
+            with self._cond:
+                self._counters["saves"] += 1
+                self._counters["writes"] += 1
+                self._record_flush(started)
+                # The stored version is only known when it was given
+                self._uncache(player_id)
+                if version is not None:
+                    self._remember(player_id, data, version)
+            self._compact_cold()
+            return
+
+        stored = self._stored_versions([player_id])
+        with self._cond:
+            if version is None:
+                version = self._current_version(player_id, stored) + 1
+            self._wait_for_group([self._buffer(player_id, data, op, version)])
+
+    def save_many(self, items):
+        if self.durability == "sync":
+            items = list(items)
+            started = time.perf_counter()
+            self.inner.save_many([(player_id, self._stored(data), op, version)
+                                  for player_id, data, op, version in items])
+            with self._cond:
+                self._counters["saves"] += len(items)
+                self._counters["writes"] += len(items)
+                self._record_flush(started)
+                for player_id, data, _op, version in items:
+                    self._uncache(player_id)
+                    if version is not None:
+                        self._remember(player_id, data, version)
+            self._compact_cold()
+            return
+
+        items = list(items)
+        stored = self._stored_versions(
+            [item[0] for item in items if item[3] is None])
+        entries = []
+        with self._cond:
+            for player_id, data, op, version in items:
+                if version is None:
+                    version = self._current_version(player_id, stored) + 1
+                entries.append(self._buffer(player_id, data, op, version))
+            # One wait for the group commit covers the whole batch
+            self._wait_for_group(entries)
+
+    def compare_and_swap(self,
+                         player_id,
+                         expected_version,
+                         data,
+                         op=None,
+                         version=None):
+        if self.durability == "sync":
+            started = time.perf_counter()
+            try:
+                version = self.inner.compare_and_swap(player_id,
+                                                      expected_version,
+                                                      self._stored(data),
+                                                      op=op,
+                                                      version=version)
+            except VersionConflict:
+                # Another process wrote this player; reload it next time
+                with self._cond:
+                    self._forget(player_id)
+                raise
+            with self._cond:
+                self._counters["saves"] += 1
+                self._counters["writes"] += 1
+                self._record_flush(started)
+                self._remember(player_id, data, version)
+            self._compact_cold()
+            return version
+
+        version = version or expected_version + 1
+        stored = self._stored_versions([player_id])
+        with self._cond:
+            if self._current_version(player_id, stored) != expected_version:
+                raise VersionConflict(player_id)
+            entry = self._buffer(player_id, data, op, version,
+                                 expected_version)
+            self._wait_for_group([entry])
+            if entry.conflicted:
+                raise VersionConflict(player_id)
+        return version
+
+    def compare_and_swap_many(self, items):
+        if self.durability == "sync":
+            items = list(swap_items(items))
+            started = time.perf_counter()
+            conflicts = self.inner.compare_and_swap_many([
+                (player_id, expected_version, self._stored(data), op, version)
+                for player_id, expected_version, data, op, version in items
+            ])
+            with self._cond:
+                self._counters["saves"] += len(items) - len(conflicts)
+                self._counters["writes"] += len(items) - len(conflicts)
+                self._record_flush(started)
+                conflicted = set(conflicts)
+                for player_id, expected_version, data, _op, version in items:
+                    if player_id in conflicted:
+                        self._forget(player_id)
+                    else:
+                        self._remember(player_id, data, version
+                                       or expected_version + 1)
+            self._compact_cold()
+            return conflicts
+
+        items = list(swap_items(items))
+        stored = self._stored_versions([item[0] for item in items])
+        conflicts = []
+        entries = {}
+        with self._cond:
+            for player_id, expected_version, data, op, version in items:
+                if (self._current_version(player_id, stored) !=
+                        expected_version):
+                    conflicts.append(player_id)
+                    continue
+                entries[player_id] = self._buffer(
+                    player_id, data, op, version or expected_version + 1,
+                    expected_version)
+            # One wait for the group commit covers the whole batch
+            self._wait_for_group(entries.values())
+        conflicts.extend(player_id for player_id, entry in entries.items()
+                         if entry.conflicted)
+        return conflicts
+
+    def _stored(self, data):
+        """The form of saved data written to the underlying store"""
+        return data if self.to_store is None else self.to_store(data)
+
+    def _stored_versions(self, player_ids):
+        """Stored versions of players with no buffered save, for
+        _current_version
+
+        They are looked up without the condition held, so loads and saves
+        of other players do not wait for the store.
+        """
+        with self._cond:
+            generation = self._durable_generation
+            player_ids = [
+                player_id for player_id in player_ids
+                if self._pending(player_id) is None
+            ]
+        versions = {
+            player_id: self.inner.version_of(player_id)
+            for player_id in player_ids
+        }
+        return generation, versions
+
+    def _current_version(self, player_id, stored):
+        # Called with the condition held, for buffered durability only.
+        # Clean players are checked against the store, which other
+        # processes may have written since they were cached. A flush
+        # that finished after the lookup makes it stale, so it is redone
+        pending = self._pending(player_id)
+        if pending is not None:
+            return pending.version
+        generation, versions = stored
+        version = versions.get(player_id)
+        if version is None or generation != self._durable_generation:
+            version = self.inner.version_of(player_id)
+        cached = self._cache.get(player_id)
+        if cached is not None and cached[1] != version:
+            self._forget(player_id)
+        return version
+
+    def _buffer(self, player_id, data, op, version, base=None):
+        """Buffer a save, checked against base if given; return its entry"""
+        # Called with the condition held
+        entry = self._dirty.get(player_id)
+        if entry is None:
+            entry = self._dirty[player_id] = _Buffered(base)
+        elif base is None:
+            entry.base = None
+        # Saved data is shared with readers from now on, never copied
+        entry.data, entry.op, entry.version = data, op, version
+        # Pinned in _dirty until flushed
+        self._uncache(player_id)
+        self._counters["saves"] += 1
+        return entry
+
+    def _wait_for_group(self, entries):
+        # Called with the condition held. Entries dropped by a conflict
+        # are not written by the next group commit
+        target = self._started_generation + 1
+        if self.durability == "group" and entries:
+            while (self._durable_generation < target and not self._closed
+                   and not all(entry.conflicted for entry in entries)):
+                self._cond.wait()
+
+    def delete(self, player_id):
+        with self._cond:
+            self._dirty.pop(player_id, None)
+            self._uncache(player_id)
+        self.inner.delete(player_id)
+
+    def count(self):
+        self.flush()
+        return self.inner.count()
+
+    def iter_players(self, batch_size=500):
+        self.flush()
+        return self.inner.iter_players(batch_size)
+
+    def iter_versioned(self, after="", batch_size=500):
+        self.flush()
+        return self.inner.iter_versioned(after, batch_size)
+
+    def flush(self):
+        """Write every dirty player to the underlying store now"""
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._cond:
+            if not self._dirty:
+                return
+            batch = self._dirty
+            self._dirty = {}
+            self._flushing = batch
+            self._started_generation += 1
+            generation = self._started_generation
+
+        started = time.perf_counter()
+        saves = [(player_id, self._stored(entry.data), entry.op,
+                  entry.version) for player_id, entry in batch.items()
+                 if entry.base is None]
+        swaps = [(player_id, entry.base, self._stored(entry.data), entry.op,
+                  entry.version) for player_id, entry in batch.items()
+                 if entry.base is not None]
+        try:
+            if saves:
+                self.inner.save_many(saves)
+            conflicts = (self.inner.compare_and_swap_many(swaps)
+                         if swaps else [])
+        except Exception:
+            logger.exception("Write-behind flush failed; will retry")
+            with self._cond:
+                for player_id, entry in batch.items():
+                    newer = self._dirty.get(player_id)
+                    if newer is None:
+                        self._dirty[player_id] = entry
+                        continue
+                    # A newer save was checked against this unwritten one,
+                    # so it is written as a continuation of it
+                    if newer.base is not None:
+                        newer.base = entry.base
+                    newer.replaced.append(entry)
+                self._flushing = {}
+                self._counters["flush_errors"] += 1
+            return
+
+        with self._cond:
+            self._flushing = {}
+            for player_id in conflicts:
+                self._drop_conflicted(player_id, batch[player_id])
+            # Written players stay cached until evicted
+            for player_id, entry in batch.items():
+                if not entry.conflicted:
+                    self._remember(player_id, entry.data, entry.version)
+            self._durable_generation = generation
+            self._counters["writes"] += len(batch) - len(conflicts)
+            self._record_flush(started)
+            self._cond.notify_all()
+        self._compact_cold()
+
+    def _drop_conflicted(self, player_id, entry):
+        # Called with the condition held. Another process committed this
+        # player first; saves buffered since were checked against the
+        # dropped state, so they are dropped too
+        dropped = [entry]
+        newer = self._dirty.get(player_id)
+        if newer is not None and newer.base is not None:
+            del self._dirty[player_id]
+            dropped.append(newer)
+        for dropped_entry in dropped:
+            dropped_entry.conflict()
+        self._forget(player_id)
+        self._counters["flush_conflicts"] += len(dropped)
+        if self.durability == "async":
+            logger.warning(
+                "Dropped buffered save of %s: another writer committed "
+                "first", player_id)
+
+    def _record_flush(self, started):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._counters["flushes"] += 1
+        self._counters["last_flush_ms"] = elapsed_ms
+        self._counters["max_flush_ms"] = max(self._counters["max_flush_ms"],
+                                             elapsed_ms)
+        self._counters["total_flush_ms"] += elapsed_ms
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+            time.sleep(self.interval)
+            self.flush()
+
+    def stats(self):
+        """Queue depth and flush counters"""
+        with self._cond:
+            stats = dict(self._counters)
+            stats["durability"] = self.durability
+            stats["queue_depth"] = len(self._dirty)
+            stats["in_flight"] = len(self._flushing)
+            stats["cached_players"] = len(self._cache)
+            stats["hot_players"] = (len(self._hot) if self.cache_model
+                                    is not None else len(self._cache))
+            stats["coalesced_saves"] = stats["saves"] - stats["writes"] - (
+                len(self._dirty) + len(self._flushing) +
+                stats["flush_conflicts"])
+        stats["avg_flush_ms"] = (stats["total_flush_ms"] / stats["flushes"]
+                                 if stats["flushes"] else 0.0)
+        return stats
+
+    def close(self):
+        """Flush everything that is still dirty, then close the store"""
+        with self._cond:
+            self._closed = True
+        if self._flusher is not None:
+            self._flusher.join(timeout=max(1.0, self.interval * 4))
+        self.flush()
+        with self._cond:
+            self._cond.notify_all()
+        self.inner.close()